@@ -1,10 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from nepal_constitution_ai.routes.routes import router as api_router
+from nepal_constitution_ai.retriever.retriever_base import get_retriever
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.config.db import async_engine
 
 __app_name__ = "Nepal Constitution AI REST API"
 __version__ = "1.0.0"
-app = FastAPI(title=__app_name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the shared retriever once at startup so that requests reuse it, and
+    close the database connection pool on shutdown
+    """
+    get_retriever(llm=settings.OPENAI_MODEL)
+    yield
+    await async_engine.dispose()
+
+
+app = FastAPI(title=__app_name__, lifespan=lifespan)
 
 
 # Initialize Routes
@@ -11,16 +11,24 @@ def setup_agent(
     conv_chain: LLMChain,
     llm_model: Union[OpenaiModel],
 ):
+    async def avector_search(query):
+        return await retriever_chain.ainvoke(query)
+
+    async def aconversation(query):
+        return await conv_chain.ainvoke(ast.literal_eval(query))
+
     tools = [
         Tool(
             name="Vector Search",
             func=lambda query: retriever_chain.invoke(query),
+            coroutine=avector_search,
             description=f"Useful for answering any legal questions related to nepal laws, constitution, rules and regulations etc.",
             return_direct=True,
         ),
         Tool(
             name="Conversation",
             func=lambda query: conv_chain.invoke(ast.literal_eval(query)),
+            coroutine=aconversation,
             description="Useful for greetings, general conversation",
             return_direct=True,
         ),
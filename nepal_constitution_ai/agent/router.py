@@ -0,0 +1,97 @@
+import re
+import unicodedata
+
+from nepal_constitution_ai.retriever.bm25_index import tokenize
+from nepal_constitution_ai.utils.metrics import Counters
+
+# The router picks the same tools as the agent
+VECTOR_SEARCH = "Vector Search"
+CONVERSATION = "Conversation"
+
+# Greetings, thanks and questions about the assistant itself, optionally followed by words
+# addressing the assistant ("hi there", "thanks a lot"), punctuation and emoji. The end of the
+# phrase is checked with a lookahead since \b does not see a word boundary after Devanagari
+# vowel signs.
+SMALL_TALK_PATTERN = re.compile(
+    r"\s*(hi+|hello|hey|hola|namaste|namaskar|नमस्ते|नमस्कार|good\s+(morning|afternoon|evening|night|day)"
+    r"|(thank\s*(you|s)|thx|ty|धन्यवाद)|(ok(ay)?|cool|great|nice|awesome|got it)"
+    r"|(bye|goodbye|see\s+you)|(how\s+are\s+you|how\s+(is|are)\s+(it|things)\s+going|k\s*(cha|xa)|कस्तो\s+छ)"
+    r"|(who|what)\s+are\s+you|what\s+can\s+you\s+do|what\s+is\s+your\s+name)"
+    r"(\s+(there|everyone|all|friend|buddy|bot|sir|madam|dai|didi|again|today|doing|very\s+much|so\s+much|a\s+lot))*"
+    r"(?![a-z0-9])[\s,.!?।॥;:'\"()\-\u2600-\u27bf\U0001f300-\U0001faff]*",
+    re.IGNORECASE,
+)
+
+# Words that make a message a legal question even when it starts like small talk
+LEGAL_TERMS = {
+    "law", "laws", "legal", "act", "acts", "article", "articles", "constitution", "constitutional",
+    "section", "clause", "rule", "rules", "regulation", "regulations", "ordinance", "bylaw", "policy",
+    "right", "rights", "duty", "duties", "court", "courts", "judge", "case", "crime", "criminal",
+    "penalty", "punishment", "fine", "jail", "prison", "offence", "offense", "illegal", "allowed",
+    "permitted", "tax", "citizenship", "passport", "marriage", "divorce", "property", "inheritance",
+    "land", "labour", "labor", "contract", "company", "license", "licence", "election", "parliament",
+    "government", "ministry", "province", "municipality",
+}
+# Nepali postpositions attach to the word ("संविधानको", "ऐनमा"), so these are matched as prefixes
+LEGAL_STEMS = (
+    "कानुन", "कानून", "ऐन", "नियम", "संविधान", "धारा", "दफा", "उपदफा", "अध्यादेश", "अदालत",
+    "अधिकार", "कर्तव्य", "सजाय", "जरिवाना", "कैद", "नागरिकता", "विवाह", "सम्बन्धविच्छेद",
+    "सम्पत्ति", "जग्गा", "निर्वाचन", "संसद", "सरकार", "मन्त्रालय", "प्रदेश", "नगरपालिका",
+)
+
+
+def has_legal_term(tokens: list[str]) -> bool:
+    return any(token in LEGAL_TERMS or token.startswith(LEGAL_STEMS) for token in tokens)
+
+
+def is_small_talk(text: str) -> bool:
+    """
+    Whether the text is only small talk phrases, such as "hi, thanks!". A message that
+    goes on after a greeting ("hello, how do I register a business?") is not.
+    """
+    position = 0
+    while position < len(text):
+        match = SMALL_TALK_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            return False
+        position = match.end()
+    return position > 0
+
+class IntentRouter:
+    """
+    Local rule-based router choosing between the "Vector Search" and "Conversation"
+    tools without an LLM call. Messages made only of greetings, thanks and questions
+    about the assistant go to the conversation chain; everything else, including a
+    question following a greeting and any message that mentions a legal term, is
+    treated as a legal question.
+    """
+    def __init__(self, max_small_talk_words: int = 8) -> None:
+        self.max_small_talk_words = max_small_talk_words
+        self.counters = Counters()
+
+    def route(self, query: str) -> str:
+        """
+        Returns the name of the tool to answer the query with.
+        """
+        query = unicodedata.normalize("NFC", query)
+        tokens = tokenize(query)
+
+        if (
+            is_small_talk(query)
+            and len(tokens) <= self.max_small_talk_words
+            and not has_legal_term(tokens)
+        ):
+            tool = CONVERSATION
+        else:
+            tool = VECTOR_SEARCH
+
+        self.counters.incr(tool)
+        return tool
+
+    def stats(self) -> dict:
+        return self.counters.snapshot()
+
+
+intent_router = IntentRouter()
+
+__all__ = ["intent_router", "IntentRouter", "VECTOR_SEARCH", "CONVERSATION"]
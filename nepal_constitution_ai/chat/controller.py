@@ -1,19 +1,20 @@
+import json
+from typing import AsyncIterator
 from uuid import UUID
 
-from fastapi import BackgroundTasks
 from langchain.schema import AIMessage, HumanMessage
 from pydantic.types import UUID4
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from nepal_constitution_ai.chat import schemas
 from nepal_constitution_ai.chat.schemas import ChatHistory
-from nepal_constitution_ai.retriever.retriever_base import Retriever
+from nepal_constitution_ai.retriever.retriever_base import get_retriever
 from nepal_constitution_ai.user.model import User
 from nepal_constitution_ai.config.config import settings
 import nepal_constitution_ai.chat.services as chat_service
 
 
-async def create_chat_session(db: Session, created_by: UUID4):
+async def create_chat_session(db: AsyncSession, created_by: UUID4):
     new_chat_session = await chat_service.create_chat_session(
         db=db,
         created_by=created_by,
@@ -22,7 +23,7 @@ async def create_chat_session(db: Session, created_by: UUID4):
     return new_chat_session
 
 
-async def update_chat_session(user_id: UUID, session_id: UUID, request: schemas.ChatSessionRequest, db: Session):
+async def update_chat_session(user_id: UUID, session_id: UUID, request: schemas.ChatSessionRequest, db: AsyncSession):
     updated_session = await chat_service.update_chat_session(
         user_id=user_id, session_id=session_id, db=db
     )
@@ -30,17 +31,21 @@ async def update_chat_session(user_id: UUID, session_id: UUID, request: schemas.
     return updated_session
 
 
-async def get_chat_session(user_id: UUID, db: Session):
+async def get_chat_session(user_id: UUID, db: AsyncSession):
     session = await chat_service.get_chat_session(user_id=user_id, db=db)
 
     return session
 
 
+async def get_chat_session_by_id(session_id: UUID, db: AsyncSession):
+    session = await chat_service.get_chat_session_by_id(session_id=session_id, db=db)
+
+    return session
 
 
 
-def get_chat_history_by_session_id(session_id: UUID, db: Session):
-    chat_messages = chat_service.get_chat_history_service(db=db, session_id=session_id)
+async def get_chat_history_by_session_id(session_id: UUID, db: AsyncSession):
+    chat_messages = await chat_service.get_chat_history_service(db=db, session_id=session_id)
     res = []
 
     for chat_message in chat_messages:
@@ -55,19 +60,32 @@ def get_chat_history_by_session_id(session_id: UUID, db: Session):
 
     return res
 
-def user_input(db: Session, user: User, query: str, chat_session_id: UUID):
-    background_tasks = BackgroundTasks()
+def format_response(response: dict) -> str:
+    """ Formats the {answer, source, link} response as markdown. """
+    if response.get("source", "") == "" and response.get("link", "") == "":
+        formatted_response = response.get("answer", "")
+    else:
+        try:
+            link_title = response.get('source', "").split("from", 1)[1].strip()
+        except:
+            link_title = "Click Here"
 
-    background_tasks.add_task(
-        chat_service.create_chat_message(
-            db=db,
-            content=query,
-            chat_session_id=chat_session_id,
-            message_by="user",
-        )
-    )
+        formatted_response = f"""
+        {response.get('answer', "")}
+
+        **Source:** {response.get('source', "")}
+
+        **Link:** [{link_title}]({response.get('link', "")})
+        """
+
+    return formatted_response
 
-    message_history = get_chat_history_by_session_id(session_id=chat_session_id, db=db)
+def format_sse(event: str, data) -> str:
+    """ Formats an event as a Server-Sent Events message. """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def load_chat_history(session_id: UUID, db: AsyncSession) -> ChatHistory:
+    message_history = await get_chat_history_by_session_id(session_id=session_id, db=db)
 
     chat_history = ChatHistory()
     for chat_message in message_history:
@@ -76,36 +94,52 @@ def user_input(db: Session, user: User, query: str, chat_session_id: UUID):
         elif chat_message.actor == "llm":
             chat_history.add_message(AIMessage(content=chat_message.message))
 
-    retriever = Retriever(
-        llm=settings.OPENAI_MODEL,
-        chat_history=chat_history,
-    )
-    response = retriever.invoke(query=query)
-    response = response.message
+    return chat_history
 
-    background_tasks.add_task(
-        chat_service.create_chat_message(
-            db=db,
-            content=str(response),
-            chat_session_id=chat_session_id,
-            message_by="llm",
-        )
+async def user_input(db: AsyncSession, user: User, query: str, chat_session_id: UUID):
+    await chat_service.create_chat_message(
+        db=db,
+        content=query,
+        chat_session_id=chat_session_id,
+        message_by="user",
     )
 
-    if response.get("source", "") == "" and response.get("link", "") == "":
-        formatted_response = response.get("answer", "")
-    else:
-        try:
-            link_title = response.get('source', "").split("from", 1)[1].strip()
-        except:
-            link_title = "Click Here"
+    chat_history = await load_chat_history(session_id=chat_session_id, db=db)
 
-        formatted_response = f"""
-        {response.get('answer', "")}
+    retriever = get_retriever(llm=settings.OPENAI_MODEL)
+    response = await retriever.ainvoke(query=query, chat_history=chat_history)
+    response = response.message
 
-        **Source:** {response.get('source', "")}
+    await chat_service.create_chat_message(
+        db=db,
+        content=str(response),
+        chat_session_id=chat_session_id,
+        message_by="llm",
+    )
 
-        **Link:** [{link_title}]({response.get('link', "")})
-        """
+    return format_response(response)
+
+async def stream_user_input(db: AsyncSession, user: User, query: str, chat_session_id: UUID) -> AsyncIterator[dict]:
+    """
+    Streams the answer events of the retriever (sources, tokens, done or error). The
+    final message is stored before the "done" event is sent; a failed answer is not stored.
+    """
+    await chat_service.create_chat_message(
+        db=db,
+        content=query,
+        chat_session_id=chat_session_id,
+        message_by="user",
+    )
 
-    return formatted_response
\ No newline at end of file
+    chat_history = await load_chat_history(session_id=chat_session_id, db=db)
+
+    retriever = get_retriever(llm=settings.OPENAI_MODEL)
+    async for event in retriever.astream(query=query, chat_history=chat_history):
+        if event["event"] == "done":
+            await chat_service.create_chat_message(
+                db=db,
+                content=str(event["data"]),
+                chat_session_id=chat_session_id,
+                message_by="llm",
+            )
+        yield event
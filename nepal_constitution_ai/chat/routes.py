@@ -2,11 +2,13 @@ from typing import List
 from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
 import nepal_constitution_ai.chat.controller as chat_controller
-from nepal_constitution_ai.config.db_session import get_session
+from nepal_constitution_ai.config.db import create_async_db_session
+from nepal_constitution_ai.config.db_session import get_async_session
 import nepal_constitution_ai.user.services as user_services
 from nepal_constitution_ai.user.schemas import User
 
@@ -19,7 +21,7 @@ router = APIRouter()
 @router.post("/chat_session", response_model=schemas.ChatSession)
 async def create_chat_session(
     user: User,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
 ):
     user = await user_services.get_user(user_id=user.user_id, db=db)
     if user is None:
@@ -37,7 +39,7 @@ async def update_chat_session(
     session_id: UUID,
     request: schemas.ChatSessionRequest,
     user_id: UUID,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
 ):
     user = await user_services.get_user(user_id=user_id, db=db)
     if user is None:
@@ -52,7 +54,7 @@ async def update_chat_session(
 @router.get("/chat-sessions")
 async def get_chat_sessions(
     user_id: UUID,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
 ):
     user = await user_services.get_user(user_id=user_id, db=db)
     if user is None:
@@ -68,7 +70,7 @@ async def get_chat_sessions(
 async def generate_response_with_session(
     request: schemas.RetrieverInput,
     user_id: UUID,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     
 ):
     user = await user_services.get_user(user_id=user_id, db=db)
@@ -82,7 +84,7 @@ async def generate_response_with_session(
 
         if not query:
             raise HTTPException(status_code=400, detail="Missing required parameters")
-        response = chat_controller.user_input(
+        response = await chat_controller.user_input(
             db=db,
             user=user,
             query=query,
@@ -100,12 +102,59 @@ async def generate_response_with_session(
 
 
 
+@router.post("/generate_response/stream")
+async def stream_response_with_session(
+    request: schemas.RetrieverInput,
+    user_id: UUID,
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Streams the answer as Server-Sent Events: a `sources` event with the retrieved
+    sources, `token` events with the answer text as it is generated, then a `done`
+    event with the complete message once it has been stored. A failure once the
+    stream has started is sent as an `error` event.
+    """
+    user = await user_services.get_user(user_id=user_id, db=db)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not request.query:
+        raise HTTPException(status_code=400, detail="Missing required parameters")
+
+    # Checked before the response starts, as errors can only be sent as events afterwards
+    chat_session = await chat_controller.get_chat_session_by_id(session_id=request.chat_session_id, db=db)
+    if chat_session is None or chat_session.created_by != user.user_id:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+    logger.info(f"Streaming for chat session: {request.chat_session_id}")
+
+    async def event_stream():
+        # The request's session is closed once the response starts, so the stream uses its own
+        try:
+            async with create_async_db_session() as stream_db:
+                async for event in chat_controller.stream_user_input(
+                    db=stream_db,
+                    user=user,
+                    query=request.query,
+                    chat_session_id=request.chat_session_id,
+                ):
+                    yield chat_controller.format_sse(event["event"], event["data"])
+        except Exception as e:
+            logger.error(f"An error occurred while streaming the response: {str(e)}")
+            detail = e.detail if isinstance(e, HTTPException) else "An error occurred while processing your query"
+            yield chat_controller.format_sse("error", {"detail": detail})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get(
     "/chat-history/{session_id}", response_model=List[schemas.ChatHistoryResponse]
 )
-async def get_chat_history(session_id: UUID, db: Session = Depends(get_session)):
-    chat_messages = chat_controller.get_chat_history_by_session_id(
+async def get_chat_history(session_id: UUID, db: AsyncSession = Depends(get_async_session)):
+    chat_messages = await chat_controller.get_chat_history_by_session_id(
         session_id=session_id, db=db
     )
 
@@ -14,8 +14,21 @@ class Settings(BaseSettings):
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-ada-002"
     COHERE_EMBEDDING_MODEL: str = "embed-multilingual-v3.0"
     EMBEDDING_DIM: str = "1024"
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL: float = 0
+    EMBEDDING_CACHE_DB_PATH: str = ""
+    EMBEDDING_BATCH_SIZE: int = 96 # texts per embedding request (the Cohere limit)
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_RETRY_BASE_DELAY: float = 1.0
     OPENAI_MODEL: str = "gpt-3.5-turbo"
-    VECTOR_DB: str = "pinecone"
+    USE_AGENT_ROUTING: bool = False # route with the ReAct agent instead of the local intent router
+    REWRITE_MAX_RETRIES: int = 1
+    VECTOR_DB: str = "pinecone" # "pinecone" or "local"
+    LOCAL_INDEX_PATH: str = "data/local_index"
+    LOCAL_INDEX_TYPE: str = "exact" # "exact" or "ivf"
+    IVF_N_LISTS: int = 0 # 0 picks about sqrt(number of chunks)
+    IVF_N_PROBE: int = 8
     PINECONE_INDEX: str = ""
     PINECONE_CLOUD: str = "aws"
     PINECONE_REGION: str = "us-east-1"
@@ -23,20 +36,63 @@ class Settings(BaseSettings):
     VECTORS_UPLOAD_BATCH_SIZE: int = 200
     CHUNK_OVERLAP:int = 200
     TOP_K:int = 25
+    USE_HYBRID_SEARCH: bool = False
+    BM25_INDEX_PATH: str = "data/bm25_index.json"
+    RRF_K: int = 60
+    NAMESPACE_SEARCH_WORKERS: int = 8
+    NAMESPACE_SEARCH_TIMEOUT: float = 10.0
     COHERE_RERANK_MODEL: str = "rerank-multilingual-v3.0"
     USE_RERANKING: bool = True
+    RERANKER: str = "cohere" # "cohere", "lexical" or "cross_encoder"
+    CROSS_ENCODER_MODEL: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    RERANK_TOP_N: int = 3
+    RERANK_BATCH_SIZE: int = 32
+    RERANK_CACHE_SIZE: int = 10000
     RELEVANCE_SCORE_THRESHOLD:float = 0.5
+    LEXICAL_RERANK_THRESHOLD: float = 0.1 # share of the query terms found, lower than the other rerankers' scores
+    CONTEXT_TOKEN_BUDGET: int = 6000 # 0 for no limit
+    CONTEXT_MIN_BLOCK_TOKENS: int = 100 # context packing stops once less than this is left of the budget
+    USE_ANSWER_CACHE: bool = True
+    ANSWER_CACHE_SIZE: int = 1000
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    ANSWER_CACHE_VERIFY_REWRITE: bool = True # confirm a cache hit with the reformulated question and categories
     CREATE_NAMESPACE: bool = True
     GENERATE_DOC_SUMMARY: bool = False
     DATA_PATH: str = "data"
+    DOCUMENT_CATALOG_PATH: str = "" # compact form of documents_info.json, faster to load
+    SCRAPE_MODE: str = "http" # "http", falling back to "selenium" on network errors, or "selenium"
+    SCRAPE_WORKERS: int = 4
+    SCRAPE_REQUESTS_PER_SECOND: float = 4
+    SCRAPE_TIMEOUT: float = 30
+    SCRAPE_MAX_RETRIES: int = 3
+    SCRAPE_RETRY_BACKOFF: float = 1.0
+    SCRAPE_LANGUAGE_COOKIE: str = "" # name of the language cookie, the language form is submitted when empty
+    SCRAPE_CHANGELOG_PATH: str = "data/scrape_changelog.json"
+    SCRAPE_DELTA_PATH: str = "data/scrape_delta.json" # documents added, changed or removed since the last download
     FILE_PATH: str=" data/nepal_constitution_2072.pdf"
     DOWNLOADED_PDF_PATH: str = "data/downloaded_pdfs"
+    ORGANIZE_LINK_MODE: str = "hardlink" # "hardlink", "symlink", "reflink" or "copy"
+    DOWNLOAD_STATE_PATH: str = "data/download_state.json"
+    DOWNLOAD_WORKERS: int = 8
+    DOWNLOAD_CHUNK_SIZE: int = 1 << 20 # bytes written at a time
+    DOWNLOAD_TIMEOUT: float = 30
+    DOWNLOAD_MAX_RETRIES: int = 5
+    DOWNLOAD_RETRY_BACKOFF: float = 1.0
     OCR_JSON_FOLDER_PATH: str = "data/ocr_json"
     EMBS_JSON_FOLDER_PATH: str = "data/embeddings"
     CHUNKS_JSON_FOLDER_PATH: str = "data/chunks"
     EXISTING_LAWS_FOLDER_PATH: str = "data/existing_laws_json"
     EXISTING_LAWS_JSON_FILE_PATH: str = "data/existing_laws.json"
     OCR_JSON_BATCH_SIZE: int = 5
+    OCR_WORKERS: int = 0 # OCR processes, 0 for one per CPU core (or a single one on GPU)
+    OCR_DPI: int = 200
+    OCR_GRAYSCALE: bool = False
+    OCR_PAGE_WINDOW: int = 4 # pages rasterized at a time
+    USE_TEXT_LAYER: bool = True # use the embedded text of the PDF pages instead of OCR when it is valid Nepali
+    TEXT_LAYER_MIN_CHARS: int = 20
+    TEXT_LAYER_MIN_DEVANAGARI_RATIO: float = 0.6
+    INGESTION_MANIFEST_PATH: str = "data/ingestion_manifest.json"
+    FULL_REINGEST: bool = False
     model_config = SettingsConfigDict(env_file=".env")
 
 
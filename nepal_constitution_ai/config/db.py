@@ -1,16 +1,17 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from .config import settings
 
-def get_conn_url():
+def get_conn_url(driver: str = "postgresql"):
     user =  settings.POSTGRES_USER
     password = settings.POSTGRES_PASSWORD
     server = settings.POSTGRES_HOST
     port = settings.POSTGRES_PORT
     db = settings.POSTGRES_DB
     
-    conn_base_url = f"postgresql://{user}:{password}@{server}:{port}/{db}"
+    conn_base_url = f"{driver}://{user}:{password}@{server}:{port}/{db}"
     return conn_base_url
 
 def create_db_session():
@@ -20,5 +21,13 @@ def create_db_session():
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     return SessionLocal()
 
+# The async engine and its connection pool are created once per process; pooled
+# connections are bound to the event loop that opened them.
+async_engine = create_async_engine(get_conn_url(driver="postgresql+asyncpg"), pool_pre_ping=True)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+def create_async_db_session() -> AsyncSession:
+    return AsyncSessionLocal()
+
 Base = declarative_base()
-__all__ = ['Base', 'create_db_session']
+__all__ = ['Base', 'create_db_session', 'create_async_db_session']
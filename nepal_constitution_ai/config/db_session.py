@@ -1,8 +1,9 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from loguru import logger
 from sqlalchemy.orm.session import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import contextmanager
-from .db import create_db_session
+from .db import create_db_session, create_async_db_session
 
 @contextmanager
 def get_session() -> Generator: 
@@ -15,4 +16,17 @@ def get_session() -> Generator:
         raise e
     finally:
         if db:
-            db.close()
\ No newline at end of file
+            db.close()
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """ FastAPI dependency yielding an async session from the pooled engine. """
+    db: AsyncSession | None = None
+    try:
+        db = create_async_db_session()
+        yield db
+    except Exception as e:
+        logger.error(f"An error occurred while creating db session: {str(e)}")
+        raise e
+    finally:
+        if db:
+            await db.close()
@@ -2,46 +2,81 @@ import re
 import json
 import glob
 from tqdm import tqdm
-from nepal_constitution_ai.data_pipeline.chunking import chunk_text_and_map_pages
+from loguru import logger
+from nepal_constitution_ai.data_pipeline.chunking import chunk_text_and_map_pages, index_chunks
 from nepal_constitution_ai.data_pipeline.preprocess_pdf import preprocess_all_pdf
 from nepal_constitution_ai.data_pipeline.gen_doc_summary import generate_doc_summary
 from nepal_constitution_ai.data_pipeline.filter_existing_laws import filter_existing_laws
 from nepal_constitution_ai.data_pipeline.embedding import embed_chunks
-from nepal_constitution_ai.data_pipeline.pinecone_utils import initialize_pinecone, create_index, wait_for_index, upsert_vectors
-from nepal_constitution_ai.data_pipeline.utils import find_key_by_filename, find_entry_by_filename
+from nepal_constitution_ai.data_pipeline.pinecone_utils import initialize_pinecone, create_index, wait_for_index, upsert_vectors, delete_vectors
+from nepal_constitution_ai.data_pipeline.manifest import IngestionManifest, make_chunk_id, hash_document
+from nepal_constitution_ai.data_pipeline.utils import load_previous_vectors, remove_stale_batch_files
+from nepal_constitution_ai.retriever.registry import get_embedding_model_name
+from nepal_constitution_ai.retriever.answer_cache import bump_index_version
+from nepal_constitution_ai.retriever.local_vector_store import LocalVectorIndex
+from nepal_constitution_ai.retriever.bm25_index import BM25Index
+from nepal_constitution_ai.utils.catalog import DocumentCatalog
 from nepal_constitution_ai.config.config import settings
 
 def main():
     """
-    Main function to process a PDF file, embed its content, and store it in a Pinecone index.
+    Main function to process a PDF file, embed its content, and store it in a Pinecone index
+    or in the local vector index, depending on settings.VECTOR_DB.
+
+    The run is incremental: the ingestion manifest records the hashes of the PDFs, OCR
+    pages and chunks of the previous runs, so only new or changed laws are OCRed,
+    embedded and upserted, and the vectors of removed chunks are deleted. Set
+    settings.FULL_REINGEST to process everything again.
     
     Returns:
     None
     """
+    manifest_path = settings.INGESTION_MANIFEST_PATH
+    manifest = IngestionManifest() if settings.FULL_REINGEST else IngestionManifest.load(manifest_path)
+
     ## Preprocess all PDFs in the specified directory and store the OCR JSON files
-    preprocess_all_pdf(settings.DOWNLOADED_PDF_PATH, settings.OCR_JSON_FOLDER_PATH, settings.OCR_JSON_BATCH_SIZE)
+    preprocess_all_pdf(settings.DOWNLOADED_PDF_PATH, settings.OCR_JSON_FOLDER_PATH, settings.OCR_JSON_BATCH_SIZE, manifest=manifest)
+    manifest.save(manifest_path)
 
     # Generate document summaries for all OCR JSON files
     if settings.GENERATE_DOC_SUMMARY:
         generate_doc_summary(settings.OCR_JSON_FOLDER_PATH)
 
-    filter_existing_laws(settings.EXISTING_LAWS_JSON_FILE_PATH, f"{settings.OCR_JSON_FOLDER_PATH}/batch", settings.EXISTING_LAWS_FOLDER_PATH)
+    documents_info_json = f"{settings.DATA_PATH}/documents_info.json"
+    catalog = DocumentCatalog.load(documents_info_json, settings.DOCUMENT_CATALOG_PATH)
+
+    filter_existing_laws(settings.EXISTING_LAWS_JSON_FILE_PATH, f"{settings.OCR_JSON_FOLDER_PATH}/batch", settings.EXISTING_LAWS_FOLDER_PATH, catalog)
 
     # Initialize Pinecone service, create index and wait for pinecone to be ready for upsertion
-    pc = initialize_pinecone()
-    create_index(pc)
-    wait_for_index(pc)
+    use_pinecone = settings.VECTOR_DB == "pinecone"
+    pc = None
+    if use_pinecone:
+        pc = initialize_pinecone()
+        create_index(pc)
+        wait_for_index(pc)
 
     namespace_mapping_filepath = f"{settings.DATA_PATH}/namespace_mapping.json"
-    documents_info_json = f"{settings.DATA_PATH}/documents_info.json"
     existing_laws_json_files = glob.glob(f"{settings.EXISTING_LAWS_FOLDER_PATH}/*.json")
     existing_laws_json_files = sorted(existing_laws_json_files, key=lambda x: int(re.search(r'\d+', x).group()))
     batch_num = 0
-    curr_chunk_num = 31045 # index of the chunk in the current batch for default namespace
     namespace_mapping = {}
-
-    with open(documents_info_json, 'r') as file:
-            documents_info = json.load(file)
+    bm25_index = BM25Index() # Lexical index over the chunks for hybrid search
+
+    # Vectors of the previous run are reused for unchanged chunks, unless the embedding model changed
+    previous_vectors = load_previous_vectors(settings.EMBS_JSON_FOLDER_PATH)
+    # The (namespace, id) of the vectors stored by the previous run; without CREATE_NAMESPACE they are all in the default one
+    previous_keys = {(namespace, i) for i, (_, namespace) in previous_vectors.items()} | manifest.chunk_keys()
+    if not settings.CREATE_NAMESPACE:
+        previous_keys = {(None, chunk_id) for _, chunk_id in previous_keys}
+    embedding_model = f"{settings.EMBEDDING_MODEL_PROVIDER}:{get_embedding_model_name(settings.EMBEDDING_MODEL_PROVIDER)}"
+    reuse_vectors = not settings.FULL_REINGEST and manifest.embedding_model == embedding_model
+    if not reuse_vectors and previous_vectors:
+        logger.info(f"Embedding model changed to {embedding_model}, every chunk will be embedded again")
+    manifest.embedding_model = embedding_model
+
+    current_keys = set()
+    ingested_documents = set()
+    changed_documents = 0
 
     for json_file in tqdm(existing_laws_json_files, "Embedding chunks and uploading to Vector DB"):
         with open(json_file, 'r') as file:
@@ -50,44 +85,81 @@ def main():
         emb_json_filepath = f"{settings.EMBS_JSON_FOLDER_PATH}/embeddings_batch_{batch_num}.json"
         chunks_json_filepath = f"{settings.CHUNKS_JSON_FOLDER_PATH}/chunks_batch_{batch_num}.json"
         batch_vectors = []
+        batch_changed_vectors = []
         batch_chunks = []
-        for doc in docs:    
-            namespace = find_key_by_filename(documents_info, doc['filename'])
+
+        # Chunk every document of the batch first so that the new chunks of all documents
+        # are embedded together in full-sized, concurrent requests
+        docs_chunks = []
+        for doc in docs:
+            namespace = catalog.category(doc['filename'])
             namespace = namespace.replace(" ", "_")
-            doc_link = find_entry_by_filename(documents_info, doc['filename'])['nep_pdf_link']
+            doc_link = catalog.get(doc['filename'])['nep_pdf_link']
 
+            # Load and chunk the PDF content into text chunks and their corresponding metadata
+            _, chunks_dict_with_pagenum = chunk_text_and_map_pages(doc, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+            chunk_ids = [make_chunk_id(doc['filename'], chunk['text']) for chunk in chunks_dict_with_pagenum]
+            docs_chunks.append((chunks_dict_with_pagenum, chunk_ids, namespace, doc_link))
+            batch_chunks.extend(chunks_dict_with_pagenum)
+
+            # Index the chunks for the lexical side of hybrid search as they are created
+            bm25_metadata = {"link": doc_link, "doc_summary": doc.get("summary", "")}
+            if settings.CREATE_NAMESPACE:
+                bm25_metadata["namespace"] = namespace
+            index_chunks(bm25_index, chunk_ids, chunks_dict_with_pagenum, doc['title'], bm25_metadata)
+
+        # Only the chunks without a vector from the previous run are embedded
+        chunks_to_embed = {
+            chunk_id: chunk['text']
+            for chunks_dict_with_pagenum, chunk_ids, _, _ in docs_chunks
+            for chunk, chunk_id in zip(chunks_dict_with_pagenum, chunk_ids)
+            if not (reuse_vectors and chunk_id in previous_vectors)
+        }
+        embedded_chunks = dict(zip(chunks_to_embed.keys(), embed_chunks(list(chunks_to_embed.values()))))
+
+        for doc, (chunks_dict_with_pagenum, chunk_ids, namespace, doc_link) in zip(docs, docs_chunks):
             # Check if the namespace is already in namespace_mapping
             if namespace not in namespace_mapping:
                 namespace_mapping[namespace] = []
-            # Load and chunk the PDF content into text chunks and their corresponding metadata
-            chunks, chunks_dict_with_pagenum = chunk_text_and_map_pages(doc, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
-            batch_chunks.extend(chunks_dict_with_pagenum)
-            
-            embedded_chunks = embed_chunks(batch_num ,chunks)
+
             doc_title = doc['title']
-            doc_summary = doc["summary"]
-            # Prepare the vectors (wi"th IDs and embedded values) for upsertion into Pinecone
-            vectors = [
-                {
-                    "id": f"chunk_{i+curr_chunk_num+1}", 
-                    "values": emb, 
+            doc_summary = doc.get("summary", "")
+            doc_hash = hash_document(doc, namespace, doc_link)
+            doc_changed = not reuse_vectors or manifest.document_hash(doc['filename']) != doc_hash
+            changed_documents += doc_changed
+
+            # Prepare the vectors (with IDs and embedded values) for upsertion into Pinecone
+            vectors = []
+            for chunk, chunk_id in zip(chunks_dict_with_pagenum, chunk_ids):
+                key = (namespace if settings.CREATE_NAMESPACE else None, chunk_id)
+                if key in current_keys: # Repeated chunk text
+                    continue
+                current_keys.add(key)
+
+                values = embedded_chunks.get(chunk_id)
+                if values is None:
+                    values = previous_vectors[chunk_id][0].tolist()
+                vectors.append({
+                    "id": chunk_id,
+                    "values": values,
                     "metadata": {"text": chunk['text'], "source": f"Page {chunk['page']} from {doc_title}", "link": doc_link, "doc_summary": doc_summary}
-                }
-                # Loop through chunks and embeddings to generate vectors list 
-                for i, (chunk, emb) in enumerate(zip(chunks_dict_with_pagenum, embedded_chunks))
-                ]
-
-            curr_chunk_num += len(vectors)
+                })
 
             if settings.CREATE_NAMESPACE: # If aggregate namespace is available then, individual namespace can be ommitted
                 # Upsert (insert or update) the vectors into the respective namespace so that, they can be retrieved from specific namespaces as well
-                upsert_vectors(pc, namespace, vectors)
+                if use_pinecone and doc_changed:
+                    upsert_vectors(pc, namespace, vectors)
                 namespace_mapping[namespace].append(doc_title)
                 for vector in vectors:
                     vector["metadata"]["namespace"] = namespace
 
             # Append vectors to the list of all vectors for creating a aggregate namespace
             batch_vectors.extend(vectors)
+            if doc_changed:
+                batch_changed_vectors.extend(vectors)
+
+            manifest.record_document(doc['filename'], doc_hash, [vector["id"] for vector in vectors], namespace)
+            ingested_documents.add(doc['filename'])
 
         # Store the batch chunks in a JSON file
         with open(chunks_json_filepath, 'w') as json_file:
@@ -103,7 +175,43 @@ def main():
             continue
 
         # Upsert (insert or update) the vectors into the default namespace
-        upsert_vectors(pc, None, batch_vectors)
+        if use_pinecone and batch_changed_vectors:
+            upsert_vectors(pc, None, batch_changed_vectors)
+
+    remove_stale_batch_files(settings.EMBS_JSON_FOLDER_PATH, "embeddings_batch_", batch_num)
+    remove_stale_batch_files(settings.CHUNKS_JSON_FOLDER_PATH, "chunks_batch_", batch_num)
+
+    # Delete the vectors of removed documents, of chunks that changed and of documents
+    # moved to another namespace, from the namespace they were stored in
+    removed_documents = set(manifest.documents) - ingested_documents
+    for filename in removed_documents:
+        manifest.remove_document(filename)
+    stale_ids = {}
+    for namespace, chunk_id in previous_keys - current_keys:
+        stale_ids.setdefault(namespace, []).append(chunk_id)
+    if use_pinecone:
+        for namespace, ids in stale_ids.items():
+            delete_vectors(pc, namespace, ids)
+
+    logger.info(
+        f"Ingested {len(ingested_documents)} documents: {changed_documents} new or changed, "
+        f"{len(removed_documents)} removed, {sum(len(ids) for ids in stale_ids.values())} stale vectors deleted"
+    )
+
+    bm25_index.save(settings.BM25_INDEX_PATH)
+
+    # Build the local vector index from the stored embedding vectors
+    if settings.VECTOR_DB == "local":
+        local_index = LocalVectorIndex.from_embeddings_json(settings.EMBS_JSON_FOLDER_PATH)
+        if settings.LOCAL_INDEX_TYPE == "ivf":
+            local_index.build_ivf(n_lists=settings.IVF_N_LISTS, n_probe=settings.IVF_N_PROBE)
+        local_index.save(settings.LOCAL_INDEX_PATH)
+
+    manifest.save(manifest_path)
+
+    # Invalidate cached answers generated from the previous index contents
+    if changed_documents or stale_ids:
+        bump_index_version()
 
 if __name__ == "__main__":
-    main()  
+    main()
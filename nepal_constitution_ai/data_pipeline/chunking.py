@@ -1,32 +1,44 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from bisect import bisect_right
 import re
 
-def sentence_aware_chunking(text, chunk_size, chunk_overlap):
+def sentence_aware_chunk_spans(text, chunk_size, chunk_overlap):
+    """
+    Splits the text into chunks of at most chunk_size characters, cut at sentence
+    separators, each starting with the last chunk_overlap characters of the previous one.
+
+    Returns:
+        list: The (start, end) character offsets of each chunk in the text.
+    """
     sentences = re.split(r'(\n|  |\|)', text)
-    chunks, current_chunk = [], ""
+    spans = []
+    current_start, current_end = 0, 0 # The current chunk is text[current_start:current_end]
 
     for sentence in sentences:
         # Accumulate sentences until chunk_size is reached
-        if len(current_chunk) + len(sentence) <= chunk_size:
-            current_chunk += sentence
+        if current_end - current_start + len(sentence) <= chunk_size:
+            current_end += len(sentence)
         else:
             # Append the current chunk
-            chunks.append(current_chunk)
-            
+            spans.append((current_start, current_end))
+
             # Start new chunk with overlap from the end of the last chunk
-            overlap_start = max(0, len(current_chunk) - chunk_overlap)
-            current_chunk = current_chunk[overlap_start:] + sentence
+            current_start = max(current_start, current_end - chunk_overlap)
+            current_end += len(sentence)
 
     # Append the last chunk if it has content
-    if current_chunk:
-        if len(current_chunk) > 200:
-            chunks.append(current_chunk)
+    if current_end > current_start:
+        if current_end - current_start > 200 or not spans:
+            spans.append((current_start, current_end))
         else:
             # If the last chunk is too short, add it to the previous chunk
-            chunks[-1] += current_chunk
+            spans[-1] = (spans[-1][0], current_end)
 
+    # A sentence longer than chunk_size leaves an empty chunk before it
+    return [(start, end) for start, end in spans if text[start:end].strip()]
 
-    return chunks
+def sentence_aware_chunking(text, chunk_size, chunk_overlap):
+    return [text[start:end] for start, end in sentence_aware_chunk_spans(text, chunk_size, chunk_overlap)]
 
 def chunk_text_and_map_pages(doc, chunk_size, chunk_overlap):
     """
@@ -60,29 +72,30 @@ def chunk_text_and_map_pages(doc, chunk_size, chunk_overlap):
     #     separators=["\n", " "]
     # )
 
-    # Split the entire text into chunks
-    chunks = sentence_aware_chunking(full_text, chunk_size, chunk_overlap)
+    # Split the entire text into chunks, with their offsets in the full text
+    chunk_spans = sentence_aware_chunk_spans(full_text, chunk_size, chunk_overlap)
 
     # Map each chunk to its corresponding page(s)
+    chunks = []
     chunks_dict_with_pagenum = []
-    for chunk in chunks:
-        # Find the start index of the chunk in the full text
-        chunk_start_index = full_text.find(chunk)
-        chunk_end_index = chunk_start_index + len(chunk)
-
-        # Determine the pages the chunk spans
-        chunk_pages = set()
-        for page_num, page_start in enumerate(page_start_indices, start=1):
-            page_end = page_start + len(pages[page_num - 1])
-            # Check if the chunk overlaps with the page
-            if (page_start <= chunk_start_index < page_end) or (page_start <= chunk_end_index <= page_end):
-                chunk_pages.add(page_num)
+    for chunk_start_index, chunk_end_index in chunk_spans:
+        chunk = full_text[chunk_start_index:chunk_end_index]
+        chunks.append(chunk)
+
+        # Only the stripped text of the chunk is stored, so only its pages count
+        chunk_start_index += len(chunk) - len(chunk.lstrip())
+        chunk_end_index -= len(chunk) - len(chunk.rstrip())
+
+        # Determine the pages of the first and last characters of the chunk; the newline
+        # after a page belongs to that page
+        first_page = bisect_right(page_start_indices, chunk_start_index)
+        last_page = bisect_right(page_start_indices, chunk_end_index - 1)
 
         # Format page range as a string
-        if len(chunk_pages) == 1:
-            page_range = str(next(iter(chunk_pages)))
+        if first_page == last_page:
+            page_range = str(first_page)
         else:
-            page_range = f"{min(chunk_pages)}-{max(chunk_pages)}"
+            page_range = f"{first_page}-{last_page}"
 
         # Append the chunk along with its page range to the results list
         chunks_dict_with_pagenum.append({
@@ -90,4 +103,20 @@ def chunk_text_and_map_pages(doc, chunk_size, chunk_overlap):
             "text": chunk.strip(),
         })
 
-    return chunks, chunks_dict_with_pagenum
\ No newline at end of file
+    return chunks, chunks_dict_with_pagenum
+
+def index_chunks(bm25_index, chunk_ids, chunks_dict_with_pagenum, doc_title, metadata):
+    """
+    Add the chunks of a document to the BM25 lexical index as they are created, with
+    the metadata of their vectors except the text.
+
+    Parameters:
+        bm25_index (BM25Index): The lexical index of the chunks, used for hybrid search.
+        chunk_ids (list): The vector id of each chunk.
+        chunks_dict_with_pagenum (list): The chunks with their page range, as returned by chunk_text_and_map_pages.
+        doc_title (str): Title of the document, used in the chunk source.
+        metadata (dict): Metadata shared by the chunks of the document (link, summary, namespace).
+    """
+    for chunk_id, chunk in zip(chunk_ids, chunks_dict_with_pagenum):
+        # Chunks already indexed, such as repeated chunk texts, are skipped by the index
+        bm25_index.add(chunk_id, chunk['text'], {"source": f"Page {chunk['page']} from {doc_title}", **metadata})
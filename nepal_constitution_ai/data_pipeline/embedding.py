@@ -1,30 +1,78 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_cohere import CohereEmbeddings
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
+from nepal_constitution_ai.retriever.registry import registry
 from nepal_constitution_ai.config.config import settings
 
 
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Whether an embedding request failed on a rate limit or a transient server error.
+    The check relies on the status code or the error name so that it works for both
+    the Cohere and the OpenAI clients.
+    """
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int):
+        return status_code == 429 or status_code >= 500
+
+    error_name = type(error).__name__.lower()
+    message = str(error).lower()
+    return (
+        "ratelimit" in error_name
+        or "toomanyrequests" in error_name
+        or "rate limit" in message
+        or "too many requests" in message
+        or "429" in message
+    )
+
+
+def embed_batch(model, texts: list[str], batch_num: int) -> list[list[float]]:
+    """
+    Embeds one batch of texts, retrying rate-limited and transient failures with
+    exponential backoff and jitter up to settings.EMBEDDING_MAX_RETRIES times.
+    """
+    for attempt in range(settings.EMBEDDING_MAX_RETRIES + 1):
+        try:
+            return model.embed_documents(texts)
+        except Exception as e:
+            if attempt == settings.EMBEDDING_MAX_RETRIES or not is_retryable_error(e):
+                raise e
+
+            delay = settings.EMBEDDING_RETRY_BASE_DELAY * 2 ** attempt
+            delay += random.uniform(0, delay)
+            logger.warning(f"Embedding batch {batch_num} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
 def embed_chunks(chunked_data: list[str]) -> list[list[float]]:
-    """Embeds a list of text chunks into vector representations using the OpenAI embeddings model.
-    Returns the embedded vectors or None if an error occurs.
+    """Embeds a list of text chunks into vector representations using the configured embeddings model.
+    The chunks are sent in batches of settings.EMBEDDING_BATCH_SIZE, with up to
+    settings.EMBEDDING_MAX_CONCURRENCY requests in flight. The vectors are returned
+    in the order of the chunks.
     """
     try:
-        logger.info("Embedding chunks...")
-        if settings.EMBEDDING_MODEL_PROVIDER == "openai":
-            logger.info("Using OpenAI embeddings model: {}".format(settings.OPENAI_EMBEDDING_MODEL))
-            model = OpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY)
-        elif settings.EMBEDDING_MODEL_PROVIDER == "cohere":
-            logger.info("Using Cohere embeddings model: {}".format(settings.COHERE_EMBEDDING_MODEL))
-            model = CohereEmbeddings(model=settings.COHERE_EMBEDDING_MODEL, cohere_api_key=settings.COHERE_API_KEY)
-        else:
-            logger.info("Using OpenAI embeddings model (DEFAULT): {}".format(settings.OPENAI_EMBEDDING_MODEL))
-            model = OpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY)            
-
-        embedded_chunks = model.embed_documents(chunked_data)
-        logger.info("Chunks embedded successfully.")
+        if not chunked_data:
+            return []
+
+        logger.info(f"Embedding {len(chunked_data)} chunks...")
+        model = registry.get_embedding()
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        batches = [chunked_data[i:i + batch_size] for i in range(0, len(chunked_data), batch_size)]
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=settings.EMBEDDING_MAX_CONCURRENCY, thread_name_prefix="embedding") as pool:
+            embedded_batches = pool.map(lambda batch: embed_batch(model, batch[1], batch[0]), enumerate(batches, start=1))
+            embedded_chunks = [embedding for embedded_batch in embedded_batches for embedding in embedded_batch]
+        elapsed = time.perf_counter() - start_time
+
+        logger.info(
+            f"Embedded {len(embedded_chunks)} chunks in {len(batches)} batches in {elapsed:.1f}s "
+            f"({len(embedded_chunks) / elapsed if elapsed else 0:.1f} chunks/s)"
+        )
 
         return embedded_chunks
-    
+
     except Exception as e:  # Catch any exception during the embedding process and return none
-        logger.error(f"An error occurred while embedding chunks: {e}")  
+        logger.error(f"An error occurred while embedding chunks: {e}")
         raise e
@@ -1,14 +1,25 @@
 import os
 import json
+from loguru import logger
+from nepal_constitution_ai.utils.catalog import DocumentCatalog
 
-def filter_existing_laws(existing_laws_json_file, ocr_json_folder, output_json_folder):
+def filter_existing_laws(existing_laws_json_file, ocr_json_folder, output_json_folder, catalog: DocumentCatalog = None):
+    """
+    Keeps the OCRed documents of the existing laws, and with a catalog only the ones
+    it knows, since the ingestion needs their category and link.
+    """
     # Ensure the output folder exists
     os.makedirs(output_json_folder, exist_ok=True)
 
     # Get list of PDFs
     with open(existing_laws_json_file, "r") as f:
         existing_laws_json = json.load(f)
-        pdf_files = existing_laws_json["existing_laws"]
+        pdf_files = set(existing_laws_json["existing_laws"])
+
+    # Remove the filtered files of OCR batches that do not exist anymore
+    for output_file in os.listdir(output_json_folder):
+        if output_file.startswith("filtered_") and not os.path.exists(os.path.join(ocr_json_folder, output_file[len("filtered_"):])):
+            os.remove(os.path.join(output_json_folder, output_file))
 
     # Iterate through JSON files
     for json_file in os.listdir(ocr_json_folder):
@@ -21,6 +32,11 @@ def filter_existing_laws(existing_laws_json_file, ocr_json_folder, output_json_f
 
             # Keep only matching entries
             new_entries = [entry for entry in data if entry.get("filename") in pdf_files]
+            if catalog is not None:
+                unknown_entries = [entry["filename"] for entry in new_entries if entry["filename"] not in catalog]
+                if unknown_entries:
+                    logger.warning(f"Skipping {len(unknown_entries)} documents missing from documents_info.json: {unknown_entries}")
+                new_entries = [entry for entry in new_entries if entry["filename"] in catalog]
 
             # Save the updated JSON
             output_path = os.path.join(output_json_folder, f"filtered_{json_file}")
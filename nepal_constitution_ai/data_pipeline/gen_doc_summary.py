@@ -11,6 +11,7 @@ from nepal_constitution_ai.prompts.prompts import SUMMARIZE_DOCUMENT_PROMPT
 def generate_doc_summary(ocr_json_folder_path):
     """
     Generate document summaries for all OCR JSON files in the specified folder.
+    Documents that already have a summary are skipped.
     """
     # Define the number of pages to consider for generating a summary
     NUM_PAGES_TO_GENERATE_SUMMARY = 2
@@ -29,8 +30,13 @@ def generate_doc_summary(ocr_json_folder_path):
         with open(json_file, 'r') as file:
             docs = json.load(file)
         
-        # Iterate through each document in the batch and generate summary
+        # Iterate through each document in the batch and generate summary. Documents
+        # reused from a previous run already have theirs.
+        updated = False
         for doc in docs:
+            if doc.get('summary'):
+                continue
+            updated = True
             doc['summary'] = ""
 
             pages = doc['pages']
@@ -54,6 +60,9 @@ def generate_doc_summary(ocr_json_folder_path):
                 print(f"Error generating summary for document: {e}")
                 raise e
         
+        if not updated:
+            continue
+
         # Save the updated batch JSON file with summaries
         with open(json_file, 'w') as json_file:
             json.dump(docs, json_file, ensure_ascii=False, indent=4)
\ No newline at end of file
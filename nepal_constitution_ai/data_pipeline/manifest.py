@@ -0,0 +1,116 @@
+import os
+import json
+import hashlib
+from typing import Optional
+from loguru import logger
+
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.data_pipeline.utils import write_json_atomic
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Returns the sha256 of the file content, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(filename: str, chunk_text: str) -> str:
+    """
+    Deterministic vector id of a chunk, derived from the document filename and the
+    chunk content hash, so an unchanged chunk keeps its id across runs.
+    """
+    return hashlib.sha256(f"{filename}\x1f{hash_text(chunk_text)}".encode("utf-8")).hexdigest()[:32]
+
+
+def hash_document(doc: dict, namespace: str, link: str) -> str:
+    """
+    Hash of everything the vectors of a document are built from: its pages, title,
+    summary, namespace and link, and the chunking settings.
+    """
+    content = json.dumps(
+        {
+            "title": doc.get("title", ""),
+            "summary": doc.get("summary", ""),
+            "pages": doc.get("pages", []),
+            "namespace": namespace,
+            "link": link,
+            "chunk_size": settings.CHUNK_SIZE,
+            "chunk_overlap": settings.CHUNK_OVERLAP,
+        },
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hash_text(content)
+
+
+class IngestionManifest:
+    """
+    Record of what the previous ingestion runs processed, used to only redo the work
+    for new or changed laws:
+
+    - pdfs: the content hash of each PDF and the hashes of its OCR pages;
+    - documents: the content hash of each ingested document, its namespace and the
+      ids of its chunks;
+    - embedding_model: the model the stored vectors were embedded with.
+    """
+    def __init__(self, data: Optional[dict] = None) -> None:
+        data = data or {}
+        self.embedding_model: Optional[str] = data.get("embedding_model")
+        self.pdfs: dict[str, dict] = data.get("pdfs", {})
+        self.documents: dict[str, dict] = data.get("documents", {})
+
+    @classmethod
+    def load(cls, path: str) -> "IngestionManifest":
+        """
+        Loads the manifest, or returns an empty one when the file does not exist.
+        """
+        if not os.path.exists(path):
+            logger.info(f"No ingestion manifest at {path}, every document will be processed")
+            return cls()
+
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        write_json_atomic(path, {"embedding_model": self.embedding_model, "pdfs": self.pdfs, "documents": self.documents})
+
+    def pdf_hash(self, filename: str) -> Optional[str]:
+        return self.pdfs.get(filename, {}).get("hash")
+
+    def record_pdf(self, filename: str, pdf_hash: str, page_hashes: list[str]) -> None:
+        self.pdfs[filename] = {"hash": pdf_hash, "page_hashes": page_hashes}
+
+    def prune_pdfs(self, filenames: set[str]) -> None:
+        """
+        Forgets the PDFs that are not in filenames anymore.
+        """
+        for filename in set(self.pdfs) - filenames:
+            del self.pdfs[filename]
+
+    def document_hash(self, filename: str) -> Optional[str]:
+        return self.documents.get(filename, {}).get("hash")
+
+    def record_document(self, filename: str, doc_hash: str, chunk_ids: list[str], namespace: str) -> None:
+        self.documents[filename] = {"hash": doc_hash, "namespace": namespace, "chunk_ids": chunk_ids}
+
+    def remove_document(self, filename: str) -> None:
+        self.documents.pop(filename, None)
+
+    def chunk_keys(self) -> set[tuple[str, str]]:
+        """
+        Returns the (namespace, chunk_id) of every recorded chunk.
+        """
+        return {
+            (document.get("namespace"), chunk_id)
+            for document in self.documents.values()
+            for chunk_id in document.get("chunk_ids", [])
+        }
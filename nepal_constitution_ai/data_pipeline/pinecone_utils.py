@@ -53,3 +53,14 @@ def upsert_vectors(pc: Pinecone, namespace:str, vectors: list[dict]) -> None:
 
     logger.info(f"Upserted {len(vectors)} vectors into Pinecone index {settings.PINECONE_INDEX}.")
 
+def delete_vectors(pc: Pinecone, namespace: str, ids: list[str]) -> None:
+    """Deletes vectors by id from a namespace of the Pinecone index."""
+
+    index = pc.Index(settings.PINECONE_INDEX)
+
+    logger.info(f"Deleting {len(ids)} vectors from namespace {namespace} of Pinecone index {settings.PINECONE_INDEX}...")
+    for i in range(0, len(ids), 1000):
+        try:
+            index.delete(ids=ids[i:i + 1000], namespace=namespace) # Pinecone accepts up to 1000 ids per delete
+        except Exception as e:
+            logger.warning(f"Could not delete vectors from namespace {namespace}: {e}")
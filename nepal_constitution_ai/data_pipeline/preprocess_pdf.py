@@ -1,4 +1,7 @@
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
+from pypdf import PdfReader
+from multiprocessing import get_context
+from collections import Counter
 from tqdm import tqdm
 import numpy as np
 import easyocr
@@ -8,15 +11,30 @@ import glob
 import json
 import os
 import re
+import unicodedata
+from loguru import logger
 
-# Initialize EasyOCR reader
-if torch.cuda.is_available():
-    reader = easyocr.Reader(['ne', 'en'], gpu=True)  # Enable GPU if available
-else:
-    reader = easyocr.Reader(['ne', 'en'], gpu=False)  # Use CPU if GPU is not available
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.data_pipeline.manifest import IngestionManifest, hash_file, hash_text
+from nepal_constitution_ai.data_pipeline.utils import remove_stale_batch_files, write_json_atomic
+
+# EasyOCR reader of the current process, created on first use so that every OCR worker loads its own
+reader = None
 
 nepali_pattern = re.compile(r'[\u0900-\u097F\u0966-\u096F\[\]\(\)\{\},]+') # Checks if the string contains Nepali characters
 
+def get_reader():
+    """Returns the EasyOCR reader of the current process, using the GPU if available"""
+    global reader
+    if reader is None:
+        reader = easyocr.Reader(['ne', 'en'], gpu=torch.cuda.is_available())
+    return reader
+
+def init_ocr_worker():
+    """Initializes an OCR worker process"""
+    # One thread per worker: the pool already runs one worker per core, more threads only contend
+    torch.set_num_threads(1)
+
 def extract_title(filename):
     """Extract the title from filename"""
     # Remove the '.pdf' extension
@@ -29,94 +47,363 @@ def extract_title(filename):
     return title
 
 
+def ocr_image(image):
+    """OCRs a page image into its text and its lines"""
+    # Crop out the top and bottom areas
+    width, height = image.size
+    margin = int(0.06*height)
+    cropped_image = image.crop((0, margin, width, height - margin))
+    # Read text with bounding box details
+    image_np = np.array(cropped_image)
+    results = get_reader().readtext(image_np)
+    if not results: # Blank page
+        return '', []
+
+    # Sort the results line by line, and within each line, left to right
+    results_sorted = sorted(results, key=lambda x: (x[0][0][1], x[0][0][0]))
+
+    page_text = ''
+    page_lines = []
+    current_line_y = results_sorted[0][0][0][1]
+    line_text = []
+
+    for box, text, _ in results_sorted:
+        y_coord = box[0][1]
+
+        # Start a new line if the Y-coordinate differs significantly from the previous line
+        gap = abs(y_coord - current_line_y)
+        if gap > 10:  # Adjust threshold as needed
+            page_text += ' '.join(line_text)
+            page_lines.append((' '.join(line_text)).strip())
+            if gap > 140:
+                page_text += "\n"
+                page_lines.append("\n")
+
+            line_text = []
+            current_line_y = y_coord
+
+        line_text.append(text)
+
+    page_lines.append((' '.join(line_text)).strip())
+    page_text += ' '.join(line_text)  # Add the last line
+
+    return clean_page_text(page_text), page_lines
+
+
+def clean_page_text(page_text):
+    """Removes the Law Commission website address from the page text"""
+    # Cleaning up specific keywords
+    page_text = page_text.replace('www', '')
+    page_text = page_text.replace('lawcommission', '')
+    page_text = page_text.replace('govnp', '')
+    page_text = page_text.replace('gov.np', '')
+    page_text = page_text.replace('gov np', '')
+    page_text = page_text.replace('www.lawcommission.gov.np', '')
+
+    return page_text.strip()
+
+
+def devanagari_ratio(text: str) -> float:
+    """Share of Devanagari characters among the non-space, non-ASCII-punctuation characters of the text"""
+    chars = [char for char in text if not char.isspace() and (char.isalnum() or not char.isascii())]
+    if not chars:
+        return 0.0
+    return sum(1 for char in chars if '\u0900' <= char <= '\u097F') / len(chars)
+
+
+def is_valid_text_layer(text: str) -> bool:
+    """
+    Whether the embedded text of a page can be used instead of OCR. Scanned pages have
+    no text and pages typed with legacy fonts such as Preeti extract as Latin garbage,
+    so the text has to be long enough and mostly Devanagari.
+    """
+    return (
+        len(text.strip()) >= settings.TEXT_LAYER_MIN_CHARS
+        and nepali_pattern.search(text) is not None
+        and devanagari_ratio(text) >= settings.TEXT_LAYER_MIN_DEVANAGARI_RATIO
+    )
+
+
+def extract_text_layer(task):
+    """
+    Extracts the embedded text of the given pages of a PDF, keeping only the pages
+    whose text is valid.
+
+    :param task: The (pdf_path, page_nums) of the pages, numbered from 1.
+    :return: The (pdf_path, {page_num: (page_text, page_lines)}, extraction_time) of the valid pages.
+    """
+    pdf_path, page_nums = task
+    start_time = time.time()
+    text_pages = {}
+    try:
+        pdf_reader = PdfReader(pdf_path)
+        for page_num in page_nums:
+            if page_num > len(pdf_reader.pages):
+                break
+            text = unicodedata.normalize("NFC", pdf_reader.pages[page_num - 1].extract_text() or "")
+            if is_valid_text_layer(text):
+                page_lines = [line.strip() for line in text.splitlines() if line.strip()]
+                text_pages[page_num] = (clean_page_text(" ".join(page_lines)), page_lines)
+    except Exception as e: # Encrypted or malformed PDFs are OCRed
+        logger.warning(f"Could not extract the text layer of {pdf_path}: {e}")
+
+    return pdf_path, text_pages, time.time() - start_time
+
+
+def render_pages(pdf_path: str, first_page: int, last_page: int) -> list:
+    """Rasterizes the pages first_page to last_page (included) of the PDF"""
+    return convert_from_path(
+        pdf_path, dpi=settings.OCR_DPI, grayscale=settings.OCR_GRAYSCALE,
+        first_page=first_page, last_page=last_page,
+    )
+
+
+def render_page(pdf_path: str, page_num: int):
+    return render_pages(pdf_path, page_num, page_num)[0]
+
+
+def iter_page_images(pdf_path: str, page_nums: list[int] = None):
+    """
+    Yields the (page_num, image) of the given pages of the PDF, all by default,
+    rasterized settings.OCR_PAGE_WINDOW consecutive pages at a time so that memory
+    does not grow with the length of the document.
+    """
+    if page_nums is None:
+        page_nums = list(range(1, pdfinfo_from_path(pdf_path)["Pages"] + 1))
+    window = max(settings.OCR_PAGE_WINDOW, 1)
+
+    i = 0
+    while i < len(page_nums):
+        # Extend the window over the following pages as long as they are consecutive
+        j = i + 1
+        while j < len(page_nums) and j - i < window and page_nums[j] == page_nums[j - 1] + 1:
+            j += 1
+        images = render_pages(pdf_path, page_nums[i], page_nums[j - 1])
+        # Hand the images over one by one so that each can be freed once it is OCRed
+        for page_num in page_nums[i:j]:
+            yield page_num, images.pop(0)
+        i = j
+
+
+def ocr_pdf_page(task):
+    """
+    OCRs one page of a PDF, the unit of work of the OCR pool.
+
+    :param task: The (pdf_path, page_num) of the page, numbered from 1.
+    :return: The (pdf_path, page_num, page_text, page_lines, ocr_time) of the page.
+    """
+    pdf_path, page_num = task
+    start_time = time.time()
+    with render_page(pdf_path, page_num) as image:
+        page_text, page_lines = ocr_image(image)
+    return pdf_path, page_num, page_text, page_lines, time.time() - start_time
+
+
 def pdf_to_nepali_text(pdf_path):
-    pages = []
-    doc_lines = []
-    images = convert_from_path(pdf_path)
+    """
+    Extracts the text of a PDF page by page, from the embedded text layer when it is
+    valid and with OCR otherwise, rendering only a window of pages at a time
+    """
     filename = pdf_path.split("/")[-1]
     start_time = time.time()
+    page_nums = list(range(1, pdfinfo_from_path(pdf_path)["Pages"] + 1))
 
-    for image in images:
-        # Crop out the top and bottom areas
-        width, height = image.size
-        margin = int(0.06*height)
-        cropped_image = image.crop((0, margin, width, height - margin))
-        # Read text with bounding box details
-        image_np = np.array(cropped_image)
-        results = reader.readtext(image_np)
-        
-        # Sort the results line by line, and within each line, left to right
-        results_sorted = sorted(results, key=lambda x: (x[0][0][1], x[0][0][0]))
-
-        page_text = ''
-        page_lines = []
-        current_line_y = results_sorted[0][0][0][1]
-        line_text = []
-
-        for box, text, _ in results_sorted:
-            y_coord = box[0][1]
-            
-            # Start a new line if the Y-coordinate differs significantly from the previous line
-            gap = abs(y_coord - current_line_y)
-            if gap > 10:  # Adjust threshold as needed
-                page_text += ' '.join(line_text)
-                page_lines.append((' '.join(line_text)).strip())
-                if gap > 140:
-                    page_text += "\n"
-                    page_lines.append("\n")
-                
-                line_text = []
-                current_line_y = y_coord
-
-            line_text.append(text)
-
-        page_lines.append((' '.join(line_text)).strip())
-        page_text += ' '.join(line_text)  # Add the last line
-
-        # Cleaning up specific keywords
-        page_text = page_text.replace('www', '')
-        page_text = page_text.replace('lawcommission', '')
-        page_text = page_text.replace('govnp', '')
-        page_text = page_text.replace('gov.np', '')
-        page_text = page_text.replace('gov np', '')
-        page_text = page_text.replace('www.lawcommission.gov.np', '')
-
-        pages.append(page_text.strip())
-        doc_lines.append(page_lines)
+    text_pages = extract_text_layer((pdf_path, page_nums))[1] if settings.USE_TEXT_LAYER else {}
+    ocr_pages = {}
+    for page_num, image in iter_page_images(pdf_path, [page_num for page_num in page_nums if page_num not in text_pages]):
+        with image:
+            ocr_pages[page_num] = ocr_image(image)
 
     end_time = time.time()
-    
+
     title = extract_title(filename)
     pdf_data = {
         "title": title,
-        "page_count": len(images),
+        "page_count": len(page_nums),
         "filename": filename,
         "ocr_time": f'{end_time - start_time} sec',
-        "pages": pages,
-        "lines": doc_lines
+        "pages": [(text_pages.get(page_num) or ocr_pages[page_num])[0] for page_num in page_nums],
+        "lines": [(text_pages.get(page_num) or ocr_pages[page_num])[1] for page_num in page_nums],
+        "page_sources": ["text" if page_num in text_pages else "ocr" for page_num in page_nums]
     }
-    
+
     return pdf_data
 
-def preprocess_all_pdf(pdf_folder_path: str, ocr_json_folder_path: str, ocr_json_batch_size: int):
+
+class PdfOcrProgress:
+    """
+    OCR progress of one PDF. Every done page, from the text layer or OCRed, is appended
+    to a checkpoint file named after the PDF content hash, so that a killed run resumes
+    with the missing pages only. The checkpoint is removed once the PDF's batch file
+    is written.
+    """
+    def __init__(self, pdf_path: str, pdf_hash: str, checkpoint_folder_path: str) -> None:
+        self.pdf_path = pdf_path
+        self.filename = os.path.basename(pdf_path)
+        self.pdf_hash = pdf_hash
+        self.page_count = pdfinfo_from_path(pdf_path)["Pages"]
+        self.checkpoint_path = f"{checkpoint_folder_path}/{pdf_hash}.jsonl"
+        self.pages = {}
+
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as f:
+                for line in f:
+                    try:
+                        page = json.loads(line)
+                    except json.JSONDecodeError: # Line cut off by the kill
+                        continue
+                    self.pages[page["page"]] = page
+
+    def missing_pages(self) -> list[int]:
+        return [page_num for page_num in range(1, self.page_count + 1) if page_num not in self.pages]
+
+    def add_page(self, page_num: int, page_text: str, page_lines: list, ocr_time: float, source: str = "ocr") -> None:
+        page = {"page": page_num, "text": page_text, "lines": page_lines, "ocr_time": ocr_time, "source": source}
+        self.pages[page_num] = page
+        with open(self.checkpoint_path, "a") as f:
+            f.write(json.dumps(page, ensure_ascii=False) + "\n")
+
+    def is_complete(self) -> bool:
+        return len(self.pages) == self.page_count
+
+    def to_pdf_data(self) -> dict:
+        pages = [self.pages[page_num] for page_num in range(1, self.page_count + 1)]
+        return {
+            "title": extract_title(self.filename),
+            "page_count": self.page_count,
+            "filename": self.filename,
+            "pdf_hash": self.pdf_hash,
+            "ocr_time": f'{sum(page["ocr_time"] for page in pages)} sec',
+            "pages": [page["text"] for page in pages],
+            "lines": [page["lines"] for page in pages],
+            "page_sources": [page.get("source", "ocr") for page in pages]
+        }
+
+
+def load_ocr_results(ocr_json_folder_path: str) -> dict:
+    """Loads the OCR results of the previous runs by PDF filename"""
+    ocr_results = {}
+    for json_file_path in glob.glob(f"{ocr_json_folder_path}/batch/batch_*.json"):
+        with open(json_file_path, "r") as f:
+            for pdf_data in json.load(f):
+                ocr_results[pdf_data["filename"]] = pdf_data
+
+    return ocr_results
+
+def get_ocr_workers() -> int:
+    if settings.OCR_WORKERS > 0:
+        return settings.OCR_WORKERS
+    # A single process keeps the GPU busy, on CPU the pages are spread over all cores
+    return 1 if torch.cuda.is_available() else os.cpu_count() or 1
+
+def preprocess_all_pdf(pdf_folder_path: str, ocr_json_folder_path: str, ocr_json_batch_size: int, manifest: IngestionManifest = None):
+    """
+    OCRs every PDF of the folder into batch JSON files of ocr_json_batch_size PDFs, in
+    the order of the PDF filenames.
+
+    Pages with a valid embedded text layer are extracted directly, the other pages
+    are OCRed. The work is distributed over a pool of settings.OCR_WORKERS processes,
+    each with its own EasyOCR reader. Each done page is checkpointed, so a killed run
+    resumes where it stopped, and each batch file is written as soon as all its PDFs
+    are done, after which their checkpoints are removed. PDFs whose content hash did not
+    change since the previous run reuse their previous OCR result from the batch files.
+    With a manifest, the PDF and page hashes are recorded in the manifest.
+    """
     pdf_list = glob.glob(f"{pdf_folder_path}/*.pdf")
     pdf_list = sorted(pdf_list)
-    json_batch_size = ocr_json_batch_size
-    pdf_data_list = []
+    batches = [pdf_list[i:i + ocr_json_batch_size] for i in range(0, len(pdf_list), ocr_json_batch_size)]
+    checkpoint_folder_path = f"{ocr_json_folder_path}/pages"
+    previous_results = load_ocr_results(ocr_json_folder_path)
 
     os.makedirs(f"{ocr_json_folder_path}/batch", exist_ok=True)
-    for i, pdf in enumerate(tqdm(pdf_list, desc="Processing PDFs"), start=1):
-        pdf_data = pdf_to_nepali_text(pdf)
-        pdf_data_list.append(pdf_data)
-        if i % json_batch_size == 0:
-            batch_num = int(i/json_batch_size)
-            json_file_path = f"{ocr_json_folder_path}/batch/batch_{batch_num}.json"
-            with open(json_file_path, "w") as f:
-                    json.dump(pdf_data_list, f, ensure_ascii=False, indent=4)
-            pdf_data_list = []
-
-    batch_num += 1 
-    json_file_path = f"{ocr_json_folder_path}/batch/batch_{batch_num}.json"
-    with open(json_file_path, "w") as f:
-            json.dump(pdf_data_list, f, ensure_ascii=False, indent=4)
-    pdf_data_list = []  
\ No newline at end of file
+    os.makedirs(checkpoint_folder_path, exist_ok=True)
+
+    pdf_hashes = {}
+    reused_count = 0
+    pdf_results = {} # OCR result of each done PDF by path
+    in_progress = {} # OCR progress of the other PDFs by path
+    for pdf in tqdm(pdf_list, desc="Checking PDFs"):
+        filename = os.path.basename(pdf)
+        pdf_hashes[pdf] = hash_file(pdf)
+        pdf_data = previous_results.get(filename)
+        previous_hash = pdf_data.get("pdf_hash") if pdf_data is not None else None
+        if previous_hash is None and manifest is not None: # Batch files written before the hash was stored
+            previous_hash = manifest.pdf_hash(filename)
+        if pdf_data is not None and previous_hash == pdf_hashes[pdf]:
+            pdf_results[pdf] = {**pdf_data, "pdf_hash": pdf_hashes[pdf]}
+            reused_count += 1
+            continue
+
+        progress = PdfOcrProgress(pdf, pdf_hashes[pdf], checkpoint_folder_path)
+        if progress.is_complete():
+            pdf_results[pdf] = progress.to_pdf_data()
+        else:
+            in_progress[pdf] = progress
+
+    written_batches = 0
+    def write_done_batches():
+        # Batches are written in order, each once all its PDFs are done
+        nonlocal written_batches
+        while written_batches < len(batches) and all(pdf in pdf_results for pdf in batches[written_batches]):
+            json_file_path = f"{ocr_json_folder_path}/batch/batch_{written_batches + 1}.json"
+            write_json_atomic(json_file_path, [pdf_results[pdf] for pdf in batches[written_batches]])
+            # The batch file now holds the pages, so they are not kept twice on disk
+            for pdf in batches[written_batches]:
+                checkpoint_path = f"{checkpoint_folder_path}/{pdf_hashes[pdf]}.jsonl"
+                if os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
+            written_batches += 1
+
+    write_done_batches()
+
+    def add_page(pdf, page_num, page_text, page_lines, ocr_time, source):
+        progress = in_progress[pdf]
+        progress.add_page(page_num, page_text, page_lines, ocr_time, source)
+        if progress.is_complete():
+            pdf_results[pdf] = progress.to_pdf_data()
+            write_done_batches()
+
+    page_count = sum(len(progress.missing_pages()) for progress in in_progress.values())
+    ocr_workers = min(get_ocr_workers(), page_count) or 1
+    pool = get_context("spawn").Pool(ocr_workers, initializer=init_ocr_worker) if ocr_workers > 1 else None
+    imap = pool.imap_unordered if pool is not None else map
+    try:
+        # Pages with a valid embedded text layer skip OCR
+        if settings.USE_TEXT_LAYER:
+            text_tasks = [(pdf, progress.missing_pages()) for pdf, progress in in_progress.items()]
+            for pdf, text_pages, extraction_time in tqdm(imap(extract_text_layer, text_tasks), total=len(text_tasks), desc="Text layers"):
+                for page_num, (page_text, page_lines) in text_pages.items():
+                    add_page(pdf, page_num, page_text, page_lines, extraction_time / len(text_pages), "text")
+
+        tasks = [(pdf, page_num) for pdf, progress in in_progress.items() for page_num in progress.missing_pages()]
+        if tasks:
+            logger.info(f"OCRing {len(tasks)} pages of {len(in_progress)} PDFs with {ocr_workers} workers")
+
+        start_time = time.time()
+        # Pages are OCRed in any order, the results are put back in order by PdfOcrProgress
+        for pdf, page_num, page_text, page_lines, ocr_time in tqdm(imap(ocr_pdf_page, tasks), total=len(tasks), desc="OCR pages"):
+            add_page(pdf, page_num, page_text, page_lines, ocr_time, "ocr")
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if tasks:
+        elapsed = time.time() - start_time
+        logger.info(f"OCRed {len(tasks)} pages in {elapsed:.1f}s ({len(tasks) / elapsed if elapsed else 0:.2f} pages/s)")
+
+    page_sources = Counter(source for pdf in in_progress for source in pdf_results[pdf]["page_sources"])
+    logger.info(f"Pages of the new or changed PDFs: {page_sources['text']} from the text layer, {page_sources['ocr']} OCRed")
+
+    # Batch files of a previous run with more PDFs would be read as current documents
+    remove_stale_batch_files(f"{ocr_json_folder_path}/batch", "batch_", len(batches))
+
+    # Checkpoints whose hash matches no input PDF belong to PDFs that were removed or changed
+    current_checkpoints = {f"{pdf_hash}.jsonl" for pdf_hash in pdf_hashes.values()}
+    for checkpoint_file in os.listdir(checkpoint_folder_path):
+        if checkpoint_file not in current_checkpoints:
+            os.remove(os.path.join(checkpoint_folder_path, checkpoint_file))
+
+    if manifest is not None:
+        for pdf, pdf_data in pdf_results.items():
+            manifest.record_pdf(os.path.basename(pdf), pdf_hashes[pdf], [hash_text(page) for page in pdf_data["pages"]])
+        manifest.prune_pdfs({os.path.basename(pdf) for pdf in pdf_list})
+    logger.info(f"OCR done for {len(pdf_list) - reused_count} new or changed PDFs, {reused_count} unchanged PDFs reused")
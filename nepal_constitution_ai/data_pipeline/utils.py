@@ -1,55 +1,45 @@
-def find_key_by_filename(data, filename):
-    """
-    Search for the parent key in the JSON structure by matching the filename.
+import os
+import re
+import glob
+import json
+import numpy as np
 
-    :param data: JSON object (can be a dictionary or a list).
-    :param filename: The filename to search for.
-    :return: The parent key containing the filename, or None if not found.
+def write_json_atomic(file_path: str, data) -> None:
+    """
+    Writes the data as JSON through a temporary file that replaces file_path, so that an
+    interrupted run never leaves a truncated file behind.
     """
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict) and item.get("filename", "").strip() == filename.strip():
-                        return key
-            elif isinstance(value, dict):
-                result = find_key_by_filename(value, filename)
-                if result:
-                    return result
-    elif isinstance(data, list):
-        for item in data:
-            if isinstance(item, (dict, list)):
-                result = find_key_by_filename(item, filename)
-                if result:
-                    return result
-    return None
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, file_path)
+
 
+def remove_stale_batch_files(folder_path: str, prefix: str, last_batch_num: int) -> None:
+    """
+    Removes the `{prefix}{n}.json` batch files of the folder numbered above last_batch_num,
+    left over from a previous run that produced more batches.
+    """
+    for file_path in glob.glob(f"{folder_path}/{prefix}*.json"):
+        match = re.search(rf"{re.escape(prefix)}(\d+)\.json$", file_path)
+        if match and int(match.group(1)) > last_batch_num:
+            os.remove(file_path)
 
 
-def find_entry_by_filename(data, filename):
+def load_previous_vectors(embs_json_folder_path: str) -> dict:
     """
-    Search for an entry in the JSON structure by matching the filename.
-    
-    :param data: JSON object (can be a dictionary or a list).
-    :param filename: The filename to search for.
-    :return: The entire entry containing the filename, or None if not found.
+    Loads the vectors stored by the previous ingestion run.
+
+    :param embs_json_folder_path: The folder of the `embeddings_batch_*.json` files.
+    :return: A dictionary mapping each vector id to its (float32 values, namespace).
     """
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if isinstance(value, dict) or isinstance(value, list):
-                # Recursively search in nested structures
-                result = find_entry_by_filename(value, filename)
-                if result:
-                    return result
-            elif key == "filename" and value.strip() == filename.strip():
-                # Return the entire dictionary or list containing the matching filename
-                return data
-    elif isinstance(data, list):
-        for item in data:
-            if isinstance(item, dict) or isinstance(item, list):
-                # Recursively search in nested structures
-                result = find_entry_by_filename(item, filename)
-                if result:
-                    return result
-    return None
+    previous_vectors = {}
+    for emb_json_file in glob.glob(f"{embs_json_folder_path}/embeddings_batch_*.json"):
+        with open(emb_json_file, "r") as f:
+            for vector in json.load(f):
+                previous_vectors[vector["id"]] = (
+                    np.asarray(vector["values"], dtype=np.float32),
+                    vector["metadata"].get("namespace"),
+                )
 
+    return previous_vectors
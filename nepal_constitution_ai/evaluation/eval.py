@@ -4,7 +4,7 @@ from nepal_constitution_ai.config.config import settings
 from nepal_constitution_ai.retriever.utils import get_llm
 from nepal_constitution_ai.chat.schemas import ChatHistory
 from nepal_constitution_ai.evaluation.data import eval_data
-from nepal_constitution_ai.retriever.retriever_base import Retriever
+from nepal_constitution_ai.retriever.retriever_base import get_retriever
 from ragas.metrics import context_precision, answer_relevancy, faithfulness
 
 def run_eval() -> dict: 
@@ -20,15 +20,14 @@ def run_eval() -> dict:
     # Initialize ChatHistory and Retriever
     chat_history = ChatHistory()
 
-    retriever = Retriever(
+    retriever = get_retriever(
             llm=settings.OPENAI_MODEL,
-            chat_history=chat_history,
             mode="evaluation"
         )
 
     # Iterate through questions and get responses
     for i, question in enumerate(eval_data.get("question", "")):
-        response = retriever.invoke(query = question)
+        response = retriever.invoke(query = question, chat_history=chat_history)
         context = response.get("context", "").split("\n\n")
         answer = response.get("answer", "").content
         eval_data.get("answer", "").append(answer)
@@ -0,0 +1,87 @@
+import time
+import argparse
+import numpy as np
+
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.retriever.ann_index import IVFIndex
+from nepal_constitution_ai.retriever.local_vector_store import LocalVectorIndex
+
+
+def exact_top_k(embeddings: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = embeddings @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def run_benchmark(
+    index: LocalVectorIndex,
+    n_lists: int = 0,
+    n_probes: tuple = (1, 2, 4, 8, 16, 32),
+    k: int = 25,
+    n_queries: int = 200,
+    noise: float = 0.05,
+    seed: int = 0,
+) -> list[dict]:
+    """
+    Measures recall@k and query latency of the IVF index against exact search.
+    Queries are randomly chosen chunk embeddings with Gaussian noise added, so they
+    resemble real queries without being exact copies of indexed vectors.
+
+    Returns:
+        list[dict]: One row per n_probe with recall@k and mean latencies in milliseconds.
+    """
+    embeddings = np.asarray(index.embeddings, dtype=np.float32)
+    k = min(k, len(embeddings))
+    rng = np.random.default_rng(seed)
+
+    queries = embeddings[rng.choice(len(embeddings), min(n_queries, len(embeddings)), replace=False)]
+    queries = queries + rng.normal(scale=noise, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(embeddings, n_lists=n_lists)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = [set(exact_top_k(embeddings, query, k).tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    results = []
+    for n_probe in n_probes:
+        if n_probe > ivf.n_lists:
+            break
+        recalls = []
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact):
+            found = {row for row, _ in ivf.search(embeddings, query, k, n_probe=n_probe)}
+            recalls.append(len(found & expected) / k)
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        results.append({
+            "n_lists": ivf.n_lists,
+            "n_probe": n_probe,
+            f"recall@{k}": float(np.mean(recalls)),
+            "ivf_ms": ivf_ms,
+            "exact_ms": exact_ms,
+            "build_s": build_time,
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF index against exact search on the local vector index")
+    parser.add_argument("--n-lists", type=int, default=settings.IVF_N_LISTS)
+    parser.add_argument("--n-probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--k", type=int, default=settings.TOP_K)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    index = LocalVectorIndex.load_or_build(settings.LOCAL_INDEX_PATH, settings.EMBS_JSON_FOLDER_PATH)
+    print(f"Vectors: {len(index)}")
+    for row in run_benchmark(index, args.n_lists, tuple(args.n_probes), args.k, args.queries):
+        print(", ".join(f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
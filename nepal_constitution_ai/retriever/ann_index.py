@@ -0,0 +1,197 @@
+import os
+from typing import Optional
+import numpy as np
+from loguru import logger
+
+IVF_FILENAME = "ivf.npz"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def assign_to_centroids(data: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """
+    Returns the index of the most similar centroid for every row, computed in batches
+    so that memory stays bounded for large matrices.
+    """
+    assignments = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), batch_size):
+        batch = np.asarray(data[start:start + batch_size], dtype=np.float32)
+        assignments[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(
+    data: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0
+) -> np.ndarray:
+    """
+    Clusters row-normalized vectors with k-means on cosine similarity and returns
+    the normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = np.array(data[rng.choice(len(data), n_clusters, replace=False)], dtype=np.float32)
+
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Re-seed empty clusters with random points so every list stays in use
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+
+        new_centroids = _normalize(sums)
+        if np.allclose(new_centroids, centroids, atol=1e-6):
+            break
+        centroids = new_centroids
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted file index for approximate nearest neighbour search. The vectors are
+    partitioned into `n_lists` clusters by spherical k-means; a query only scans the
+    rows of its `n_probe` closest clusters. Raising n_probe trades latency for recall,
+    with n_probe == n_lists being an exact search.
+    """
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray, n_probe: int = 8) -> None:
+        self.centroids = centroids
+        # Rows of list i are list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.n_probe = n_probe
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        n_lists: int = 0,
+        n_iter: int = 20,
+        train_size: int = 0,
+        n_probe: int = 8,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Builds the index over row-normalized embeddings.
+
+        Args:
+            embeddings (np.ndarray): The row-normalized embedding matrix.
+            n_lists (int): Number of clusters, 0 picks about sqrt(number of rows).
+            n_iter (int): Maximum number of k-means iterations.
+            train_size (int): Number of rows sampled to train the centroids, 0 picks 64 per list.
+            n_probe (int): Default number of clusters scanned per query.
+            seed (int): Random seed of the centroid initialization and training sample.
+        """
+        n_rows = len(embeddings)
+        if n_rows == 0:
+            # An index without lists, whose searches return nothing
+            dimension = embeddings.shape[1] if embeddings.ndim == 2 else 0
+            return cls(
+                np.empty((0, dimension), dtype=np.float32), np.zeros(1, dtype=np.int64),
+                np.empty(0, dtype=np.int64), n_probe=n_probe,
+            )
+
+        n_lists = n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+        train_size = min(train_size or 64 * n_lists, n_rows)
+
+        rng = np.random.default_rng(seed)
+        train_rows = np.sort(rng.choice(n_rows, train_size, replace=False))
+        centroids = spherical_kmeans(np.asarray(embeddings[train_rows], dtype=np.float32), n_lists, n_iter, seed)
+
+        assignments = assign_to_centroids(embeddings, centroids)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+
+        logger.info(f"Built IVF index with {n_lists} lists over {n_rows} vectors")
+        return cls(centroids, list_offsets, list_rows, n_probe=n_probe)
+
+    def add(self, embeddings: np.ndarray, start_row: int) -> "IVFIndex":
+        """
+        Returns a new index with the rows of the row-normalized embeddings, numbered from
+        start_row, added to the lists of their closest centroids. The centroids are not
+        retrained, so the index should be rebuilt once many rows were added.
+        """
+        list_assignments = np.repeat(np.arange(self.n_lists), np.diff(self.list_offsets))
+        assignments = np.concatenate([list_assignments, assign_to_centroids(embeddings, self.centroids)])
+        rows = np.concatenate([self.list_rows, np.arange(start_row, start_row + len(embeddings), dtype=np.int64)])
+
+        order = np.argsort(assignments, kind="stable")
+        list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=self.n_lists))
+        return IVFIndex(self.centroids, list_offsets, rows[order], n_probe=self.n_probe)
+
+    def candidate_rows(self, query: np.ndarray, n_probe: Optional[int] = None) -> np.ndarray:
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        if n_probe == 0:
+            return np.empty(0, dtype=np.int64)
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe])
+
+    def search(
+        self,
+        embeddings: np.ndarray,
+        query_vector: list[float],
+        k: int,
+        n_probe: Optional[int] = None,
+        allowed_rows: Optional[np.ndarray] = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Returns the approximate k (row, cosine similarity) pairs closest to the query.
+
+        Args:
+            embeddings (np.ndarray): The row-normalized embedding matrix the index was built on.
+            query_vector (list[float]): The query embedding.
+            k (int): Number of results.
+            n_probe (int, optional): Clusters to scan, defaults to the index's n_probe.
+            allowed_rows (np.ndarray, optional): Sorted rows that results are restricted to.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        rows = self.candidate_rows(query, n_probe)
+        if allowed_rows is not None:
+            rows = rows[np.isin(rows, allowed_rows, assume_unique=True)]
+        if len(rows) == 0:
+            return []
+
+        rows = np.sort(rows)
+        scores = np.asarray(embeddings[rows], dtype=np.float32) @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def save(self, index_path: str) -> None:
+        os.makedirs(index_path, exist_ok=True)
+        np.savez(
+            os.path.join(index_path, IVF_FILENAME),
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+        )
+
+    @classmethod
+    def load(cls, index_path: str, n_probe: int = 8) -> Optional["IVFIndex"]:
+        """
+        Loads the saved index, or returns None when the index path has none.
+        """
+        ivf_path = os.path.join(index_path, IVF_FILENAME)
+        if not os.path.exists(ivf_path):
+            return None
+
+        data = np.load(ivf_path)
+        return cls(data["centroids"], data["list_offsets"], data["list_rows"], n_probe=n_probe)
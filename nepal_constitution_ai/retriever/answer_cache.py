@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+from typing import Optional
+from collections import OrderedDict
+import numpy as np
+from loguru import logger
+
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.utils.metrics import Counters, hit_rate
+
+
+def get_index_version_path() -> str:
+    return f"{settings.DATA_PATH}/index_version.json"
+
+
+def bump_index_version() -> None:
+    """
+    Records that the vector index was re-ingested. Answer caches in every running
+    process notice the new version on their next lookup and drop their entries.
+    """
+    with open(get_index_version_path(), "w") as f:
+        json.dump({"version": time.time()}, f)
+
+
+def read_index_version() -> Optional[float]:
+    try:
+        return os.stat(get_index_version_path()).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class SemanticAnswerCache:
+    """
+    Cache of previous answers keyed by the embedding of the user question. A lookup
+    returns the entry of the most similar previous question when its cosine
+    similarity reaches the threshold. As short questions can be close while asking
+    about different laws, the candidate is only used once `match` confirms that the
+    reformulated question is as similar and was searched in the same categories.
+    The cache is cleared whenever the index version changes, so answers never
+    outlive the documents they were generated from.
+    """
+    def __init__(self, max_size: int, threshold: float) -> None:
+        self.max_size = max_size
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._next_id = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: list[int] = []
+        self._index_version = read_index_version()
+        self.counters = Counters()
+
+    def _check_index_version(self) -> None:
+        index_version = read_index_version()
+        if index_version != self._index_version:
+            logger.info("Vector index was re-ingested, clearing the answer cache")
+            self._entries.clear()
+            self._matrix = None
+            self._index_version = index_version
+            self.counters.incr("invalidations")
+
+    def _get_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None and self._entries:
+            self._matrix_ids = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[i]["vector"] for i in self._matrix_ids])
+        return self._matrix
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_vector: list[float]) -> Optional[dict]:
+        """
+        Returns the entry of the closest previous question, with its reformulated
+        question, categories and answer, or None when no previous question is similar
+        enough. The entry is a candidate to confirm with `match`.
+        """
+        query_vector = self._normalize(query_vector)
+        with self._lock:
+            self._check_index_version()
+            matrix = self._get_matrix()
+            if matrix is None:
+                self.counters.incr("misses")
+                return None
+
+            similarities = matrix @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.counters.incr("misses")
+                return None
+
+            entry_id = self._matrix_ids[best]
+            return {"id": entry_id, "similarity": float(similarities[best]), **self._entries[entry_id]}
+
+    def match(
+        self,
+        candidate: dict,
+        reformulated_vector: Optional[list[float]] = None,
+        categories: Optional[list[str]] = None,
+    ) -> Optional[dict]:
+        """
+        Returns the cached answer (answer, source, link) of the candidate when its
+        reformulated question is similar enough to the new one and was searched in
+        the same categories, or None. Without a reformulated vector the candidate is
+        accepted as is.
+        """
+        if reformulated_vector is not None:
+            similarity = float(candidate["reformulated_vector"] @ self._normalize(reformulated_vector))
+            if similarity < self.threshold or sorted(candidate["categories"]) != sorted(categories or []):
+                self.counters.incr("rejections")
+                self.counters.incr("misses")
+                return None
+
+        with self._lock:
+            if candidate["id"] in self._entries:
+                self._entries.move_to_end(candidate["id"])
+            self.counters.incr("hits")
+
+        logger.info(f"Answer cache hit (similarity {candidate['similarity']:.3f}): {candidate['reformulated_question']}")
+        return dict(candidate["answer"])
+
+    def add(
+        self,
+        query_vector: list[float],
+        user_question: str,
+        reformulated_question: str,
+        reformulated_vector: list[float],
+        categories: list[str],
+        answer: dict,
+    ) -> None:
+        with self._lock:
+            self._check_index_version()
+            self._entries[self._next_id] = {
+                "vector": self._normalize(query_vector),
+                "user_question": user_question,
+                "reformulated_question": reformulated_question,
+                "reformulated_vector": self._normalize(reformulated_vector),
+                "categories": list(categories or []),
+                "answer": dict(answer),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.counters.incr("evictions")
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        counts = self.counters.snapshot()
+        with self._lock:
+            size = len(self._entries)
+
+        return {
+            **counts,
+            "size": size,
+            "hit_rate": hit_rate(counts.get("hits", 0), counts.get("misses", 0)),
+        }
+
+
+answer_cache = SemanticAnswerCache(
+    max_size=settings.ANSWER_CACHE_SIZE,
+    threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+)
+
+__all__ = ["answer_cache", "SemanticAnswerCache", "bump_index_version"]
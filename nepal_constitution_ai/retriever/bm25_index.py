@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import math
+import unicodedata
+from typing import Iterable, Optional
+from collections import Counter, defaultdict
+from loguru import logger
+from langchain_core.documents import Document
+
+# Devanagari digits are indexed as ASCII digits so that "२०७२" and "2072" match each other
+DEVANAGARI_DIGITS = str.maketrans("०१२३४५६७८९", "0123456789")
+# Devanagari letters and signs (without the danda punctuation and digits), Latin words and numbers
+TOKEN_PATTERN = re.compile(r"[ऀ-ॣॱ-ॿ]+|[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits Nepali/English text into lowercase word and number tokens.
+    """
+    text = unicodedata.normalize("NFC", text).translate(DEVANAGARI_DIGITS).lower()
+    return TOKEN_PATTERN.findall(text)
+
+
+class BM25Index:
+    """
+    Inverted index over the document chunks scored with Okapi BM25. It catches exact
+    matches of article numbers, act names and years that dense search can miss.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.ids: list[str] = []
+        self.texts: list[str] = []
+        self.metadata: list[dict] = []
+        self.doc_lens: list[int] = []
+        self.total_len = 0
+        self.postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._positions: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, doc_id: str, text: str, metadata: Optional[dict] = None) -> None:
+        """
+        Adds a chunk to the index. Chunks that are already indexed are skipped.
+        """
+        if doc_id in self._positions:
+            return
+
+        position = len(self.ids)
+        self._positions[doc_id] = position
+        self.ids.append(doc_id)
+        self.texts.append(text)
+        self.metadata.append(metadata or {})
+
+        tokens = tokenize(text)
+        self.doc_lens.append(len(tokens))
+        self.total_len += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self.postings[term][position] = tf
+
+    def search(self, query: str, k: int, namespaces: Optional[Iterable[str]] = None) -> list[tuple[Document, float]]:
+        """
+        Returns the k best (document, BM25 score) pairs for the query, optionally
+        restricted to chunks of the given namespaces.
+        """
+        if not self.ids:
+            return []
+
+        namespaces = set(namespaces) if namespaces else None
+        n_docs = len(self.ids)
+        avg_len = self.total_len / n_docs or 1.0
+        scores: dict[int, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings.items():
+                if namespaces is not None and self.metadata[position].get("namespace") not in namespaces:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[position] / avg_len)
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            (Document(page_content=self.texts[position], metadata=dict(self.metadata[position])), score)
+            for position, score in top
+        ]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "k1": self.k1,
+                    "b": self.b,
+                    "docs": [
+                        {"id": i, "text": t, "metadata": m, "len": n}
+                        for i, t, m, n in zip(self.ids, self.texts, self.metadata, self.doc_lens)
+                    ],
+                    "postings": {term: list(postings.items()) for term, postings in self.postings.items()},
+                },
+                f, ensure_ascii=False,
+            )
+        logger.info(f"Saved BM25 index with {len(self.ids)} chunks to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Loads a saved index, or returns an empty index when the file does not exist.
+        """
+        if not os.path.exists(path):
+            logger.warning(f"BM25 index not found at {path}, lexical search returns no results")
+            return cls()
+
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        index = cls(k1=data["k1"], b=data["b"])
+        for position, doc in enumerate(data["docs"]):
+            index._positions[doc["id"]] = position
+            index.ids.append(doc["id"])
+            index.texts.append(doc["text"])
+            index.metadata.append(doc["metadata"])
+            index.doc_lens.append(doc["len"])
+            index.total_len += doc["len"]
+        for term, postings in data["postings"].items():
+            index.postings[term] = {position: tf for position, tf in postings}
+
+        logger.info(f"Loaded BM25 index with {len(index.ids)} chunks from {path}")
+        return index
@@ -7,21 +7,63 @@ from langchain_core.prompts import (
 )
 import ast
 import json
+import asyncio
+from functools import lru_cache
+from loguru import logger
 from langchain_core.runnables import chain
 from nepal_constitution_ai.config.config import settings
-from langchain_openai import OpenAIEmbeddings
-from langchain_cohere import CohereEmbeddings
-from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
-from langchain_cohere import CohereRerank
-from nepal_constitution_ai.retriever.utils import get_vector_retriever
+from nepal_constitution_ai.retriever.registry import registry
+from nepal_constitution_ai.retriever.schemas import RewrittenQuery
+from nepal_constitution_ai.retriever.context_packing import pack_context
+from nepal_constitution_ai.utils.metrics import Counters
+from nepal_constitution_ai.retriever.utils import get_vector_retriever, search_namespaces, asearch_namespaces, reciprocal_rank_fusion
 from nepal_constitution_ai.prompts.prompts import HUMAN_PROMPT, SYSTEM_PROMPT, CONTEXTUALIZE_Q_SYSTEM_PROMPT, CONVERSATION_PROMPT
 
+# Outcomes of the query rewrite: successes, retries and fallbacks to the raw question
+rewrite_counters = Counters()
+
+
+def filter_relevant_docs(docs: list) -> list:
+    """
+    Returns the (document, score) pairs that pass the relevance threshold, best
+    first and unique by page content. Docs are (document, score) pairs, or reranked
+    documents carrying a `relevance_score` metadata field when reranking is on.
+    """
+    if not settings.USE_RERANKING:
+        # Hybrid search already filtered the dense results before fusion
+        threshold = 0 if settings.USE_HYBRID_SEARCH else settings.RELEVANCE_SCORE_THRESHOLD
+        filtered_docs = [(doc, score) for doc, score in docs if score >= threshold]
+    else:
+        # The reranker scores are compared with the threshold of the reranker that produced them
+        threshold = registry.get_reranker().threshold
+        filtered_docs = [
+            (doc, doc.metadata['relevance_score'])
+            for doc in docs if doc.metadata.get('relevance_score', 0) >= threshold
+        ]
+
+    # Sort filtered docs by relevance score in descending order
+    sorted_docs = sorted(filtered_docs, key=lambda x: x[1], reverse=True)
+
+    # Use a dictionary to collect unique documents based on page_content
+    return list({doc.page_content: (doc, score) for doc, score in sorted_docs}.values())
+
+
+def get_sources(docs: list) -> list[dict]:
+    """
+    Returns the source, link and score of the relevant documents given to the LLM.
+    """
+    return [
+        {"source": doc.metadata.get("source", ""), "link": doc.metadata.get("link", ""), "score": float(score)}
+        for doc, score in filter_relevant_docs(docs)
+    ]
+
 
 @chain
 def format_docs_with_id(docs):
     """
     Format a list of documents by extracting page content and metadata.
-    Each document is formatted with "Content" and "Metadata" sections.
+    Each document is formatted with "Content" and "Metadata" sections, packed
+    within settings.CONTEXT_TOKEN_BUDGET tokens.
     
     Args:
         docs (list): A list of documents to be formatted.
@@ -30,58 +72,12 @@ def format_docs_with_id(docs):
         str: A string representation of the formatted documents.
     """
     if isinstance(docs, list):
-        formatted_output = []
-
-        if not settings.USE_RERANKING:
+        unique_docs = filter_relevant_docs(docs)
+        if len(unique_docs) == 0: return "[]"
 
-            # Filter docs by score threshold
-            filtered_docs = [(doc, score) for doc, score in docs if score >= settings.RELEVANCE_SCORE_THRESHOLD]
-            if len(filtered_docs) == 0: return "[]"
-
-            # Sort filtered docs by relevance score in descending order
-            sorted_docs = sorted(filtered_docs, key=lambda x: x[1], reverse=True)
-
-            # Use a dictionary to collect unique documents based on page_content
-            unique_docs = {doc.page_content: (doc, score) for doc, score in sorted_docs}.values()
-
-            # Format the output
-            for doc, score in unique_docs:
-                # Replace specific text in the summary field of metadata
-                if 'doc_summary' in doc.metadata:
-                    doc.metadata['doc_summary'] = doc.metadata['doc_summary'].replace("The text", "The document from which the above text content is extracted,")
-                
-                # Append the formatted string
-                formatted_output.append(
-                    f"Content: {doc.page_content}\nMetadata: {doc.metadata}\nRelevance Score: {score}"
-                )
-            
-            return "\n\n".join(formatted_output)
-        
-        else:
-            # Filter docs by score threshold
-            filtered_docs = [
-                (doc, doc.metadata['relevance_score'])
-                for doc in docs if doc.metadata.get('relevance_score', 0) >= settings.RELEVANCE_SCORE_THRESHOLD
-            ]
-            if len(filtered_docs) == 0: return "[]"
-            # Sort filtered docs by relevance score in descending order
-            sorted_docs = sorted(filtered_docs, key=lambda x: x[1], reverse=True)
-
-            # Use a dictionary to collect unique documents based on page_content
-            unique_docs = {doc.page_content: doc for doc, score in sorted_docs}.values()
-
-            formatted_output = []
-            for doc in unique_docs:
-                # Replace specific text in the summary field of metadata safely
-                if 'doc_summary' in doc.metadata:
-                    doc.metadata['doc_summary'] = doc.metadata['doc_summary'].replace("The text", "The document from which the above text content is extracted,")
-
-
-                # Append the formatted string
-                formatted_output.append(
-                    f"Content: {doc.page_content}\nMetadata: {doc.metadata}"
-                )
-            return "\n\n".join(formatted_output)
+        return pack_context(
+            unique_docs, token_budget=settings.CONTEXT_TOKEN_BUDGET, show_scores=not settings.USE_RERANKING
+        )
 
     return "Unexpected document type"
 
@@ -122,6 +118,41 @@ class RetrieverChain:
             input_variables=["question", "context"],
         )
 
+    @staticmethod
+    def _parse_inputs(inputs) -> dict:
+        """
+        Returns the rewritten query dict from the agent's string input, or from the
+        {"input": ...} dict used in evaluation mode.
+        """
+        if isinstance(inputs, dict) and "input" in inputs:
+            inputs = inputs["input"]
+        if isinstance(inputs, str):
+            inputs = ast.literal_eval(inputs)
+        return inputs
+
+    @staticmethod
+    def _lexical_query(inputs: dict) -> str:
+        return f"{inputs.get('reformulated_question', '')} {inputs.get('user_question', '')}"
+
+    def _fuse_namespace_results(self, inputs: dict, docs: list) -> list:
+        """
+        Fuses the relevant dense results with lexical BM25 matches on exact terms.
+        """
+        dense_docs = [(doc, score) for doc, score in docs if score >= settings.RELEVANCE_SCORE_THRESHOLD]
+        lexical_docs = registry.get_bm25_index().search(
+            self._lexical_query(inputs), k=settings.TOP_K, namespaces=inputs.get("categories", [])
+        )
+        return reciprocal_rank_fusion([dense_docs, lexical_docs], top_n=settings.TOP_K)
+
+    def _fuse_rerank_candidates(self, inputs: dict, candidates: list) -> list:
+        lexical_docs = registry.get_bm25_index().search(self._lexical_query(inputs), k=settings.TOP_K)
+        return reciprocal_rank_fusion([candidates, lexical_docs], top_n=settings.TOP_K)
+
+    def _format_result(self, inputs: dict, docs: list) -> dict:
+        formatted_docs = self.format_docs.invoke(docs)
+
+        return {"context": formatted_docs, "question": inputs.get("user_question", ""), "categories": inputs.get("categories", []), "orig_context": docs}
+
     def retrieve_and_format(self, inputs):
         """
         Retrieves documents based on the query and formats them.
@@ -132,46 +163,64 @@ class RetrieverChain:
         Returns:
             dict: A dictionary containing formatted documents and the original documents.
         """
-        if isinstance(inputs, dict):
-            docs = self.retriever.invoke(inputs.get("input", ""))
+        inputs = self._parse_inputs(inputs)
+        reformulated_question = inputs.get("reformulated_question", "")
+
+        if not settings.USE_RERANKING:
+            # Embed the query once and search the categories namespaces concurrently
+            retriever = get_vector_retriever(
+                        vector_db=settings.VECTOR_DB, namespaces=inputs.get("categories", [])
+                            )
+            query_vector = registry.get_embedding().embed_query(reformulated_question)
+            docs = search_namespaces(retriever, query_vector, k=settings.TOP_K)
+
+            if settings.USE_HYBRID_SEARCH:
+                docs = self._fuse_namespace_results(inputs, docs)
         else:
-            inputs = ast.literal_eval(inputs)
-            docs = []
-
-            if settings.EMBEDDING_MODEL_PROVIDER == "openai":
-                embedding = OpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY)
-            elif settings.EMBEDDING_MODEL_PROVIDER == "cohere":
-                embedding = CohereEmbeddings(model=settings.COHERE_EMBEDDING_MODEL, cohere_api_key=settings.COHERE_API_KEY)
-            else:
-                embedding = OpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY)
-           
-            if not settings.USE_RERANKING:
-                # Query from categories namespaces
-                retriever = get_vector_retriever(
-                            vector_db="pinecone", embedding=embedding, namespaces=inputs.get("categories", [])
-                                )
-                for ret in retriever:
-                    docs.extend(ret.similarity_search_with_score(query=inputs.get("reformulated_question", ""),k=settings.TOP_K))
-            else:
-                # Query from default namespace
-                default_retriever = get_vector_retriever(
-                        vector_db=settings.VECTOR_DB, embedding=embedding, namespaces=None
+            # Query from default namespace and rerank the candidates
+            default_retriever = get_vector_retriever(vector_db=settings.VECTOR_DB, namespaces=None)[0]
+            candidates = default_retriever.similarity_search_with_score(reformulated_question, k=settings.TOP_K)
+
+            if settings.USE_HYBRID_SEARCH:
+                candidates = self._fuse_rerank_candidates(inputs, candidates)
+
+            docs = registry.get_reranker().rerank(
+                reformulated_question, [doc for doc, _ in candidates], top_n=settings.RERANK_TOP_N
+            )
+
+        return self._format_result(inputs, docs)
+
+    async def aretrieve_and_format(self, inputs):
+        """
+        Async version of retrieve_and_format. The query is embedded with the async
+        embeddings client, and the blocking vector searches and reranking run in
+        worker threads instead of on the event loop.
+        """
+        inputs = self._parse_inputs(inputs)
+        reformulated_question = inputs.get("reformulated_question", "")
+
+        if not settings.USE_RERANKING:
+            retriever = get_vector_retriever(
+                        vector_db=settings.VECTOR_DB, namespaces=inputs.get("categories", [])
                             )
-                default_retriever = default_retriever[0]
-                base_retriever = default_retriever.as_retriever(search_kwargs={"k": settings.TOP_K})
+            query_vector = await registry.get_embedding().aembed_query(reformulated_question)
+            docs = await asearch_namespaces(retriever, query_vector, k=settings.TOP_K)
 
-                compressor = CohereRerank(model=settings.COHERE_RERANK_MODEL, cohere_api_key=settings.COHERE_API_KEY)
+            if settings.USE_HYBRID_SEARCH:
+                docs = self._fuse_namespace_results(inputs, docs)
+        else:
+            default_retriever = get_vector_retriever(vector_db=settings.VECTOR_DB, namespaces=None)[0]
+            candidates = await default_retriever.asimilarity_search_with_score(reformulated_question, k=settings.TOP_K)
 
-                compression_retriever = ContextualCompressionRetriever(
-                    base_compressor=compressor, 
-                    base_retriever=base_retriever  
-                )
-                compressed_docs = compression_retriever.invoke(inputs.get("reformulated_question", ""))
+            if settings.USE_HYBRID_SEARCH:
+                candidates = self._fuse_rerank_candidates(inputs, candidates)
 
-        formatted_docs = self.format_docs.invoke(compressed_docs)
-                
+            docs = await asyncio.to_thread(
+                registry.get_reranker().rerank,
+                reformulated_question, [doc for doc, _ in candidates], settings.RERANK_TOP_N,
+            )
 
-        return {"context": formatted_docs, "question": inputs.get("user_question", ""), "categories": inputs.get("categories", []), "orig_context": docs}
+        return self._format_result(inputs, docs)
 
     def generate_answer(self, inputs):
         """
@@ -192,16 +241,45 @@ class RetrieverChain:
             "orig_docs": inputs.get("orig_context", ""),
         }
 
+    async def agenerate_answer(self, inputs):
+        """
+        Async version of generate_answer.
+        """
+        formatted_prompt = self.prompt.format(**inputs)
+        answer = await self.llm_model.ainvoke(formatted_prompt)
+
+        return {
+            "context": inputs.get("context", ""),
+            "answer": answer,
+            "orig_docs": inputs.get("orig_context", ""),
+        }
+
+    async def astream_answer(self, inputs):
+        """
+        Streams the raw text of the answer generated from the retrieved documents.
+
+        Args:
+            inputs (dict): The output of retrieve_and_format.
+
+        Yields:
+            str: The answer text chunks as the LLM generates them.
+        """
+        formatted_prompt = self.prompt.format(**inputs)
+        async for chunk in self.llm_model.astream(formatted_prompt):
+            if chunk.content:
+                yield chunk.content
+
     def get_chain(self):
         """
         Creates a chain of operations that retrieves, formats, and generates an answer.
+        The chain supports both `invoke` and `ainvoke`.
 
         Returns:
             Callable: The chain of operations as a callable object.
         """
         rag_chain = (
-            RunnableLambda(self.retrieve_and_format)
-            | self.generate_answer
+            RunnableLambda(self.retrieve_and_format, afunc=self.aretrieve_and_format)
+            | RunnableLambda(self.generate_answer, afunc=self.agenerate_answer)
             | RunnableLambda(
                 lambda x: {
                     "context": x.get("context", ""),
@@ -214,19 +292,20 @@ class RetrieverChain:
         return rag_chain
 
 
-def rewrite_query(query, llm_model, history):
+@lru_cache(maxsize=1)
+def load_namespace_descriptions() -> dict:
     """
-    Reformulates the user's query by incorporating chat history for better context.
+    Loads the document category descriptions once per process.
+    """
+    with open(f"{settings.DATA_PATH}/namespace_desc.json", "r") as f:
+        return json.load(f)
 
-    Args:
-        query (str): The original user query.
-        llm_model (object): The LLM model to generate the reformulated query.
-        history (object): The chat history for context.
 
-    Returns:
-        str: The reformulated query as text content.
+def get_rewrite_chain(llm_model):
+    """
+    Builds the query reformulation chain and its inputs apart from the user question.
+    The LLM answers through structured output validated against RewrittenQuery.
     """
-
     # Create a prompt to reformulate the query using the chat history
     contextualize_q_prompt = ChatPromptTemplate.from_messages(
         [
@@ -239,15 +318,84 @@ def rewrite_query(query, llm_model, history):
         ]
     )
     if not settings.USE_RERANKING:
-        with open("data/namespace_desc.json", "r") as f:
-            doc_categories_desc = json.load(f)
+        doc_categories_desc = load_namespace_descriptions()
     else:
         doc_categories_desc = []
-        
-    new_query_chain = contextualize_q_prompt | llm_model
-    # Invoke the LLM with the user question and chat history
-    res = new_query_chain.invoke(
-        {"user_question": query, "doc_categories": [f"Document Categories: {str(doc_categories_desc)}"]}
-    )
 
-    return res.content
\ No newline at end of file
+    new_query_chain = contextualize_q_prompt | llm_model.with_structured_output(RewrittenQuery)
+    return new_query_chain, {"doc_categories": [f"Document Categories: {str(doc_categories_desc)}"]}
+
+
+def finalize_rewritten_query(rewritten: RewrittenQuery, query: str) -> dict:
+    """
+    Converts the validated rewrite into the query dict. Empty questions fall back to
+    the user query, and categories that are not known namespaces are dropped.
+    """
+    if settings.USE_RERANKING:
+        categories = []
+    else:
+        known_categories = load_namespace_descriptions()
+        categories = [category for category in rewritten.categories if category in known_categories]
+
+    return {
+        "user_question": rewritten.user_question.strip() or query,
+        "reformulated_question": rewritten.reformulated_question.strip() or query,
+        "categories": categories,
+    }
+
+
+def fallback_rewritten_query(query: str) -> dict:
+    """
+    The query dict used when the rewrite fails: the raw question searched in the
+    default namespace.
+    """
+    rewrite_counters.incr("fallbacks")
+    logger.warning(f"Query rewrite failed, searching with the raw question: {query}")
+    return {"user_question": query, "reformulated_question": query, "categories": []}
+
+
+def rewrite_query(query, llm_model, history):
+    """
+    Reformulates the user's query by incorporating chat history for better context.
+    An invalid LLM output is retried settings.REWRITE_MAX_RETRIES times before
+    falling back to the raw question.
+
+    Args:
+        query (str): The original user query.
+        llm_model (object): The LLM model to generate the reformulated query.
+        history (object): The chat history for context.
+
+    Returns:
+        dict: The user question, reformulated question and categories.
+    """
+    new_query_chain, chain_inputs = get_rewrite_chain(llm_model)
+    for attempt in range(settings.REWRITE_MAX_RETRIES + 1):
+        try:
+            # Invoke the LLM with the user question and chat history
+            rewritten = new_query_chain.invoke({"user_question": query, **chain_inputs})
+            rewrite_counters.incr("successes")
+            return finalize_rewritten_query(rewritten, query)
+        except Exception as e:
+            logger.warning(f"Query rewrite attempt {attempt + 1} failed: {str(e)}")
+            if attempt < settings.REWRITE_MAX_RETRIES:
+                rewrite_counters.incr("retries")
+
+    return fallback_rewritten_query(query)
+
+
+async def arewrite_query(query, llm_model, history):
+    """
+    Async version of rewrite_query.
+    """
+    new_query_chain, chain_inputs = get_rewrite_chain(llm_model)
+    for attempt in range(settings.REWRITE_MAX_RETRIES + 1):
+        try:
+            rewritten = await new_query_chain.ainvoke({"user_question": query, **chain_inputs})
+            rewrite_counters.incr("successes")
+            return finalize_rewritten_query(rewritten, query)
+        except Exception as e:
+            logger.warning(f"Query rewrite attempt {attempt + 1} failed: {str(e)}")
+            if attempt < settings.REWRITE_MAX_RETRIES:
+                rewrite_counters.incr("retries")
+
+    return fallback_rewritten_query(query)
@@ -0,0 +1,166 @@
+import re
+import math
+from functools import lru_cache
+from typing import Optional
+from loguru import logger
+
+from nepal_constitution_ai.config.config import settings
+
+# Chunk sources are written by the data pipeline as "Page 3 from <title>" or "Page 3-4 from <title>"
+SOURCE_PATTERN = re.compile(r"^Page (\d+)(?:-(\d+))? from (.*)$", re.DOTALL)
+# Shortest suffix/prefix match treated as the overlap between two consecutive chunks
+MIN_OVERLAP = 20
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    Returns the tiktoken encoding of the chat model, or None when tiktoken is not installed.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, prompt tokens are estimated from the text length")
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Counts the tokens of the text with the chat model's tokenizer. Without tiktoken,
+    ASCII text is estimated at 4 characters per token and Devanagari (and any other
+    non-ASCII character) at one token per character.
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return math.ceil((len(text) - non_ascii) / 4) + non_ascii
+
+
+def parse_source(source: str) -> tuple[Optional[int], Optional[int], str]:
+    """
+    Splits a chunk source into its first page, last page and document title.
+    """
+    match = SOURCE_PATTERN.match(source)
+    if match is None:
+        return None, None, source
+
+    first_page = int(match.group(1))
+    last_page = int(match.group(2) or first_page)
+    return first_page, last_page, match.group(3)
+
+
+def merge_overlapping(first: str, second: str, max_overlap: int) -> Optional[str]:
+    """
+    Joins two consecutive chunks, dropping the text the second repeats from the end
+    of the first. Returns None when the chunks do not overlap.
+    """
+    for length in range(min(len(first), len(second), max_overlap), MIN_OVERLAP - 1, -1):
+        if first.endswith(second[:length]):
+            return first + second[length:]
+    return None
+
+
+class ContextBlock:
+    """
+    Text of one or more adjacent chunks of a document, with their page range and best score.
+    """
+    def __init__(self, text: str, first_page: Optional[int], last_page: Optional[int], score: float) -> None:
+        self.text = text
+        self.first_page = first_page
+        self.last_page = last_page
+        self.score = score
+
+    def is_adjacent(self, first_page: Optional[int]) -> bool:
+        return None not in (self.last_page, first_page) and first_page - self.last_page <= 1
+
+    def add(self, text: str, first_page: int, last_page: int, score: float, max_overlap: int) -> None:
+        merged = merge_overlapping(self.text, text, max_overlap) or merge_overlapping(text, self.text, max_overlap)
+        self.text = merged if merged is not None else f"{self.text}\n...\n{text}"
+        self.first_page = min(self.first_page, first_page)
+        self.last_page = max(self.last_page, last_page)
+        self.score = max(self.score, score)
+
+    def source(self, title: str) -> str:
+        if self.first_page is None:
+            return title
+        if self.first_page == self.last_page:
+            return f"Page {self.first_page} from {title}"
+        return f"Page {self.first_page}-{self.last_page} from {title}"
+
+
+def pack_context(scored_docs: list, token_budget: int, show_scores: bool = True) -> str:
+    """
+    Packs the relevant documents into the LLM context within a token budget.
+
+    Chunks of the same source document on the same or adjacent pages are merged into
+    one block, with the overlap between consecutive chunks removed. Each document's
+    summary is included once, with its first included block. Blocks are added best
+    score first; a block that would exceed the budget is skipped so that smaller,
+    lower-ranked blocks can still fill it, until less than
+    settings.CONTEXT_MIN_BLOCK_TOKENS remain. The best block is always included.
+    The documents' metadata is not modified.
+
+    Args:
+        scored_docs (list): (document, score) pairs, best first.
+        token_budget (int): Maximum number of context tokens, 0 for no limit.
+        show_scores (bool): Whether to include the relevance score of each block.
+
+    Returns:
+        str: The formatted context.
+    """
+    max_overlap = settings.CHUNK_OVERLAP * 2
+    documents = {}
+    for doc, score in scored_docs:
+        first_page, last_page, title = parse_source(doc.metadata.get("source", ""))
+        key = doc.metadata.get("link") or title
+        document = documents.setdefault(key, {"title": title, "metadata": doc.metadata, "chunks": []})
+        document["chunks"].append((first_page, last_page, doc.page_content, score))
+
+    blocks = []
+    for key, document in documents.items():
+        current = None
+        # Chunks without a page number are never merged and sort first
+        for first_page, last_page, text, score in sorted(document["chunks"], key=lambda chunk: chunk[0] or 0):
+            if current is not None and current.is_adjacent(first_page):
+                current.add(text, first_page, last_page, score, max_overlap)
+            else:
+                current = ContextBlock(text, first_page, last_page, score)
+                blocks.append((key, current))
+
+    formatted_output = []
+    used_tokens = 0
+    summarized = set()
+    for key, block in sorted(blocks, key=lambda key_block: key_block[1].score, reverse=True):
+        document = documents[key]
+        metadata = {"source": block.source(document["title"]), "link": document["metadata"].get("link", "")}
+        if key not in summarized and document["metadata"].get("doc_summary"):
+            metadata["doc_summary"] = document["metadata"]["doc_summary"].replace(
+                "The text", "The document from which the above text content is extracted,"
+            )
+
+        formatted_block = f"Content: {block.text}\nMetadata: {metadata}"
+        if show_scores:
+            formatted_block += f"\nRelevance Score: {block.score}"
+
+        block_tokens = estimate_tokens(formatted_block)
+        if token_budget and formatted_output and used_tokens + block_tokens > token_budget:
+            if token_budget - used_tokens < settings.CONTEXT_MIN_BLOCK_TOKENS:
+                break
+            continue
+
+        formatted_output.append(formatted_block)
+        used_tokens += block_tokens
+        summarized.add(key)
+
+    logger.debug(
+        f"Packed {len(formatted_output)} of {len(blocks)} context blocks from {len(scored_docs)} chunks "
+        f"into {used_tokens} tokens"
+    )
+    return "\n\n".join(formatted_output)
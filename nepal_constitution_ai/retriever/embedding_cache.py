@@ -0,0 +1,176 @@
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Optional
+from collections import OrderedDict
+import numpy as np
+from loguru import logger
+from langchain_core.embeddings import Embeddings
+
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.utils.metrics import Counters, hit_rate
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text for cache keys: Unicode NFC form with collapsed whitespace.
+    """
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(text: str, provider: str, model: str, kind: str) -> str:
+    """
+    Builds the cache key of an embedding. The kind ("query" or "document") is part of the
+    key because some providers embed queries and documents differently.
+    """
+    raw = "\x1f".join([provider, model, kind, normalize_text(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embedding cache with a bounded in-memory LRU tier and an optional SQLite tier.
+    Entries older than `ttl` seconds are treated as missing (a ttl of 0 disables expiry).
+    Vectors are kept as float32 arrays, a quarter of the memory of lists of Python floats.
+    """
+    def __init__(self, max_size: int, ttl: float = 0, db_path: str = "") -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self.counters = Counters()
+        self._db = None
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, created_at REAL)"
+            )
+            self._db.commit()
+            logger.info(f"Using SQLite embedding cache at {db_path}")
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _get_from_db(self, key: str) -> Optional[tuple[float, np.ndarray]]:
+        row = self._db.execute(
+            "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return row[1], np.frombuffer(row[0], dtype=np.float32)
+
+    def _put_in_memory(self, key: str, entry: tuple[float, np.ndarray]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters.incr("evictions")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.counters.incr("hits")
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                entry = self._get_from_db(key)
+                if entry is not None and not self._expired(entry[0]):
+                    self._put_in_memory(key, entry)
+                    self.counters.incr("hits")
+                    self.counters.incr("db_hits")
+                    return entry[1]
+
+            self.counters.incr("misses")
+            return None
+
+    def set(self, key: str, vector: list[float]) -> None:
+        entry = (time.time(), np.asarray(vector, dtype=np.float32))
+        entry[1].flags.writeable = False # Shared by every caller of get
+        with self._lock:
+            self._put_in_memory(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, entry[1].tobytes(), entry[0]),
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        counts = self.counters.snapshot()
+        with self._lock:
+            size = len(self._entries)
+
+        return {
+            **counts,
+            "size": size,
+            "hit_rate": hit_rate(counts.get("hits", 0), counts.get("misses", 0)),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated queries from an EmbeddingCache and only
+    sends the queries that are not cached to the wrapped embeddings client. Documents
+    are only embedded at ingestion, which already reuses the vectors of unchanged
+    chunks, so they are passed through without filling the cache.
+    """
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, provider: str, model: str) -> None:
+        self.embeddings = embeddings
+        self.cache = cache
+        self.provider = provider
+        self.model = model
+
+    def _key(self, text: str, kind: str) -> str:
+        return make_cache_key(text, self.provider, self.model, kind)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector.tolist()
+
+        vector = self.embeddings.embed_query(text)
+        self.cache.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector.tolist()
+
+        vector = await self.embeddings.aembed_query(text)
+        self.cache.set(key, vector)
+        return vector
+
+
+embedding_cache = EmbeddingCache(
+    max_size=settings.EMBEDDING_CACHE_SIZE,
+    ttl=settings.EMBEDDING_CACHE_TTL,
+    db_path=settings.EMBEDDING_CACHE_DB_PATH,
+)
+
+__all__ = ["embedding_cache", "EmbeddingCache", "CachedEmbeddings", "make_cache_key", "normalize_text"]
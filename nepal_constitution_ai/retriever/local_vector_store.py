@@ -0,0 +1,293 @@
+import os
+import re
+import glob
+import json
+import uuid
+import threading
+from typing import Any, Iterable, Optional
+import numpy as np
+from loguru import logger
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from nepal_constitution_ai.retriever.ann_index import IVFIndex, IVF_FILENAME
+
+EMBEDDINGS_FILENAME = "embeddings.npy"
+METADATA_FILENAME = "metadata.json"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index over the chunk embeddings written by the data pipeline.
+    The embeddings are kept as a row-normalized float32 matrix (memory-mapped when
+    loaded from disk) and searched with a vectorized cosine top-k, or through an IVF
+    approximate index when one is attached. Each namespace is a set of rows selected
+    by the `namespace` field of the chunk metadata.
+    """
+    def __init__(self, embeddings: np.ndarray, ids: list[str], metadata: list[dict], ivf: Optional[IVFIndex] = None) -> None:
+        self.embeddings = embeddings
+        self.ids = ids
+        self.metadata = metadata
+        self.ivf = ivf
+        self._namespace_rows: dict[Optional[str], np.ndarray] = {}
+        self._write_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_embeddings_json(cls, embs_json_folder_path: str) -> "LocalVectorIndex":
+        """
+        Builds the index from the `embeddings_batch_*.json` files of the data pipeline.
+        """
+        emb_json_files = glob.glob(f"{embs_json_folder_path}/embeddings_batch_*.json")
+        emb_json_files = sorted(emb_json_files, key=lambda x: int(re.search(r'(\d+)\.json$', x).group(1)))
+
+        vectors = {}
+        for emb_json_file in emb_json_files:
+            with open(emb_json_file, "r") as f:
+                for vector in json.load(f):
+                    vectors[vector["id"]] = vector
+
+        ids = list(vectors.keys())
+        metadata = [vectors[i]["metadata"] for i in ids]
+        embeddings = np.asarray([vectors[i]["values"] for i in ids], dtype=np.float32)
+        if len(ids):
+            embeddings = normalize_rows(embeddings)
+
+        logger.info(f"Built local vector index with {len(ids)} vectors from {len(emb_json_files)} files")
+        return cls(embeddings, ids, metadata)
+
+    def build_ivf(self, n_lists: int = 0, n_iter: int = 20, n_probe: int = 8) -> None:
+        """
+        Builds and attaches an IVF approximate index over the embeddings.
+        """
+        if len(self.ids):
+            self.ivf = IVFIndex.build(self.embeddings, n_lists=n_lists, n_iter=n_iter, n_probe=n_probe)
+
+    def save(self, index_path: str) -> None:
+        os.makedirs(index_path, exist_ok=True)
+        if self.ivf is not None:
+            self.ivf.save(index_path)
+        elif os.path.exists(os.path.join(index_path, IVF_FILENAME)):
+            # Do not leave an IVF index of previous embeddings next to the new ones
+            os.remove(os.path.join(index_path, IVF_FILENAME))
+        np.save(os.path.join(index_path, EMBEDDINGS_FILENAME), self.embeddings)
+        with open(os.path.join(index_path, METADATA_FILENAME), "w") as f:
+            json.dump(
+                [{"id": i, "metadata": m} for i, m in zip(self.ids, self.metadata)],
+                f, ensure_ascii=False,
+            )
+        logger.info(f"Saved local vector index to {index_path}")
+
+    @classmethod
+    def load(cls, index_path: str, mmap: bool = True, ann: str = "exact", n_probe: int = 8) -> "LocalVectorIndex":
+        embeddings = np.load(os.path.join(index_path, EMBEDDINGS_FILENAME), mmap_mode="r" if mmap else None)
+        with open(os.path.join(index_path, METADATA_FILENAME), "r") as f:
+            entries = json.load(f)
+        ivf = IVFIndex.load(index_path, n_probe=n_probe) if ann == "ivf" else None
+
+        logger.info(f"Loaded local vector index with {len(entries)} vectors from {index_path} (search: {ann})")
+        return cls(embeddings, [e["id"] for e in entries], [e["metadata"] for e in entries], ivf=ivf)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        index_path: str,
+        embs_json_folder_path: str,
+        ann: str = "exact",
+        n_lists: int = 0,
+        n_probe: int = 8,
+    ) -> "LocalVectorIndex":
+        """
+        Loads the saved index, or builds and saves it from the pipeline's embedding
+        files when it is missing or older than them. With ann="ivf" an IVF index is
+        attached, built if the saved index has none.
+        """
+        saved_path = os.path.join(index_path, EMBEDDINGS_FILENAME)
+        emb_json_files = glob.glob(f"{embs_json_folder_path}/embeddings_batch_*.json")
+        latest_emb_json = max((os.path.getmtime(f) for f in emb_json_files), default=0)
+
+        if os.path.exists(saved_path) and os.path.getmtime(saved_path) >= latest_emb_json:
+            index = cls.load(index_path, ann=ann, n_probe=n_probe)
+            if ann != "ivf" or index.ivf is not None:
+                return index
+            index.build_ivf(n_lists=n_lists, n_probe=n_probe)
+            index.ivf.save(index_path)
+            return index
+
+        index = cls.from_embeddings_json(embs_json_folder_path)
+        if ann == "ivf":
+            index.build_ivf(n_lists=n_lists, n_probe=n_probe)
+        index.save(index_path)
+        return index
+
+    def add(self, vectors: list[list[float]], ids: list[str], metadata: list[dict]) -> None:
+        """
+        Appends the vectors, row-normalized, with their ids and metadata. They are
+        added to the lists of the attached IVF index, if any. The new rows are only
+        searched once everything they need is in place, so searches can run meanwhile.
+        """
+        if not ids:
+            return
+
+        new_embeddings = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        with self._write_lock:
+            start_row = len(self.embeddings)
+            embeddings = np.concatenate([np.asarray(self.embeddings, dtype=np.float32), new_embeddings]) if start_row else new_embeddings
+            ivf = self.ivf.add(new_embeddings, start_row) if self.ivf is not None else None
+
+            self.ids = self.ids + list(ids)
+            self.metadata = self.metadata + list(metadata)
+            self.embeddings = embeddings
+            self.ivf = ivf
+            self._namespace_rows = {}
+
+    def namespace_rows(self, namespace: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Returns the row numbers of the namespace, or None for the default namespace (all rows).
+        """
+        if namespace is None:
+            return None
+
+        rows = self._namespace_rows.get(namespace)
+        if rows is None:
+            rows = np.flatnonzero(np.fromiter(
+                (m.get("namespace") == namespace for m in self.metadata), dtype=bool, count=len(self.metadata)
+            ))
+            self._namespace_rows[namespace] = rows
+
+        return rows
+
+    def search(self, query_vector: list[float], k: int, namespace: Optional[str] = None) -> list[tuple[int, float]]:
+        """
+        Returns the k (row, cosine similarity) pairs closest to the query, best first.
+        """
+        rows = self.namespace_rows(namespace)
+
+        if self.ivf is not None:
+            # Namespaces smaller than the expected number of IVF candidates are cheaper to scan exactly
+            expected_candidates = self.ivf.n_probe * len(self) / self.ivf.n_lists
+            if rows is None or len(rows) > expected_candidates:
+                return self.ivf.search(self.embeddings, query_vector, k, allowed_rows=rows)
+
+        matrix = self.embeddings if rows is None else self.embeddings[rows]
+        if len(matrix) == 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+
+        return [(int(i), float(scores[i])) for i in top]
+
+    def get_document(self, row: int, text_key: str = "text") -> Document:
+        metadata = dict(self.metadata[row])
+        text = metadata.pop(text_key, "")
+        return Document(page_content=text, metadata=metadata)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain vector store over a LocalVectorIndex, restricted to one namespace
+    (None searches every chunk). It mirrors the PineconeVectorStore search methods
+    used by the retriever chain. The index is built by the data pipeline; texts added
+    through the store are appended to it, in the store's namespace, and saved to
+    index_path when one is given, until the data pipeline rebuilds the index.
+    """
+    def __init__(
+        self,
+        index: LocalVectorIndex,
+        embedding: Embeddings,
+        namespace: Optional[str] = None,
+        index_path: Optional[str] = None,
+    ) -> None:
+        self._index = index
+        self._embedding = embedding
+        self._namespace = namespace
+        self._index_path = index_path
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities already
+        return lambda score: score
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: list[float], *, k: int = 4, namespace: Optional[str] = None, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        namespace = namespace if namespace is not None else self._namespace
+        return [
+            (self._index.get_document(row), score)
+            for row, score in self._index.search(embedding, k, namespace=namespace)
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k=k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        """
+        Embeds the texts and appends them to the index with the chunk metadata layout
+        of the data pipeline: the text under "text" and the store's namespace.
+        """
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+
+        metadata = []
+        for text, text_metadata in zip(texts, metadatas):
+            text_metadata = {**text_metadata, "text": text}
+            if self._namespace is not None:
+                text_metadata["namespace"] = self._namespace
+            metadata.append(text_metadata)
+
+        self._index.add(self._embedding.embed_documents(texts), ids, metadata)
+        if self._index_path:
+            self._index.save(self._index_path)
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        namespace: Optional[str] = None,
+        index_path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        """
+        Builds a store over a new index of the texts, saved to index_path when one is given.
+        """
+        dimension = len(embedding.embed_query(texts[0])) if texts else 0
+        index = LocalVectorIndex(np.empty((0, dimension), dtype=np.float32), [], [])
+        store = cls(index, embedding, namespace=namespace, index_path=index_path)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
@@ -0,0 +1,187 @@
+import threading
+from typing import Any, Callable, Optional
+from loguru import logger
+from pinecone import Pinecone
+from langchain_openai import OpenAIEmbeddings
+from langchain_cohere import CohereEmbeddings
+from langchain_pinecone import PineconeVectorStore
+
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.utils.metrics import Counters
+from nepal_constitution_ai.retriever.embedding_cache import CachedEmbeddings, embedding_cache
+from nepal_constitution_ai.retriever.local_vector_store import LocalVectorIndex, LocalVectorStore
+from nepal_constitution_ai.retriever.bm25_index import BM25Index
+from nepal_constitution_ai.retriever.rerankers import BaseReranker, build_reranker
+
+
+def get_embedding_model_name(provider: str) -> str:
+    """
+    Returns the embedding model name configured for the given provider.
+    Unknown providers fall back to the OpenAI embedding model.
+    """
+    if provider == "cohere":
+        return settings.COHERE_EMBEDDING_MODEL
+    return settings.OPENAI_EMBEDDING_MODEL
+
+
+def build_embedding_model(provider: str, model: str):
+    """
+    Builds a new embeddings client for the given provider and model, wrapped with the
+    shared embedding cache when it is enabled. Unknown providers fall back to OpenAI embeddings.
+    """
+    if provider == "cohere":
+        logger.info(f"Using Cohere embeddings model: {model}")
+        embeddings = CohereEmbeddings(model=model, cohere_api_key=settings.COHERE_API_KEY)
+    else:
+        logger.info(f"Using OpenAI embeddings model: {model}")
+        embeddings = OpenAIEmbeddings(model=model, openai_api_key=settings.OPENAI_API_KEY)
+
+    if settings.EMBEDDING_CACHE_SIZE > 0 or settings.EMBEDDING_CACHE_DB_PATH:
+        embeddings = CachedEmbeddings(embeddings, embedding_cache, provider, model)
+
+    return embeddings
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide registry of the clients used at query time: embedding clients,
+    vector database clients and index handles (Pinecone or the local index), per-namespace vector stores and
+    rerankers. Each object is built once per key and reused by every query, so
+    their HTTP connection pools and the index host lookup are shared.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._objects: dict[tuple, Any] = {}
+        self.counters = Counters()
+
+    def _get_or_build(self, key: tuple, build: Callable[[], Any]) -> Any:
+        kind = key[0]
+        obj = self._objects.get(key)
+        if obj is not None:
+            self.counters.incr(f"{kind}_hits")
+            return obj
+
+        with self._lock:
+            obj = self._objects.get(key)
+            if obj is None:
+                obj = build()
+                self._objects[key] = obj
+                self.counters.incr(f"{kind}_builds")
+                logger.info(f"Registered {kind}: {key[1:]}")
+            else:
+                self.counters.incr(f"{kind}_hits")
+
+        return obj
+
+    def get_embedding(self, provider: Optional[str] = None, model: Optional[str] = None):
+        """
+        Returns the shared embeddings client for the provider and model, which
+        default to the configured embedding provider and its model.
+        """
+        provider = provider or settings.EMBEDDING_MODEL_PROVIDER
+        model = model or get_embedding_model_name(provider)
+
+        return self._get_or_build(
+            ("embedding", provider, model), lambda: build_embedding_model(provider, model)
+        )
+
+    def get_pinecone_client(self) -> Pinecone:
+        return self._get_or_build(
+            ("client", "pinecone"), lambda: Pinecone(api_key=settings.PINECONE_API_KEY)
+        )
+
+    def get_index(self, index_name: Optional[str] = None, vector_db: Optional[str] = None):
+        """
+        Returns the shared index handle of the vector database. For Pinecone the index
+        host is resolved once when the handle is built instead of on every vector store
+        creation; the local index is loaded (or built) from disk once.
+        """
+        vector_db = vector_db or settings.VECTOR_DB
+
+        if vector_db == "local":
+            return self._get_or_build(
+                ("index", "local", settings.LOCAL_INDEX_PATH),
+                lambda: LocalVectorIndex.load_or_build(
+                    settings.LOCAL_INDEX_PATH,
+                    settings.EMBS_JSON_FOLDER_PATH,
+                    ann=settings.LOCAL_INDEX_TYPE,
+                    n_lists=settings.IVF_N_LISTS,
+                    n_probe=settings.IVF_N_PROBE,
+                ),
+            )
+
+        index_name = index_name or settings.PINECONE_INDEX
+        return self._get_or_build(
+            ("index", "pinecone", index_name), lambda: self.get_pinecone_client().Index(index_name)
+        )
+
+    def get_vector_store(
+        self,
+        namespace: Optional[str] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        index_name: Optional[str] = None,
+        vector_db: Optional[str] = None,
+    ):
+        """
+        Returns the shared vector store for the namespace (None is the default
+        namespace), bound to the shared index handle and embeddings client.
+        """
+        provider = provider or settings.EMBEDDING_MODEL_PROVIDER
+        model = model or get_embedding_model_name(provider)
+        vector_db = vector_db or settings.VECTOR_DB
+
+        if vector_db == "local":
+            return self._get_or_build(
+                ("store", "local", settings.LOCAL_INDEX_PATH, provider, model, namespace),
+                lambda: LocalVectorStore(
+                    index=self.get_index(vector_db="local"),
+                    embedding=self.get_embedding(provider, model),
+                    namespace=namespace,
+                    index_path=settings.LOCAL_INDEX_PATH,
+                ),
+            )
+
+        index_name = index_name or settings.PINECONE_INDEX
+        return self._get_or_build(
+            ("store", "pinecone", index_name, provider, model, namespace),
+            lambda: PineconeVectorStore(
+                index=self.get_index(index_name, vector_db="pinecone"),
+                embedding=self.get_embedding(provider, model),
+                namespace=namespace,
+            ),
+        )
+
+    def get_bm25_index(self) -> BM25Index:
+        return self._get_or_build(
+            ("bm25_index", settings.BM25_INDEX_PATH), lambda: BM25Index.load(settings.BM25_INDEX_PATH)
+        )
+
+    def get_reranker(self, name: Optional[str] = None) -> BaseReranker:
+        """
+        Returns the shared reranker selected by settings.RERANKER.
+        """
+        name = name or settings.RERANKER
+
+        return self._get_or_build(("reranker", name), lambda: build_reranker(name, settings))
+
+    def peek(self, key: tuple) -> Optional[Any]:
+        """
+        Returns the registered object for the key without building it.
+        """
+        return self._objects.get(key)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns how often each kind of object was reused (hits) versus built.
+        """
+        return self.counters.snapshot()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._objects.clear()
+
+
+registry = VectorStoreRegistry()
+
+__all__ = ["registry", "VectorStoreRegistry", "build_embedding_model", "get_embedding_model_name"]
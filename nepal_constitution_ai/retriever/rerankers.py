@@ -0,0 +1,163 @@
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import numpy as np
+from loguru import logger
+from langchain_core.documents import Document
+
+from nepal_constitution_ai.retriever.bm25_index import tokenize
+from nepal_constitution_ai.utils.metrics import Counters, hit_rate
+
+
+class BaseReranker(ABC):
+    """
+    Scores retrieved documents against the query and keeps the best ones. Scores are
+    in [0, 1], but each reranker has its own scale, so documents are kept when their
+    score reaches the reranker's own threshold.
+    """
+    threshold: float = 0.5
+
+    @abstractmethod
+    def score(self, query: str, docs: list[Document]) -> list[float]:
+        ...
+
+    def rerank(self, query: str, docs: list[Document], top_n: int) -> list[Document]:
+        """
+        Returns the top_n documents by score, best first, with the score stored in
+        the `relevance_score` metadata field like the Cohere reranker does.
+        """
+        if not docs:
+            return []
+
+        scores = self.score(query, docs)
+        ranked = sorted(zip(docs, scores), key=lambda doc_score: doc_score[1], reverse=True)[:top_n]
+        for doc, score in ranked:
+            doc.metadata["relevance_score"] = float(score)
+
+        return [doc for doc, _ in ranked]
+
+
+class CohereReranker(BaseReranker):
+    """
+    Reranks with the remote Cohere rerank API.
+    """
+    def __init__(self, model: str, api_key: str) -> None:
+        from langchain_cohere import CohereRerank
+
+        self.client = CohereRerank(model=model, cohere_api_key=api_key)
+
+    def score(self, query: str, docs: list[Document]) -> list[float]:
+        scores = [0.0] * len(docs)
+        for result in self.client.rerank(documents=[doc.page_content for doc in docs], query=query, top_n=len(docs)):
+            scores[result["index"]] = result["relevance_score"]
+        return scores
+
+
+class LexicalReranker(BaseReranker):
+    """
+    Local CPU reranker scoring the share of distinct query terms found in each
+    document. Article numbers, years and act names count as much as any other word.
+    Paraphrased and Nepali queries share few exact terms with the relevant documents,
+    so its scores are much lower than Cohere's and it has its own threshold,
+    settings.LEXICAL_RERANK_THRESHOLD.
+    """
+    def score(self, query: str, docs: list[Document]) -> list[float]:
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return [0.0] * len(docs)
+
+        return [len(query_terms & set(tokenize(doc.page_content))) / len(query_terms) for doc in docs]
+
+
+class CrossEncoderReranker(BaseReranker):
+    """
+    Local cross-encoder reranker. It needs the optional `sentence-transformers`
+    package and scores (query, document) pairs in batches on CPU.
+    """
+    def __init__(self, model: str, batch_size: int = 32) -> None:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError("The cross_encoder reranker requires `pip install sentence-transformers`")
+
+        logger.info(f"Loading cross-encoder reranker: {model}")
+        self.model = CrossEncoder(model, device="cpu")
+        self.batch_size = batch_size
+
+    def score(self, query: str, docs: list[Document]) -> list[float]:
+        logits = self.model.predict(
+            [(query, doc.page_content) for doc in docs], batch_size=self.batch_size, convert_to_numpy=True
+        )
+        # Map the relevance logits to [0, 1]
+        return (1 / (1 + np.exp(-np.asarray(logits, dtype=np.float32)))).tolist()
+
+
+class CachedReranker(BaseReranker):
+    """
+    Reranker wrapper caching scores by (query, document text), so only the documents
+    not scored before for the same query are sent to the wrapped reranker.
+    """
+    def __init__(self, reranker: BaseReranker, max_size: int) -> None:
+        self.reranker = reranker
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._scores: OrderedDict[str, float] = OrderedDict()
+        self.counters = Counters()
+
+    @property
+    def threshold(self) -> float:
+        return self.reranker.threshold
+
+    @staticmethod
+    def _key(query: str, doc: Document) -> str:
+        return hashlib.sha256(f"{query}\x1f{doc.page_content}".encode("utf-8")).hexdigest()
+
+    def score(self, query: str, docs: list[Document]) -> list[float]:
+        keys = [self._key(query, doc) for doc in docs]
+        with self._lock:
+            scores = [self._scores.get(key) for key in keys]
+            for key, score in zip(keys, scores):
+                if score is not None:
+                    self._scores.move_to_end(key)
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self.counters.incr("hits", len(docs) - len(missing))
+        self.counters.incr("misses", len(missing))
+        if missing:
+            new_scores = self.reranker.score(query, [docs[i] for i in missing])
+            with self._lock:
+                for i, score in zip(missing, new_scores):
+                    scores[i] = score
+                    self._scores[keys[i]] = score
+                while len(self._scores) > self.max_size:
+                    self._scores.popitem(last=False)
+
+        return scores
+
+    def stats(self) -> dict:
+        counts = self.counters.snapshot()
+        return {**counts, "hit_rate": hit_rate(counts.get("hits", 0), counts.get("misses", 0))}
+
+
+def build_reranker(name: str, settings) -> BaseReranker:
+    """
+    Builds the reranker selected by name ("cohere", "lexical" or "cross_encoder"),
+    wrapped with the score cache when settings.RERANK_CACHE_SIZE is positive.
+    """
+    if name == "lexical":
+        reranker, threshold = LexicalReranker(), settings.LEXICAL_RERANK_THRESHOLD
+    elif name == "cross_encoder":
+        reranker = CrossEncoderReranker(settings.CROSS_ENCODER_MODEL, batch_size=settings.RERANK_BATCH_SIZE)
+        threshold = settings.RELEVANCE_SCORE_THRESHOLD
+    elif name == "cohere":
+        reranker = CohereReranker(settings.COHERE_RERANK_MODEL, settings.COHERE_API_KEY)
+        threshold = settings.RELEVANCE_SCORE_THRESHOLD
+    else:
+        raise ValueError(f"Unsupported reranker: {name}")
+    reranker.threshold = threshold
+
+    if settings.RERANK_CACHE_SIZE > 0:
+        reranker = CachedReranker(reranker, settings.RERANK_CACHE_SIZE)
+
+    return reranker
@@ -1,88 +1,262 @@
+from langchain_core.agents import AgentAction
 from langchain_core.messages.ai import AIMessage
 from loguru import logger
 from fastapi import HTTPException
+from typing import AsyncIterator, Optional
+import threading
 import ast
 
 from nepal_constitution_ai.chat.schemas import ChatResponse, ChatHistory
 from nepal_constitution_ai.retriever.chains import (
     RetrieverChain,
+    get_sources,
     rewrite_query,
+    arewrite_query,
     setup_conversation_chain,
 )
 from nepal_constitution_ai.agent.agent import setup_agent
+from nepal_constitution_ai.agent.router import intent_router, VECTOR_SEARCH, CONVERSATION
 from nepal_constitution_ai.retriever.utils import get_llm
+from nepal_constitution_ai.retriever.registry import registry
+from nepal_constitution_ai.retriever.answer_cache import answer_cache
+from nepal_constitution_ai.retriever.streaming import AnswerFieldExtractor
 from nepal_constitution_ai.config.config import settings
 
 class Retriever:
+    """
+    Long-lived retrieval engine holding the LLM client, the retriever chain, the
+    conversation chain and the agent. Queries are routed to the retriever chain or
+    the conversation chain by the local intent router, or by the ReAct agent when
+    settings.USE_AGENT_ROUTING is on. It keeps no per-request state, so a single
+    instance can be shared across requests and threads; the chat history of the
+    current conversation is passed to `invoke`, `ainvoke` and `astream` instead.
+    """
     def __init__(
         self,
         llm: str,
-        chat_history: ChatHistory,
         mode: str = "retriever",
     ) -> None:
 
-        self.chat_history = chat_history
         self.llm_model = get_llm(llm)
         self.mode = mode
-        self.retriever_chain = RetrieverChain(
+        self.rag = RetrieverChain(
             llm_model=self.llm_model,
-        ).get_chain()
+        )
+        self.retriever_chain = self.rag.get_chain()
 
         self.conv_chain = setup_conversation_chain(
             llm_model=self.llm_model,
         )
-        self.agent = setup_agent(
-            retriever_chain=self.retriever_chain,
-            conv_chain=self.conv_chain,
-            llm_model=self.llm_model,
-        )
+        self._agent = None
+        self._agent_lock = threading.Lock()
+
+    @property
+    def agent(self):
+        """
+        The ReAct agent, built on first use. It is only used when
+        settings.USE_AGENT_ROUTING is on, so with the intent router it is never built.
+        """
+        if self._agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    self._agent = setup_agent(
+                        retriever_chain=self.retriever_chain,
+                        conv_chain=self.conv_chain,
+                        llm_model=self.llm_model,
+                    )
+        return self._agent
+
+    def _route(self, query: str) -> Optional[str]:
+        """
+        Returns the tool picked by the local intent router, or None when the agent
+        picks the tool (settings.USE_AGENT_ROUTING, or evaluation mode).
+        """
+        if settings.USE_AGENT_ROUTING or self.mode == "evaluation":
+            return None
+        return intent_router.route(query)
+
+    def _use_answer_cache(self, chat_history: ChatHistory) -> bool:
+        """
+        Whether the answer cache is used for the query. A follow-up question depends on
+        the conversation, so only questions asked without a chat history are cached.
+        """
+        return settings.USE_ANSWER_CACHE and self.mode != "evaluation" and not chat_history.messages
+
+    @staticmethod
+    def _small_talk_query(query: str) -> dict:
+        return {"user_question": query, "reformulated_question": query, "categories": []}
+
+    @staticmethod
+    def _tool_inputs(new_query: dict) -> dict:
+        return {
+            "user_question": new_query.get("user_question", ""),
+            "reformulated_question": new_query.get("reformulated_question", ""),
+            "categories": new_query.get("categories", "")
+        }
+
+    def _agent_inputs(self, new_query: dict) -> dict:
+        inputs = self._tool_inputs(new_query)
+        return {"input": inputs, "reformulated_question": new_query.get("reformulated_question", ""), "user_question": new_query.get("user_question", ""), "categories": new_query.get("categories", "")}
+
+    @staticmethod
+    def _parse_output(result: dict) -> Optional[dict]:
+        """
+        Returns the {answer, source, link} dict of the agent result, or None when the
+        agent produced no message.
+        """
+        output = result["output"]["answer"]
+
+        if isinstance(output, AIMessage):
+            if isinstance(output.content, str):
+                output = output.content
+                try:
+                    output =  ast.literal_eval(output)
+                except: 
+                    output = {"answer": output, "source": "", "link": ""}
+                return output
+
+        return None
 
     # invoke function for the retriever
-    def invoke(self, query: str):
+    def invoke(self, query: str, chat_history: Optional[ChatHistory] = None):
         try:
             query = query.replace('"', "'")
-            
-            new_query = rewrite_query(
-                query=query, llm_model=self.llm_model, history=self.chat_history
-            )
+            if chat_history is None:
+                chat_history = ChatHistory()
+
+            use_answer_cache = self._use_answer_cache(chat_history)
+            candidate = None
+            if use_answer_cache:
+                # Answer repeated questions without retrieving or generating again
+                embedding = registry.get_embedding()
+                query_vector = embedding.embed_query(query)
+                candidate = answer_cache.lookup(query_vector)
+                if candidate is not None and not settings.ANSWER_CACHE_VERIFY_REWRITE:
+                    return ChatResponse(message=answer_cache.match(candidate))
+
+            tool = self._route(query)
+            if tool == CONVERSATION:
+                # Small talk needs neither the query rewrite nor the retrieval
+                new_query = self._small_talk_query(query)
+            else:
+                new_query = rewrite_query(
+                    query=query, llm_model=self.llm_model, history=chat_history
+                )
+            reformulated_question = new_query.get("reformulated_question", "")
+
+            if use_answer_cache:
+                reformulated_vector = (
+                    query_vector if reformulated_question == query else embedding.embed_query(reformulated_question)
+                )
+                if candidate is not None:
+                    cached_answer = answer_cache.match(candidate, reformulated_vector, new_query.get("categories"))
+                    if cached_answer is not None:
+                        return ChatResponse(message=cached_answer)
 
-            new_query = new_query.strip()
-            new_query = new_query.replace("\n", "")
-            if new_query[-2] == ",":
-                new_query = new_query[:-2] + "}"
+            if tool == CONVERSATION:
+                result = {"output": self.conv_chain.invoke({"user_question": query})}
+            else:
+                if self.mode == "evaluation":
+                    result = self.retriever_chain.invoke(
+                        {"input": new_query}
+                    )
+                    return result
 
-            new_query =  ast.literal_eval(new_query)
+                if tool == VECTOR_SEARCH:
+                    result = {"output": self.retriever_chain.invoke(self._tool_inputs(new_query))}
+                else:
+                    result = self.agent.invoke(self._agent_inputs(new_query))
 
-            if settings.USE_RERANKING:
-                if "categories" in new_query:
-                    new_query["categories"] = []
+            output = self._parse_output(result)
+
+            if output is not None:
+                if use_answer_cache:
+                    answer_cache.add(
+                        query_vector,
+                        user_question=query,
+                        reformulated_question=reformulated_question,
+                        reformulated_vector=reformulated_vector,
+                        categories=new_query.get("categories", []),
+                        answer=output,
+                    )
+
+                return ChatResponse(message=output)
                 
-            inputs = {
-                "user_question": new_query.get("user_question", ""),
-                "reformulated_question": new_query.get("reformulated_question", ""),
-                "categories": new_query.get("categories", "")
-            }
-            if self.mode == "evaluation":
-                result = self.retriever_chain.invoke(
-                    {"input": new_query}
+            return ChatResponse(message={})
+
+        except HTTPException as e:
+            logger.error(f"HTTP error occurred: {str(e)}")
+            raise HTTPException(
+                detail=f"An error occurred while processing your query: {str(e)}",
+            )
+        except Exception as e:
+            logger.error(f"An unexpected error occurred: {str(e)}")
+            return ChatResponse(message={"answer": "Oops! An error occurred while processing your query. Please retry!", "source": "", "link": ""})
+
+    async def ainvoke(self, query: str, chat_history: Optional[ChatHistory] = None):
+        """
+        Async version of invoke. Every network call (embedding, query rewrite, agent,
+        vector search and answer generation) is awaited, so a request waiting on the
+        LLM or the vector database does not block the event loop.
+        """
+        try:
+            query = query.replace('"', "'")
+            if chat_history is None:
+                chat_history = ChatHistory()
+
+            use_answer_cache = self._use_answer_cache(chat_history)
+            candidate = None
+            if use_answer_cache:
+                embedding = registry.get_embedding()
+                query_vector = await embedding.aembed_query(query)
+                candidate = answer_cache.lookup(query_vector)
+                if candidate is not None and not settings.ANSWER_CACHE_VERIFY_REWRITE:
+                    return ChatResponse(message=answer_cache.match(candidate))
+
+            tool = self._route(query)
+            if tool == CONVERSATION:
+                new_query = self._small_talk_query(query)
+            else:
+                new_query = await arewrite_query(
+                    query=query, llm_model=self.llm_model, history=chat_history
                 )
-                return result
+            reformulated_question = new_query.get("reformulated_question", "")
 
-            result = self.agent.invoke(
-                    {"input": inputs, "reformulated_question": new_query.get("reformulated_question", ""), "user_question": new_query.get("user_question", ""), "categories": new_query.get("categories", "")}
+            if use_answer_cache:
+                reformulated_vector = (
+                    query_vector if reformulated_question == query else await embedding.aembed_query(reformulated_question)
                 )
-            output = result["output"]["answer"]
-           
-            if isinstance(output, AIMessage):
-                if isinstance(output.content, str):
-                    output = output.content
-                    try:
-                        output =  ast.literal_eval(output)
-                    except: 
-                        output = {"answer": output, "source": "", "link": ""}
-                        
-                    return ChatResponse(message=output)
-                
+                if candidate is not None:
+                    cached_answer = answer_cache.match(candidate, reformulated_vector, new_query.get("categories"))
+                    if cached_answer is not None:
+                        return ChatResponse(message=cached_answer)
+
+            if tool == CONVERSATION:
+                result = {"output": await self.conv_chain.ainvoke({"user_question": query})}
+            else:
+                if self.mode == "evaluation":
+                    return await self.retriever_chain.ainvoke({"input": new_query})
+
+                if tool == VECTOR_SEARCH:
+                    result = {"output": await self.retriever_chain.ainvoke(self._tool_inputs(new_query))}
+                else:
+                    result = await self.agent.ainvoke(self._agent_inputs(new_query))
+
+            output = self._parse_output(result)
+
+            if output is not None:
+                if use_answer_cache:
+                    answer_cache.add(
+                        query_vector,
+                        user_question=query,
+                        reformulated_question=reformulated_question,
+                        reformulated_vector=reformulated_vector,
+                        categories=new_query.get("categories", []),
+                        answer=output,
+                    )
+
+                return ChatResponse(message=output)
+
             return ChatResponse(message={})
 
         except HTTPException as e:
@@ -92,4 +266,140 @@ class Retriever:
             )
         except Exception as e:
             logger.error(f"An unexpected error occurred: {str(e)}")
-            return ChatResponse(message={"answer": "Oops! An error occurred while processing your query. Please retry!", "source": "", "link": ""})
\ No newline at end of file
+            return ChatResponse(message={"answer": "Oops! An error occurred while processing your query. Please retry!", "source": "", "link": ""})
+
+    async def astream(self, query: str, chat_history: Optional[ChatHistory] = None) -> AsyncIterator[dict]:
+        """
+        Streams the answer to the query as events, each a dict with "event" and "data":
+        "sources" with the sources of the retrieved documents, then "token" events with
+        the answer text as the LLM generates it, and finally "done" with the complete
+        {answer, source, link} message, or "error" when the answer could not be completed.
+
+        When the agent routes the query it is only used to pick the tool; the picked
+        tool is then run directly so that the answer generation can be streamed.
+        """
+        try:
+            query = query.replace('"', "'")
+            if chat_history is None:
+                chat_history = ChatHistory()
+
+            use_answer_cache = self._use_answer_cache(chat_history)
+            candidate, cached_answer = None, None
+            if use_answer_cache:
+                embedding = registry.get_embedding()
+                query_vector = await embedding.aembed_query(query)
+                candidate = answer_cache.lookup(query_vector)
+
+            if candidate is not None and not settings.ANSWER_CACHE_VERIFY_REWRITE:
+                cached_answer = answer_cache.match(candidate)
+            else:
+                tool = self._route(query)
+                if tool == CONVERSATION:
+                    new_query = self._small_talk_query(query)
+                else:
+                    new_query = await arewrite_query(
+                        query=query, llm_model=self.llm_model, history=chat_history
+                    )
+                reformulated_question = new_query.get("reformulated_question", "")
+
+                if use_answer_cache:
+                    reformulated_vector = (
+                        query_vector if reformulated_question == query else await embedding.aembed_query(reformulated_question)
+                    )
+                    if candidate is not None:
+                        cached_answer = answer_cache.match(candidate, reformulated_vector, new_query.get("categories"))
+
+            if cached_answer is not None:
+                yield {"event": "sources", "data": []}
+                yield {"event": "token", "data": cached_answer.get("answer", "")}
+                yield {"event": "done", "data": cached_answer}
+                return
+
+            if tool == CONVERSATION:
+                tool_input = {"user_question": query}
+            else:
+                tool_input = self._tool_inputs(new_query)
+
+                if tool is None:
+                    try:
+                        decision = await self.agent.agent.aplan(intermediate_steps=[], **self._agent_inputs(new_query))
+                    except Exception as e:
+                        logger.warning(f"Could not parse the agent's tool choice, running the agent instead: {str(e)}")
+                        decision = None
+
+                    if isinstance(decision, AgentAction) and decision.tool in (VECTOR_SEARCH, CONVERSATION):
+                        tool, tool_input = decision.tool, decision.tool_input
+
+            streamed = False
+            if tool == VECTOR_SEARCH:
+                retrieved = await self.rag.aretrieve_and_format(tool_input)
+                yield {"event": "sources", "data": get_sources(retrieved["orig_context"])}
+
+                extractor = AnswerFieldExtractor()
+                async for chunk in self.rag.astream_answer(retrieved):
+                    tokens = extractor.feed(chunk)
+                    if tokens:
+                        streamed = True
+                        yield {"event": "token", "data": tokens}
+
+                output = self._parse_output({"output": {"answer": AIMessage(content=extractor.text)}})
+            else:
+                yield {"event": "sources", "data": []}
+                if tool == CONVERSATION:
+                    if isinstance(tool_input, str):
+                        tool_input = ast.literal_eval(tool_input)
+                    result = {"output": await self.conv_chain.ainvoke(tool_input)}
+                else:
+                    result = await self.agent.ainvoke(self._agent_inputs(new_query))
+                output = self._parse_output(result)
+
+            output = output or {}
+            if not streamed and output.get("answer"):
+                yield {"event": "token", "data": output["answer"]}
+
+            if use_answer_cache and output:
+                answer_cache.add(
+                    query_vector,
+                    user_question=query,
+                    reformulated_question=reformulated_question,
+                    reformulated_vector=reformulated_vector,
+                    categories=new_query.get("categories", []),
+                    answer=output,
+                )
+
+            yield {"event": "done", "data": output}
+
+        except Exception as e:
+            logger.error(f"An unexpected error occurred: {str(e)}")
+            # Tokens may have been streamed already, so the error is not sent as answer text
+            yield {"event": "error", "data": {"detail": "Oops! An error occurred while processing your query. Please retry!"}}
+
+
+_retrievers: dict[tuple[str, str], Retriever] = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(llm: str = settings.OPENAI_MODEL, mode: str = "retriever") -> Retriever:
+    """
+    Returns the process-wide Retriever for the given LLM and mode, building it on
+    first use. The instance is shared by every request, so the LLM client, chains
+    and agent are only set up once per process.
+
+    Args:
+        llm (str): The name of the LLM model.
+        mode (str): The retriever mode ("retriever" or "evaluation").
+
+    Returns:
+        Retriever: The shared Retriever instance.
+    """
+    key = (llm, mode)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        with _retrievers_lock:
+            retriever = _retrievers.get(key)
+            if retriever is None:
+                logger.info(f"Building shared retriever for model: {llm} (mode: {mode})")
+                retriever = Retriever(llm=llm, mode=mode)
+                _retrievers[key] = retriever
+
+    return retriever
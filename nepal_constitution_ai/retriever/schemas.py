@@ -0,0 +1,8 @@
+from typing import List
+from pydantic import BaseModel, Field
+
+class RewrittenQuery(BaseModel):
+    """ The reformulated user question used to query the vector database. """
+    user_question: str = Field(description="The original question from the user")
+    reformulated_question: str = Field(description="The generated sentence or phrase to query the vector database, in Nepali")
+    categories: List[str] = Field(default_factory=list, description="The document categories that might contain the answer")
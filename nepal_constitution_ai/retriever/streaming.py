@@ -0,0 +1,76 @@
+import re
+
+ANSWER_KEY_PATTERN = re.compile(r'["\']answer["\']\s*:\s*(["\'])')
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"', "'": "'"}
+
+
+class AnswerFieldExtractor:
+    """
+    Incrementally extracts the value of the "answer" field from the streamed LLM
+    output, which is a JSON-like {"answer": ..., "source": ..., "link": ...} object.
+    Feeding it the raw chunks returns only the newly decoded answer text, so the
+    answer can be streamed without the surrounding JSON.
+    """
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.position = None
+        self.quote = None
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds a raw chunk and returns the answer text decoded since the previous call.
+        """
+        self.buffer += chunk
+        if self.done:
+            return ""
+
+        if self.position is None:
+            match = ANSWER_KEY_PATTERN.search(self.buffer)
+            if match is None:
+                return ""
+            self.quote = match.group(1)
+            self.position = match.end()
+
+        decoded = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if char == "\\":
+                escaped = self._decode_escape()
+                if escaped is None:
+                    # Wait for the rest of the escape sequence
+                    break
+                decoded.append(escaped)
+                continue
+            if char == self.quote:
+                self.done = True
+                break
+            decoded.append(char)
+            self.position += 1
+
+        return "".join(decoded)
+
+    def _decode_escape(self):
+        if self.position + 1 >= len(self.buffer):
+            return None
+
+        code = self.buffer[self.position + 1]
+        if code == "u":
+            digits = self.buffer[self.position + 2:self.position + 6]
+            if len(digits) < 4:
+                return None
+            self.position += 6
+            try:
+                return chr(int(digits, 16))
+            except ValueError:
+                return digits
+
+        self.position += 2
+        return ESCAPES.get(code, code)
+
+    @property
+    def text(self) -> str:
+        """
+        The whole raw output fed so far.
+        """
+        return self.buffer
@@ -1,9 +1,12 @@
+import heapq
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
 from loguru import logger
-from langchain_pinecone import PineconeVectorStore
 from langchain_core.messages.ai import AIMessage
 
 from nepal_constitution_ai.models.openai.openai_model import OpenaiModel
 from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.retriever.registry import registry
 
 def get_llm(llm_name: str) -> OpenaiModel:
     """
@@ -32,43 +35,33 @@ def get_llm(llm_name: str) -> OpenaiModel:
     return llm_model
 
 
-def get_vector_retriever(vector_db: str, embedding, namespaces=None):
+def get_vector_retriever(vector_db: str, embedding=None, namespaces=None):
     """
-    Retrieves a vector store retriever based on the given vector database name.
-    Specifically configured for Pinecone, the function returns a retriever that
-    can perform similarity search with the specified number of top results (k).
+    Retrieves the vector stores for the given vector database name, one per namespace.
+    The stores are taken from the shared registry, so the embedding client, the index
+    handle and each namespace's store are built once and reused across queries.
 
     Args:
-        vector_db (str): The name of the vector database (e.g., 'pinecone').
-        embedding (callable): The embedding function used to convert queries into vectors.
-        k (int, optional): The number of top similar results to return.
+        vector_db (str): The name of the vector database ('pinecone' or 'local').
+        embedding (callable, optional): Unused, the registry's embeddings client is used.
+        namespaces (list, optional): The namespaces to query, or None for the default namespace.
 
     Returns:
-        PineconeVectorStore: A configured Pinecone retriever object.
+        list[VectorStore]: The configured vector stores.
 
     Raises:
         ValueError: If an unsupported vector database is provided.
     """
     try:
-        pinecone_index = settings.PINECONE_INDEX
-        retriever = []
+        if vector_db not in ("pinecone", "local"):
+            raise ValueError(vector_db)
 
         if namespaces:
-            for namespace in namespaces:
-                retriever.append(PineconeVectorStore(
-                        index_name=pinecone_index,
-                        embedding=embedding,
-                        pinecone_api_key=settings.PINECONE_API_KEY,
-                        namespace=namespace
-                    ))
+            retriever = [registry.get_vector_store(namespace=namespace, vector_db=vector_db) for namespace in namespaces]
         else:
-            retriever.append(PineconeVectorStore(
-                    index_name=pinecone_index,
-                    embedding=embedding,
-                    pinecone_api_key=settings.PINECONE_API_KEY,
-                ))
+            retriever = [registry.get_vector_store(namespace=None, vector_db=vector_db)]
 
-        logger.info(f"Successfully created retriever for vector database: {vector_db}")
+        logger.debug(f"Vector store registry stats: {registry.stats()}")
         return retriever
 
     except ValueError:
@@ -78,6 +71,116 @@ def get_vector_retriever(vector_db: str, embedding, namespaces=None):
         logger.error(f"An error occurred while retrieving the vector retriever: {e}")
         raise e
     
+_namespace_search_pool = ThreadPoolExecutor(
+    max_workers=settings.NAMESPACE_SEARCH_WORKERS, thread_name_prefix="namespace-search"
+)
+
+
+def search_namespaces(stores: list, query_vector: list[float], k: int, timeout: float = None) -> list:
+    """
+    Searches several namespace vector stores concurrently with an already embedded query
+    and merges the results into a single global top-k list.
+
+    Args:
+        stores (list): The vector stores to search, one per namespace.
+        query_vector (list[float]): The embedded query.
+        k (int): The number of results to return overall.
+        timeout (float, optional): Seconds to wait for each namespace search. Namespaces that
+            do not answer in time are skipped.
+
+    Returns:
+        list[tuple[Document, float]]: The k highest scoring (document, score) pairs.
+    """
+    timeout = settings.NAMESPACE_SEARCH_TIMEOUT if timeout is None else timeout
+    futures = {
+        _namespace_search_pool.submit(store.similarity_search_by_vector_with_score, query_vector, k=k): store
+        for store in stores
+    }
+    # All searches start together, so a shared deadline bounds each namespace by the timeout
+    done, not_done = wait(futures, timeout=timeout)
+
+    results = []
+    for future in done:
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            logger.error(f"Search failed for namespace {getattr(futures[future], '_namespace', None)}: {e}")
+
+    for future in not_done:
+        future.cancel()
+        logger.warning(f"Search timed out for namespace {getattr(futures[future], '_namespace', None)}")
+
+    return heapq.nlargest(k, results, key=lambda doc_score: doc_score[1])
+
+
+async def asearch_namespaces(stores: list, query_vector: list[float], k: int, timeout: float = None) -> list:
+    """
+    Async version of search_namespaces. The blocking vector store searches run on the
+    shared namespace search pool, so the event loop stays free while they are in flight.
+
+    Args:
+        stores (list): The vector stores to search, one per namespace.
+        query_vector (list[float]): The embedded query.
+        k (int): The number of results to return overall.
+        timeout (float, optional): Seconds to wait for the namespace searches. Namespaces that
+            do not answer in time are skipped.
+
+    Returns:
+        list[tuple[Document, float]]: The k highest scoring (document, score) pairs.
+    """
+    timeout = settings.NAMESPACE_SEARCH_TIMEOUT if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    futures = {
+        loop.run_in_executor(
+            _namespace_search_pool, lambda store=store: store.similarity_search_by_vector_with_score(query_vector, k=k)
+        ): store
+        for store in stores
+    }
+    if not futures:
+        return []
+    done, not_done = await asyncio.wait(futures, timeout=timeout)
+
+    results = []
+    for future in done:
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            logger.error(f"Search failed for namespace {getattr(futures[future], '_namespace', None)}: {e}")
+
+    for future in not_done:
+        future.cancel()
+        logger.warning(f"Search timed out for namespace {getattr(futures[future], '_namespace', None)}")
+
+    return heapq.nlargest(k, results, key=lambda doc_score: doc_score[1])
+
+
+def reciprocal_rank_fusion(result_lists: list[list], k: int = None, top_n: int = None) -> list:
+    """
+    Fuses several ranked result lists with reciprocal rank fusion. A document scores
+    the sum of 1 / (k + rank) over the lists it appears in; documents are identified
+    by their page content.
+
+    Args:
+        result_lists (list[list]): Ranked (document, score) lists, best first.
+        k (int, optional): The RRF rank constant, defaults to settings.RRF_K.
+        top_n (int, optional): The number of fused results to return.
+
+    Returns:
+        list[tuple[Document, float]]: The fused (document, RRF score) pairs, best first.
+    """
+    k = k or settings.RRF_K
+    fused_scores = {}
+    fused_docs = {}
+
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results, start=1):
+            fused_scores[doc.page_content] = fused_scores.get(doc.page_content, 0.0) + 1.0 / (k + rank)
+            fused_docs.setdefault(doc.page_content, doc)
+
+    fused = sorted(fused_scores.items(), key=lambda item: item[1], reverse=True)[:top_n]
+    return [(fused_docs[content], score) for content, score in fused]
+
+
 def format_chat_history(chat_history: list) -> str:
     """
     Formats the chat history into a dictionary format.
@@ -1,9 +1,32 @@
 from fastapi import APIRouter
 
 from nepal_constitution_ai.chat.routes import router as chat_routes
+from nepal_constitution_ai.retriever.registry import registry
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.retriever.embedding_cache import embedding_cache
+from nepal_constitution_ai.retriever.answer_cache import answer_cache
+from nepal_constitution_ai.agent.router import intent_router
+from nepal_constitution_ai.retriever.chains import rewrite_counters
 
 
 router = APIRouter()
 
 router.include_router(chat_routes)
 
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Cache and registry counters of the retrieval pipeline
+    """
+    reranker = registry.peek(("reranker", settings.RERANKER))
+
+    return {
+        "vector_store_registry": registry.stats(),
+        "reranker_cache": reranker.stats() if hasattr(reranker, "stats") else {},
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "intent_router": intent_router.stats(),
+        "query_rewrite": rewrite_counters.snapshot(),
+    }
+
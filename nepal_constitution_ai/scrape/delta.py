@@ -0,0 +1,111 @@
+import os
+import json
+from datetime import datetime, timezone
+from nepal_constitution_ai.utils.catalog import DocumentCatalog
+from nepal_constitution_ai.config.config import settings
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+
+def merge_deltas(pending, delta):
+    """
+    Merge a new delta into a delta that was not consumed yet, so that running the scraper
+    twice before the download does not lose the changes of the first run. Each document
+    ends up in one list only, with its latest entry.
+    """
+    status = {}
+    entries = {}
+    for kind in ("added", "changed", "removed"):
+        for entry in pending.get(kind, []):
+            status[entry["filename"].strip()] = kind
+            entries[entry["filename"].strip()] = entry
+
+    for kind in ("added", "changed", "removed"):
+        for entry in delta[kind]:
+            filename = entry["filename"].strip()
+            # A document changed since it was added is still to be downloaded as a new one
+            status[filename] = "added" if kind == "changed" and status.get(filename) == "added" else kind
+            entries[filename] = entry
+
+    merged = {"timestamp": delta["timestamp"], "added": [], "changed": [], "removed": []}
+    for filename, kind in status.items():
+        merged[kind].append(entries[filename])
+    return merged
+
+
+def record_scrape_delta(previous, catalog, timestamp=None):
+    """
+    Diff the newly scraped catalog against the previous one, append the difference to
+    the change log at settings.SCRAPE_CHANGELOG_PATH, keyed by the scrape timestamp, and
+    save the delta to hand over to the download stage at settings.SCRAPE_DELTA_PATH.
+
+    Args:
+        previous (DocumentCatalog): Catalog of the previous scrape.
+        catalog (DocumentCatalog): Newly scraped catalog.
+        timestamp (str): Scrape timestamp, now by default.
+
+    Returns:
+        dict: The delta, with the entries of the "added", "changed" and "removed" documents.
+    """
+    timestamp = timestamp or datetime.now(timezone.utc).isoformat()
+    diff = catalog.diff(previous)
+    delta = {
+        "timestamp": timestamp,
+        "added": [catalog.get(filename) for filename in diff["added"]],
+        "changed": [catalog.get(filename) for filename in diff["changed"]],
+        "removed": [previous.get(filename) for filename in diff["removed"]],
+    }
+
+    changelog = load_json(settings.SCRAPE_CHANGELOG_PATH, {})
+    changelog[timestamp] = diff
+    save_json(settings.SCRAPE_CHANGELOG_PATH, changelog)
+
+    pending = load_json(settings.SCRAPE_DELTA_PATH, None)
+    save_json(settings.SCRAPE_DELTA_PATH, merge_deltas(pending, delta) if pending else delta)
+
+    print(f"Scrape delta: {len(diff['added'])} added, {len(diff['changed'])} changed, {len(diff['removed'])} removed")
+    return delta
+
+
+def load_scrape_delta():
+    """Load the delta of the scrapes not downloaded yet, or None to process the whole catalog."""
+    return load_json(settings.SCRAPE_DELTA_PATH, None)
+
+
+def clear_scrape_delta():
+    if os.path.exists(settings.SCRAPE_DELTA_PATH):
+        os.remove(settings.SCRAPE_DELTA_PATH)
+
+
+def consume_scrape_delta(delta, failed_filenames):
+    """
+    Mark the delta as downloaded. The added and changed documents whose download
+    failed are kept in the delta for the next run, as the old PDF of a changed
+    document is still in the download folder and would not be retried as missing;
+    the delta is removed once every document was downloaded.
+    """
+    pending = {
+        kind: [entry for entry in delta[kind] if entry["filename"].strip() in failed_filenames]
+        for kind in ("added", "changed")
+    }
+    if any(pending.values()):
+        save_json(settings.SCRAPE_DELTA_PATH, {"timestamp": delta["timestamp"], **pending, "removed": []})
+        print(f"Kept {sum(len(entries) for entries in pending.values())} failed downloads in the scrape delta")
+    else:
+        clear_scrape_delta()
+
+
+def load_previous_catalog(json_path):
+    return DocumentCatalog.from_json(json_path) if os.path.exists(json_path) else DocumentCatalog()
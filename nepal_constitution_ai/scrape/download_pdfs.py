@@ -1,79 +1,204 @@
 import os
 import json
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from nepal_constitution_ai.scrape.delta import load_scrape_delta, consume_scrape_delta
+from nepal_constitution_ai.scrape.utils import create_http_session
+from nepal_constitution_ai.utils.catalog import DocumentCatalog
 from nepal_constitution_ai.config.config import settings
 
 
-def download_file(url, folder_path, filename):
+def create_session(pool_size=None):
+    """
+    Create a session whose connections are reused across downloads, retrying failed
+    connections, rate limits and server errors with exponential backoff.
+    """
+    return create_http_session(
+        pool_size or settings.DOWNLOAD_WORKERS, settings.DOWNLOAD_MAX_RETRIES, settings.DOWNLOAD_RETRY_BACKOFF
+    )
+
+
+class DownloadState:
+    """
+    ETag and size of the downloaded files by filename, persisted in a JSON file so that
+    the next runs can skip the files that did not change. The ETag and Last-Modified of
+    the `.part` files are kept too, to check that a resumed download is the same file.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.files = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f)
+
+    def get(self, filename):
+        with self._lock:
+            return self.files.get(filename)
+
+    def set(self, filename, url, etag, size, last_modified=None):
+        with self._lock:
+            self.files[filename] = {"url": url, "etag": etag, "size": size, "last_modified": last_modified}
+
+    def remove(self, filename):
+        with self._lock:
+            self.files.pop(filename, None)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = dict(self.files)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+def is_up_to_date(session, url, file_path, known):
+    """
+    Whether the local file matches the remote one: same ETag as the recorded download
+    when the server sends one, same size otherwise.
+    """
+    if not os.path.exists(file_path):
+        return False, None
+
+    response = session.head(url, allow_redirects=True, timeout=settings.DOWNLOAD_TIMEOUT)
+    if response.status_code != 200:
+        return False, None
+
+    etag = response.headers.get("ETag")
+    remote_size = response.headers.get("Content-Length")
+    local_size = os.path.getsize(file_path)
+    if etag and known and known.get("url") == url and known.get("etag"):
+        return etag == known["etag"] and local_size == known.get("size", local_size), etag
+    return remote_size is not None and int(remote_size) == local_size, etag
+
+
+def download_file(url, folder_path, filename, session=None, state=None, force=False):
     """
     Download a file from the given URL and save it to the specified folder with the given filename.
+
+    Unless forced, the file is skipped when it is already present with the same ETag or size. It is
+    streamed in large chunks to a `.part` file, resumed with an HTTP Range request when
+    a previous download was interrupted, and renamed once complete, so an interrupted
+    download never leaves a truncated PDF behind. A download is only resumed when the
+    ETag or Last-Modified of the part can be sent as If-Range, otherwise it restarts.
     """
+    session = session or create_session(1)
+    state = state or DownloadState()
+    file_path = os.path.join(folder_path, filename)
+    part_path = f"{file_path}.part"
+
     try:
-        response = requests.get(url, stream=True, timeout=30)
-        if response.status_code == 200:
-            os.makedirs(folder_path, exist_ok=True)
-            file_path = os.path.join(folder_path, filename)
-            with open(file_path, 'wb') as file:
-                for chunk in response.iter_content(1024):
-                    file.write(chunk)
-            print(f"Downloaded: {filename}")
+        os.makedirs(folder_path, exist_ok=True)
+        known = state.get(filename)
+        up_to_date, etag = (False, None) if force else is_up_to_date(session, url, file_path, known)
+        if up_to_date:
+            state.set(filename, url, etag, os.path.getsize(file_path))
             return True
-        else:
-            print(f"Failed to download {filename}: HTTP {response.status_code}")
-            return False
+
+        headers = {}
+        resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if resume_from:
+            # Only resume when the remote file is still the one the part was downloaded from;
+            # If-Range needs a strong ETag or else the Last-Modified date
+            partial = state.get(f"{filename}.part") or {}
+            validator = None
+            if partial.get("url") == url:
+                part_etag = partial.get("etag")
+                validator = part_etag if part_etag and not part_etag.startswith("W/") else partial.get("last_modified")
+            if validator:
+                headers["Range"] = f"bytes={resume_from}-"
+                headers["If-Range"] = validator
+            else: # The server could send the rest of another file
+                os.remove(part_path)
+                resume_from = 0
+
+        with session.get(url, headers=headers, stream=True, timeout=settings.DOWNLOAD_TIMEOUT) as response:
+            if response.status_code == 416: # The part is already complete or does not match anymore
+                os.remove(part_path)
+                return download_file(url, folder_path, filename, session, state, force)
+            if response.status_code not in (200, 206):
+                print(f"Failed to download {filename}: HTTP {response.status_code}")
+                return False
+
+            etag = response.headers.get("ETag")
+            resumed = response.status_code == 206
+            state.set(f"{filename}.part", url, etag, None, response.headers.get("Last-Modified"))
+            with open(part_path, "ab" if resumed else "wb") as file:
+                for chunk in response.iter_content(settings.DOWNLOAD_CHUNK_SIZE):
+                    file.write(chunk)
+
+            expected_size = response.headers.get("Content-Length")
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size != int(expected_size) + (resume_from if resumed else 0):
+                print(f"Incomplete download of {filename}: {size} bytes")
+                return False
+
+        os.replace(part_path, file_path)
+        state.remove(f"{filename}.part")
+        state.set(filename, url, etag, size)
+        print(f"Downloaded: {filename}{' (resumed)' if resumed else ''}")
+        return True
     except Exception as e:
         print(f"Error downloading {filename}: {e}")
         return False
 
 
-def process_files(data, target_folder, missing_files):
+def process_files(catalog, target_folder, missing_files, session=None, state=None, filenames=None, changed=()):
     """
-    Recursively process files in a nested JSON structure:
-    - Download the file from the link.
-    - Remove entries for missing files from the JSON if the download fails.
+    Process the files of the document catalog with a pool of settings.DOWNLOAD_WORKERS threads:
+    - Download the file from the link, again for the changed filenames.
+    - Record the entries of the files that could not be downloaded in missing_files.
+
+    Only the given filenames are processed, all the files of the catalog by default.
     """
-    if isinstance(data, dict):
-        keys_to_delete = []  # List to store keys for which entries should be removed
-        for key, value in data.items():
-            if isinstance(value, list) or isinstance(value, dict):
-                # Recurse into nested structures
-                process_files(value, target_folder, missing_files)
-            elif key == "filename":
-                filename = value.strip()
-                target_file_path = os.path.join(target_folder, filename)
-
-                # Download the file
-                download_link = data.get("nep_pdf_link", "").strip()
-                if download_link:
-                    if download_file(download_link, target_folder, filename):
-                        print(f"Downloaded: {filename}")
-                    else:
-                        # Mark the file as missing and add it to the missing_files list
-                        missing_files.append(data)
-                        keys_to_delete.append(key)
-                else:
-                    print(f"Missing download link for: {filename}")
-                    missing_files.append(data)
-                    keys_to_delete.append(key)
-
-        # Remove missing files from the current level of the JSON structure
-        for key in keys_to_delete:
-            del data[key]
-
-    elif isinstance(data, list):
-        to_remove = []  # List to track items to remove
-        for item in data:
-            if isinstance(item, dict) or isinstance(item, list):
-                # Recurse into nested structures
-                process_files(item, target_folder, missing_files)
+    session = session or create_session()
+    state = state or DownloadState()
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=settings.DOWNLOAD_WORKERS, thread_name_prefix="download") as pool:
+        futures = {}
+        # A document listed under several categories is downloaded once
+        for filename in catalog.filenames():
+            if filenames is not None and filename not in filenames:
+                continue
+            entry = catalog.get(filename)
+
+            # Download the file
+            download_link = entry.get("nep_pdf_link", "").strip()
+            if download_link:
+                futures[pool.submit(
+                    download_file, download_link, target_folder, filename, session, state, filename in changed
+                )] = entry
             else:
-                to_remove.append(item)
+                print(f"Missing download link for: {filename}")
+                failed.append(entry)
+
+        for completed, future in enumerate(as_completed(futures), start=1):
+            if not future.result():
+                failed.append(futures[future])
+            if completed % 100 == 0: # Keep the progress of long runs
+                state.save()
 
-        # Remove any completely empty items or invalid entries
-        for item in to_remove:
-            data.remove(item)
+    # Mark the files as missing
+    missing_files.extend(failed)
 
-    return data
+    return catalog
+
+
+def remove_files(entries, target_folder, state):
+    """
+    Delete the downloaded files of the documents removed from the website.
+    """
+    for entry in entries:
+        filename = entry["filename"].strip()
+        file_path = os.path.join(target_folder, filename)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            print(f"Removed: {filename}")
+        state.remove(filename)
 
 
 def main():
@@ -82,8 +207,7 @@ def main():
     TARGET_FOLDER = f"{settings.DATA_PATH}/downloaded_pdfs"  # Folder to store downloaded files
 
     # Load JSON data
-    with open(JSON_PATH, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    catalog = DocumentCatalog.from_json(JSON_PATH)
 
     # List to keep track of missing files
     missing_files = []
@@ -91,15 +215,32 @@ def main():
     # Create target folder
     os.makedirs(TARGET_FOLDER, exist_ok=True)
 
-    # Process files and remove missing entries from JSON
-    updated_data = process_files(data, TARGET_FOLDER, missing_files)
+    # With a scrape delta, only the new and changed documents are downloaded, along with
+    # the ones missing from a previous download; without one, the whole catalog is checked
+    delta = load_scrape_delta()
+    filenames, changed = None, set()
+    if delta is not None:
+        with os.scandir(TARGET_FOLDER) as entries:
+            downloaded = {entry.name for entry in entries if entry.is_file()}
+        changed = {entry["filename"].strip() for entry in delta["changed"]}
+        filenames = {entry["filename"].strip() for entry in delta["added"]} | changed
+        filenames |= {filename for filename in catalog.filenames() if filename not in downloaded}
+        print(f"Scrape delta of {delta['timestamp']}: {len(filenames)} files to download, {len(delta['removed'])} to remove")
+
+    state = DownloadState(settings.DOWNLOAD_STATE_PATH)
+    try:
+        process_files(catalog, TARGET_FOLDER, missing_files, state=state, filenames=filenames, changed=changed)
+        if delta is not None:
+            remove_files(delta["removed"], TARGET_FOLDER, state)
+    finally:
+        state.save()
 
-    # Save the updated JSON back to the file, excluding missing entries
-    with open(JSON_PATH, 'w', encoding='utf-8') as f:
-        json.dump(updated_data, f, ensure_ascii=False, indent=4)
+    # The missing new files are not in the download folder, so the next run tries them again
+    # anyway; the failed ones of the delta stay in it, as a changed file still has its old PDF
+    if delta is not None:
+        consume_scrape_delta(delta, {entry["filename"].strip() for entry in missing_files})
 
     # Print summary
     print("\nProcessing Summary:")
-    print(f"Files downloaded: {len(updated_data)}")
-    print(f"Files missing and removed from JSON: {len(missing_files)}")
-
+    print(f"Files checked: {len(catalog) if filenames is None else len(filenames)}")
+    print(f"Files missing: {len(missing_files)}")
@@ -1,44 +1,139 @@
 import os
-import json
 import shutil
+from nepal_constitution_ai.utils.catalog import DocumentCatalog
 from nepal_constitution_ai.config.config import settings
 
-def organize_pdfs_from_json(json_data, base_key, pdf_source_folder, target_base_folder, summary):
+# Linux ioctl cloning a file into another one sharing its blocks (copy-on-write)
+FICLONE = 0x40049409
+
+# Ways of placing a PDF in its category folder tried for each ORGANIZE_LINK_MODE, in order
+LINK_METHODS = {
+    "hardlink": ["hardlink", "reflink", "copy"],
+    "symlink": ["symlink", "reflink", "copy"],
+    "reflink": ["reflink", "copy"],
+    "copy": ["copy"],
+}
+
+
+def reflink_file(source_file_path, target_file_path):
+    """Clone the file without copying its data, on file systems that support it (Btrfs, XFS)"""
+    import fcntl
+    try:
+        with open(source_file_path, 'rb') as source, open(target_file_path, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        os.remove(target_file_path)
+        raise
+    shutil.copystat(source_file_path, target_file_path)
+
+
+def place_file(method, source_file_path, target_file_path):
+    if method == "hardlink":
+        os.link(source_file_path, target_file_path)
+    elif method == "symlink":
+        os.symlink(os.path.relpath(source_file_path, os.path.dirname(target_file_path)), target_file_path)
+    elif method == "reflink":
+        reflink_file(source_file_path, target_file_path)
+    else:
+        # copy2 keeps the modification time, which tells later runs that the copy is up to date
+        shutil.copy2(source_file_path, target_file_path)
+
+
+def is_organized(source_entry, target_entry):
     """
-    Recursively process a JSON object to organize PDFs into categorized folders.
+    Whether the file of the category folder already is the source PDF: a hard link or a
+    symlink to it, or a copy with the same size and modification time.
+    """
+    try:
+        source_stat = source_entry.stat()
+        target_stat = target_entry.stat()  # Follows symlinks
+    except OSError: # Broken symlink
+        return False
+
+    if (target_stat.st_dev, target_stat.st_ino) == (source_stat.st_dev, source_stat.st_ino):
+        return True
+    return (
+        not target_entry.is_symlink()
+        and target_stat.st_size == source_stat.st_size
+        and target_stat.st_mtime_ns == source_stat.st_mtime_ns
+    )
+
+
+def scan_folder(folder_path):
+    """Return the entries of the folder by name, listed with a single os.scandir call"""
+    if not os.path.isdir(folder_path):
+        return {}
+    with os.scandir(folder_path) as entries:
+        return {entry.name: entry for entry in entries}
+
+
+def organize_pdfs_from_catalog(catalog, pdf_source_folder, target_base_folder, summary, link_mode=None):
+    """
+    Organize the PDFs of the document catalog into folders named after their category path,
+    linking a document listed under several categories into each of their folders.
+
+    The PDFs are hard linked or symlinked into the category folders according to
+    settings.ORGANIZE_LINK_MODE, falling back to a copy-on-write clone and then to a copy
+    when the file system does not support it. Files that are already organized are
+    skipped, and PDFs of documents no longer in the catalog are removed. Each folder is
+    listed once instead of checking every file.
 
     Args:
-        json_data (dict or list): JSON data to process.
-        base_key (str): The current base key for folder naming.
+        catalog (DocumentCatalog): Catalog of the documents to organize.
         pdf_source_folder (str): Folder containing all PDFs.
         target_base_folder (str): Base folder where categorized folders will be created.
-        summary (dict): Summary dictionary to record copied and missing files.
+        summary (dict): Summary dictionary to record linked, skipped and missing files.
+        link_mode (str): "hardlink", "symlink", "reflink" or "copy", settings.ORGANIZE_LINK_MODE by default.
     """
-    if isinstance(json_data, dict):
-        for key, value in json_data.items():
-            new_base_key = os.path.join(base_key, key)  # Update folder path
-            organize_pdfs_from_json(value, new_base_key, pdf_source_folder, target_base_folder, summary)
-    elif isinstance(json_data, list):
-        # Create the folder for this level
+    link_mode = link_mode or settings.ORGANIZE_LINK_MODE
+    if link_mode not in LINK_METHODS:
+        raise ValueError(f"Invalid link mode {link_mode}. Use one of {list(LINK_METHODS)}.")
+    methods = list(LINK_METHODS[link_mode])
+
+    source_files = scan_folder(pdf_source_folder)
+    folders = {}
+    # Every category path of the documents, so a document is placed in each of its categories
+    for category_path, doc in catalog:
+        folders.setdefault(os.path.join(*category_path), []).append(doc["filename"].strip())
+
+    for base_key, filenames in folders.items():
         category_folder = os.path.join(target_base_folder, base_key)
         os.makedirs(category_folder, exist_ok=True)
-
-        if base_key not in summary:
-            summary[base_key] = {"copied": [], "missing": []}
-
-        for doc in json_data:
-            filename = doc.get("filename")
-            if filename:
-                source_file_path = os.path.join(pdf_source_folder, filename)
-                target_file_path = os.path.join(category_folder, filename)
-
-                if os.path.exists(source_file_path):
-                    # Copy the file to the category folder
-                    shutil.copy(source_file_path, target_file_path)
-                    summary[base_key]["copied"].append(filename)
-                else:
-                    # File not found in the source folder
-                    summary[base_key]["missing"].append(filename)
+        target_files = scan_folder(category_folder)
+        summary[base_key] = {"linked": [], "skipped": [], "missing": []}
+
+        for filename in filenames:
+            source_entry = source_files.get(filename)
+            if source_entry is None:
+                # File not found in the source folder
+                summary[base_key]["missing"].append(filename)
+                continue
+
+            target_entry = target_files.get(filename)
+            if target_entry is not None:
+                if is_organized(source_entry, target_entry):
+                    summary[base_key]["skipped"].append(filename)
+                    continue
+                os.remove(target_entry.path) # Outdated copy or broken link
+
+            source_file_path = os.path.join(pdf_source_folder, filename)
+            target_file_path = os.path.join(category_folder, filename)
+            while True:
+                try:
+                    place_file(methods[0], source_file_path, target_file_path)
+                    break
+                except (OSError, ImportError) as e:
+                    if len(methods) == 1:
+                        raise
+                    # Not supported here (e.g. across devices), so not tried again for the next files
+                    print(f"Could not {methods[0]} {filename} ({e}), falling back to {methods[1]}")
+                    methods.pop(0)
+            summary[base_key]["linked"].append(filename)
+
+        # Remove the PDFs of documents removed from the catalog, under none of its categories anymore
+        for name, target_entry in target_files.items():
+            if name.endswith(".pdf") and name not in catalog and not target_entry.is_dir(follow_symlinks=False):
+                os.remove(target_entry.path)
 
 
 def organize_pdfs(json_file, pdf_source_folder, target_base_folder):
@@ -51,26 +146,28 @@ def organize_pdfs(json_file, pdf_source_folder, target_base_folder):
         target_base_folder (str): Path to the folder where categorized folders will be created.
 
     Returns:
-        dict: Summary of copied and missing files.
+        dict: Summary of linked, skipped and missing files.
     """
     # Load the JSON data
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    catalog = DocumentCatalog.load(json_file, settings.DOCUMENT_CATALOG_PATH)
 
     # Initialize summary dictionary
     summary = {}
 
-    # Process the JSON recursively
-    organize_pdfs_from_json(data, "", pdf_source_folder, target_base_folder, summary)
+    # Process the documents of the catalog
+    organize_pdfs_from_catalog(catalog, pdf_source_folder, target_base_folder, summary)
 
     # Print summary
-    total_files = sum(len(v["copied"]) + len(v["missing"]) for v in summary.values())
-    copied_files = sum(len(v["copied"]) for v in summary.values())
+    total_files = sum(len(v["linked"]) + len(v["skipped"]) + len(v["missing"]) for v in summary.values())
+    linked_files = sum(len(v["linked"]) for v in summary.values())
+    skipped_files = sum(len(v["skipped"]) for v in summary.values())
     missing_files = sum(len(v["missing"]) for v in summary.values())
 
     print(f"Total files referenced in JSON: {total_files}")
-    print(f"Files copied: {copied_files}")
+    print(f"Files organized ({settings.ORGANIZE_LINK_MODE}): {linked_files}")
+    print(f"Files already organized: {skipped_files}")
     print(f"Files missing: {missing_files}")
+    return summary
 
 
 def main():
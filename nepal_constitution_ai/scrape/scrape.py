@@ -5,7 +5,12 @@ from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 import time
 import json
-from nepal_constitution_ai.scrape.utils import clean_filename
+import re
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from nepal_constitution_ai.scrape.utils import clean_filename, create_http_session, RateLimiter
+from nepal_constitution_ai.scrape.delta import load_previous_catalog, record_scrape_delta
+from nepal_constitution_ai.utils.catalog import DocumentCatalog
 from nepal_constitution_ai.config.config import settings
 
 # Base URL
@@ -21,6 +26,8 @@ URLS = [
     {"others": "/others/"},
 ]
 
+ERROR_404_TITLE = re.compile(r"<title>[^<]*Error 404", re.IGNORECASE)
+
 def init_driver():
     """Initialize Selenium WebDriver in headless mode."""
     options = webdriver.ChromeOptions()
@@ -107,8 +114,6 @@ def parse_pdfs_with_pagination(base_url, driver):
 
 def process_url_category(driver, url, category_name):
     """Process a specific URL category."""
-    results = []
-
     fetch_page_source(driver, START_URL)
     switch_language(driver, 'ne')  # Nepali titles
     pdfs_ne = parse_pdfs_with_pagination(url, driver)
@@ -117,6 +122,11 @@ def process_url_category(driver, url, category_name):
     switch_language(driver, 'en')  # English titles
     pdfs_en = parse_pdfs_with_pagination(url, driver)
 
+    return {category_name: pair_titles(pdfs_ne, pdfs_en)}
+
+def pair_titles(pdfs_ne, pdfs_en):
+    """Pair the Nepali and English titles and links of the documents of a category."""
+    results = []
     for i in range(max(len(pdfs_ne), len(pdfs_en))):
         nepali = pdfs_ne[i] if i < len(pdfs_ne) else ("Unknown Title (Nepali)", "")
         english = pdfs_en[i] if i < len(pdfs_en) else ("Unknown Title (English)", "")
@@ -127,7 +137,7 @@ def process_url_category(driver, url, category_name):
             "eng_pdf_link": english[1],
             "filename": clean_filename(nepali[0]),
         })
-    return {category_name: results}
+    return results
 
 def save_to_json(data, filename="documents_info.json"):
     """Save data to JSON."""
@@ -138,7 +148,112 @@ def save_to_json(data, filename="documents_info.json"):
 
 
 
-def main():
+def fetch_html(session, url, rate_limiter, params=None):
+    """Fetch a page over HTTP and return its HTML, or None when it does not exist."""
+    rate_limiter.wait()
+    response = session.get(url, params=params, timeout=settings.SCRAPE_TIMEOUT)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    if ERROR_404_TITLE.search(response.text): # Error page served with a success status
+        return None
+    return response.text
+
+def create_language_session(language, session_factory=None):
+    """
+    Create an HTTP session browsing the website in the given language. The language is
+    kept in a cookie: set directly when settings.SCRAPE_LANGUAGE_COOKIE names it,
+    otherwise obtained by submitting the language form, like switch_language does.
+    """
+    if language not in ['en', 'ne']:
+        raise ValueError("Invalid language code. Use 'en' for English or 'ne' for Nepali.")
+    session = session_factory() if session_factory else create_http_session(
+        settings.SCRAPE_WORKERS, settings.SCRAPE_MAX_RETRIES, settings.SCRAPE_RETRY_BACKOFF
+    )
+
+    if settings.SCRAPE_LANGUAGE_COOKIE:
+        session.cookies.set(settings.SCRAPE_LANGUAGE_COOKIE, language)
+        return session
+
+    response = session.get(START_URL, timeout=settings.SCRAPE_TIMEOUT)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'html.parser')
+    select = soup.find(id="language-select")
+    form = select.find_parent("form") if select else None
+    if form is None:
+        raise RuntimeError("Language form not found on the start page")
+
+    # Submit the form with its other fields, such as the CSRF token, unchanged
+    data = {field.get("name"): field.get("value", "") for field in form.find_all("input") if field.get("name")}
+    data[select.get("name", "language")] = language
+    action = form.get("action") or START_URL
+    action = BASE_URL + action if action.startswith("/") else action
+    if form.get("method", "get").lower() == "post":
+        response = session.post(action, data=data, headers={"Referer": START_URL}, timeout=settings.SCRAPE_TIMEOUT)
+    else:
+        response = session.get(action, params=data, timeout=settings.SCRAPE_TIMEOUT)
+    response.raise_for_status()
+    print(f"Switched to {'English' if language == 'en' else 'Nepali'}...")
+    return session
+
+def parse_pdfs_with_pagination_http(base_url, session, rate_limiter):
+    """Parse PDFs across paginated pages over HTTP."""
+    documents = []
+    page = 1
+    while True:
+        print(f"Fetching: {base_url}?page={page}")
+        page_content = fetch_html(session, base_url, rate_limiter, params={"page": page})
+        if page_content is None:
+            break
+        page_documents = parse_pdfs(page_content)
+        if not page_documents:
+            break
+        documents.extend(page_documents)
+        page += 1
+    return documents
+
+def process_url_category_http(sessions, rate_limiter, url, category_name):
+    """Process a specific URL category over HTTP, with one session per language."""
+    pdfs_ne = parse_pdfs_with_pagination_http(url, sessions['ne'], rate_limiter)  # Nepali titles
+    pdfs_en = parse_pdfs_with_pagination_http(url, sessions['en'], rate_limiter)  # English titles
+    return {category_name: pair_titles(pdfs_ne, pdfs_en)}
+
+def scrape_with_http(session_factory=None):
+    """
+    Scrape the documents info over pooled HTTP sessions, one per language, fetching
+    the volumes and categories concurrently on settings.SCRAPE_WORKERS threads with
+    at most settings.SCRAPE_REQUESTS_PER_SECOND requests per second.
+    """
+    rate_limiter = RateLimiter(settings.SCRAPE_REQUESTS_PER_SECOND)
+    sessions = {language: create_language_session(language, session_factory) for language in ['ne', 'en']}
+    results = {"act_in_volume": {}}
+
+    main_page_content = fetch_html(sessions['en'], START_URL, rate_limiter)
+    volumes = parse_volumes(main_page_content or "")
+    if not volumes:
+        raise RuntimeError("No volumes found on the start page")
+    print("Extracted the volume names")
+
+    categories = [(name, BASE_URL + "/category" + path) for category in URLS for name, path in category.items()]
+    with ThreadPoolExecutor(max_workers=settings.SCRAPE_WORKERS, thread_name_prefix="scrape") as pool:
+        volume_futures = {
+            volume_name: pool.submit(process_url_category_http, sessions, rate_limiter, volume_url, volume_name)
+            for volume_name, volume_url in volumes.items()
+        }
+        category_futures = [
+            pool.submit(process_url_category_http, sessions, rate_limiter, url, name) for name, url in categories
+        ]
+
+        # Results are collected in the order of the volumes and categories
+        for volume_name, future in volume_futures.items():
+            results["act_in_volume"][volume_name] = future.result()
+        for future in category_futures:
+            results.update(future.result())
+
+    return results
+
+def scrape_with_selenium():
+    """Scrape the documents info by rendering every page in a headless browser."""
     driver = init_driver()
     try:
         results = {"act_in_volume": {}}
@@ -162,6 +277,33 @@ def main():
                 url = BASE_URL + "/category" + path
                 results.update(process_url_category(driver, url, name))
 
-        save_to_json(results)
+        return results
     finally:
         driver.quit()
+
+def scrape_documents():
+    """
+    Scrape the documents info in the settings.SCRAPE_MODE. The HTTP scraper falls back
+    to Selenium on network errors only, so that parsing errors are raised.
+    """
+    if settings.SCRAPE_MODE == "http":
+        try:
+            return scrape_with_http()
+        except requests.RequestException as e:
+            print(f"HTTP scraping failed ({e}), falling back to Selenium...")
+    return scrape_with_selenium()
+
+def main():
+    results = scrape_documents()
+
+    catalog = DocumentCatalog(results)
+    print(f"Catalogued {len(catalog)} documents in {len(catalog.categories())} categories")
+    if not len(catalog):
+        raise RuntimeError("No documents scraped, keeping the previous documents_info.json")
+
+    # Hand only the documents that changed since the previous scrape over to the download
+    previous = load_previous_catalog(f"{settings.DATA_PATH}/documents_info.json")
+    record_scrape_delta(previous, catalog)
+    save_to_json(catalog.data)
+    if settings.DOCUMENT_CATALOG_PATH:
+        catalog.save_compact(settings.DOCUMENT_CATALOG_PATH)
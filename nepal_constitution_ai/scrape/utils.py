@@ -1,4 +1,9 @@
 import re
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 def clean_filename(title):
     """Clean the title to make it a valid filename"""
@@ -9,3 +14,39 @@ def clean_filename(title):
     # Limit filename length
     cleaned = cleaned[:100]
     return cleaned + '.pdf'
+
+
+def create_http_session(pool_size, max_retries, backoff_factor):
+    """
+    Create a requests session with a connection pool of pool_size, retrying failed
+    connections, rate limits and server errors with exponential backoff.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["HEAD", "GET", "POST"],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class RateLimiter:
+    """
+    Spaces out the requests of all threads to at most requests_per_second.
+    """
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
@@ -1,15 +1,15 @@
 from uuid import UUID
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import nepal_constitution_ai.user.services as user_services
 
 from . import schemas
 
-def create_user(user: schemas.UserCreate, db: Session):
-    new_user = user_services.user_create(user=user, db=db)
+async def create_user(user: schemas.UserCreate, db: AsyncSession):
+    new_user = await user_services.user_create(user_id=user.user_id, db=db)
     return new_user
 
-async def get_all_users(db: Session):
+async def get_all_users(db: AsyncSession):
     users = await user_services.get_all_users(db=db)
-    return users
\ No newline at end of file
+    return users
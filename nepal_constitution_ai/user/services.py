@@ -1,29 +1,31 @@
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from nepal_constitution_ai.user import schemas
 from nepal_constitution_ai.user.model import User
 
-async def get_user(user_id: UUID, db: Session):
-    user = db.query(User).filter(User.user_id == user_id).first()
+async def get_user(user_id: UUID, db: AsyncSession):
+    user = await db.get(User, user_id)
     return user
 
-async def get_all_users(db: Session):
-    users = db.query(User).all()
+async def get_all_users(db: AsyncSession):
+    result = await db.execute(select(User))
+    users = result.scalars().all()
     return users
 
-async def authenticate_user(db: Session, user_id: UUID):
-    user = db.query(User).filter(User.user_id == user_id).first()
+async def authenticate_user(db: AsyncSession, user_id: UUID):
+    user = await db.get(User, user_id)
     if user:
         return user
     new_user = await user_create(user_id=user_id, db=db)
     return new_user
 
-async def user_create(user_id: UUID, db: Session):
+async def user_create(user_id: UUID, db: AsyncSession):
     user = User(user_id=user_id)
 
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
-    return user
\ No newline at end of file
+    return user
@@ -0,0 +1,224 @@
+import os
+import json
+from typing import Iterator, Optional
+from loguru import logger
+
+# Version of the compact catalog file, bumped when its layout changes
+COMPACT_FORMAT_VERSION = 1
+# Fields compared to tell whether a document changed between two scrapes
+DIFF_FIELDS = ("nep_title", "eng_title", "nep_pdf_link", "eng_pdf_link")
+
+
+def iter_tree_entries(data, path: tuple = ()) -> Iterator[tuple[tuple, dict]]:
+    """
+    Yields the (category_path, entry) of every document entry of the nested
+    documents_info.json tree, in file order. The category path is the tuple of keys
+    leading to the list that holds the entry.
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from iter_tree_entries(value, path + (key,))
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                yield path, item
+
+
+class DocumentCatalog:
+    """
+    Index of the scraped documents of documents_info.json, built once with O(1)
+    lookups by filename, title and category.
+
+    The category of a document is the key of the list that holds it: the volume name
+    for the acts in volumes, the category name otherwise. A document can be listed
+    under several categories (e.g. a recent act that is also in a volume), so the
+    catalog keeps every (category_path, entry) of a filename; the first one gives the
+    namespace of the document's vectors. The catalog keeps the nested tree, so the
+    documents_info.json layout is unchanged when it is saved back.
+    """
+    def __init__(self, data: Optional[dict] = None) -> None:
+        self.data = data if data is not None else {}
+        self._by_filename: dict[str, list[tuple[tuple, dict]]] = {}
+        self._by_title: dict[str, dict] = {}
+        self._by_category: dict[str, list[dict]] = {}
+
+        for path, entry in iter_tree_entries(self.data):
+            self._index(path, entry)
+
+    def _index(self, path: tuple, entry: dict) -> None:
+        filename = (entry.get("filename") or "").strip()
+        if not filename:
+            return
+        placements = self._by_filename.setdefault(filename, [])
+        if any(placed_path == path for placed_path, _ in placements):
+            logger.debug(f"Duplicate catalog entry for {filename} in {'/'.join(path)}, keeping the first one")
+            return
+
+        placements.append((path, entry))
+        for title_key in ("nep_title", "eng_title"):
+            title = (entry.get(title_key) or "").strip()
+            if title:
+                self._by_title.setdefault(title, entry)
+        if path:
+            self._by_category.setdefault(path[-1], []).append(entry)
+
+    @classmethod
+    def from_json(cls, json_path: str) -> "DocumentCatalog":
+        """
+        Loads the catalog from a documents_info.json file or from its compact form.
+        """
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if isinstance(data, dict) and data.get("format") == COMPACT_FORMAT_VERSION:
+            return cls.from_compact(data)
+        return cls(data)
+
+    @classmethod
+    def load(cls, json_path: str, compact_path: str = "") -> "DocumentCatalog":
+        """
+        Loads the catalog of json_path. With a compact_path, the compact form is used
+        when it is newer than json_path, and written otherwise.
+        """
+        if compact_path and os.path.exists(compact_path) and (
+            not os.path.exists(json_path) or os.path.getmtime(compact_path) >= os.path.getmtime(json_path)
+        ):
+            return cls.from_json(compact_path)
+
+        catalog = cls.from_json(json_path)
+        if compact_path:
+            catalog.save_compact(compact_path)
+        return catalog
+
+    @classmethod
+    def from_compact(cls, compact: dict) -> "DocumentCatalog":
+        data = {}
+        for document in compact["documents"]:
+            *parents, category = document["path"]
+            node = data
+            for key in parents:
+                node = node.setdefault(key, {})
+            node.setdefault(category, []).append(document["entry"])
+        return cls(data)
+
+    def to_compact(self) -> dict:
+        """
+        Flat form of the catalog: one record per document with its category path.
+        """
+        return {
+            "format": COMPACT_FORMAT_VERSION,
+            "documents": [{"path": list(path), "entry": entry} for path, entry in iter_tree_entries(self.data)],
+        }
+
+    def save(self, json_path: str) -> None:
+        """
+        Saves the nested tree in the documents_info.json layout.
+        """
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=4)
+
+    def save_compact(self, compact_path: str) -> None:
+        with open(compact_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_compact(), f, ensure_ascii=False)
+
+    def __len__(self) -> int:
+        return len(self._by_filename)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename.strip() in self._by_filename
+
+    def __iter__(self) -> Iterator[tuple[tuple, dict]]:
+        """
+        Iterates over the (category_path, entry) of the documents with a filename, once
+        for each category a document is listed under.
+        """
+        for placements in self._by_filename.values():
+            yield from placements
+
+    def filenames(self) -> list[str]:
+        """
+        Returns the filenames of the documents, each once.
+        """
+        return list(self._by_filename)
+
+    def get(self, filename: str) -> Optional[dict]:
+        """
+        Returns the entry of the document, the first one when it is listed under several categories.
+        """
+        placements = self._by_filename.get(filename.strip())
+        return placements[0][1] if placements else None
+
+    def category(self, filename: str) -> Optional[str]:
+        """
+        Returns the category of the document, the first one when it is listed under
+        several categories, or None for an unknown filename.
+        """
+        path = self.category_path(filename)
+        return path[-1] if path else None
+
+    def category_path(self, filename: str) -> Optional[tuple]:
+        placements = self._by_filename.get(filename.strip())
+        return placements[0][0] if placements else None
+
+    def category_paths(self, filename: str) -> list[tuple]:
+        """
+        Returns the paths of every category the document is listed under.
+        """
+        return [path for path, _ in self._by_filename.get(filename.strip(), [])]
+
+    def get_by_title(self, title: str) -> Optional[dict]:
+        """
+        Returns the document with the given Nepali or English title.
+        """
+        return self._by_title.get(title.strip())
+
+    def get_by_category(self, category: str) -> list[dict]:
+        return self._by_category.get(category, [])
+
+    def categories(self) -> list[str]:
+        return list(self._by_category)
+
+    def diff(self, previous: "DocumentCatalog") -> dict[str, list[str]]:
+        """
+        Compares the catalog with a previous one.
+
+        Returns:
+            dict: The filenames of the "added" and "changed" documents, whose titles,
+            links or category differ, and of the "removed" documents of the previous catalog.
+        """
+        added, changed = [], []
+        for filename in self._by_filename:
+            entry, previous_entry = self.get(filename), previous.get(filename)
+            if previous_entry is None:
+                added.append(filename)
+            elif (
+                any(previous_entry.get(field) != entry.get(field) for field in DIFF_FIELDS)
+                or set(previous.category_paths(filename)) != set(self.category_paths(filename))
+            ):
+                changed.append(filename)
+
+        removed = [filename for filename in previous.filenames() if filename not in self._by_filename]
+        return {"added": added, "changed": changed, "removed": removed}
+
+    def remove(self, filename: str) -> Optional[dict]:
+        """
+        Removes the document from the catalog and from the nested tree, under every
+        category it is listed under.
+        """
+        placements = self._by_filename.pop(filename.strip(), None)
+        if placements is None:
+            return None
+
+        for path, entry in placements:
+            node = self.data
+            for key in path:
+                node = node[key]
+            node[:] = [item for item in node if item is not entry]
+
+            for title_key in ("nep_title", "eng_title"):
+                title = (entry.get(title_key) or "").strip()
+                if self._by_title.get(title) is entry:
+                    del self._by_title[title]
+            if path:
+                self._by_category[path[-1]] = [item for item in self._by_category[path[-1]] if item is not entry]
+        return placements[0][1]
@@ -0,0 +1,35 @@
+import threading
+from collections import defaultdict
+
+
+class Counters:
+    """
+    Thread-safe named counters used to report cache hits, misses and builds.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: dict[str, int] = defaultdict(int)
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    """
+    Returns the ratio of hits to lookups, or 0.0 when there were no lookups.
+    """
+    total = hits + misses
+    return hits / total if total else 0.0
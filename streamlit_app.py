@@ -1,23 +1,54 @@
 import streamlit as st
 from uuid import uuid4
 import asyncio
+import threading
 import random
 import ast
 from datetime import datetime
-from nepal_constitution_ai.config.db_session import get_session
+from nepal_constitution_ai.config.db import create_async_db_session
 from nepal_constitution_ai.utils.utils import is_valid_uuid
-from nepal_constitution_ai.chat.controller import create_chat_session, user_input, get_chat_session
+from nepal_constitution_ai.chat.controller import create_chat_session, stream_user_input, get_chat_session, format_response
 from nepal_constitution_ai.chat.services import get_chat_history_service
 from nepal_constitution_ai.user.services import user_create
 from nepal_constitution_ai.chat.model import ChatMessageModel
 from streamlit_local_storage import LocalStorage
 
-async def create_new_chat_session(db, localS):
+@st.cache_resource
+def get_event_loop():
+    """
+    Event loop shared by every session of the app and run in a background thread.
+    The async database engine and LLM clients keep connections bound to the loop
+    that opened them, so all coroutines run on this single long-lived loop.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+def iterate_async(async_iterator):
+    """ Iterates an async iterator from the script thread, one item at a time. """
+    async def next_item():
+        return await async_iterator.__anext__()
+
+    while True:
+        try:
+            yield run_async(next_item())
+        except StopAsyncIteration:
+            return
+
+async def create_user_chat_session(db):
     new_user_id = uuid4()
     await user_create(user_id=new_user_id, db=db)
     new_chat_session = await create_chat_session(
     db=db, created_by=new_user_id
     )
+
+    return new_chat_session
+
+def create_new_chat_session(db, localS):
+    new_chat_session = run_async(create_user_chat_session(db=db))
     chat_session_id = new_chat_session.chat_session_id
     user_id = new_chat_session.created_by
     localS.setItem("chat_session", {"id": str(chat_session_id), "user_id":str(user_id)})
@@ -30,36 +61,37 @@ def load_chat_session(db):
     try:
         chat_session_ids = localS.getItem("chat_session")
         if chat_session_ids is None:
-            return asyncio.run(create_new_chat_session(db=db, localS=localS))
+            return create_new_chat_session(db=db, localS=localS)
 
         chat_session_id = chat_session_ids.get("id")
         user_id = chat_session_ids.get("user_id")
 
         if not is_valid_uuid(chat_session_id) or not is_valid_uuid(user_id):
-            return asyncio.run(create_new_chat_session(db=db, localS=localS))
+            return create_new_chat_session(db=db, localS=localS)
         
-        chat_session = asyncio.run(get_chat_session(user_id=user_id, db=db))
+        chat_session = run_async(get_chat_session(user_id=user_id, db=db))
         
         if len(chat_session) == 0:
-            return asyncio.run(create_new_chat_session(db=db, localS=localS))
+            return create_new_chat_session(db=db, localS=localS)
         
         return chat_session_id
     
     except:
         localS.deleteAll()
-        return asyncio.run(create_new_chat_session(db=db, localS=localS))
+        return create_new_chat_session(db=db, localS=localS)
 
 
 
 def load_chat_history(chat_session_id, db):
 
-    chat_history = get_chat_history_service(session_id=chat_session_id, db=db, fetch_all=True)
+    chat_history = run_async(get_chat_history_service(session_id=chat_session_id, db=db, fetch_all=True))
 
     return chat_history
 
 processing_messages = ["Thinking", "Cooking", "Going brrr", "Spinning the wheel", "Beep boop boop"]
 
-with get_session() as db:
+db = create_async_db_session()
+try:
     chat_session_id = load_chat_session(db=db)
     chat_history = load_chat_history(chat_session_id=chat_session_id, db=db)
     # Show title and description.
@@ -115,14 +147,23 @@ with get_session() as db:
         st.session_state.messages.append(new_message)
         with st.chat_message("user"):
             st.markdown(prompt)
-        # Generate a response using the OpenAI API.
+        # Generate a response using the OpenAI API and stream the answer tokens
+        # into the chat as they arrive.
         random_processing_message = processing_messages[random.randint(0, len(processing_messages)-1)]
-        with st.spinner(f'{random_processing_message}...'):
-            output = user_input(db=db, user="", query=prompt, chat_session_id=chat_session_id)
-        # Stream the response to the chat using `st.write_stream`, then store it in 
-        # session state.
         with st.chat_message("assistant"):
-            response = st.markdown(output, unsafe_allow_html=True)
+            placeholder = st.empty()
+            placeholder.markdown(f'{random_processing_message}...')
+            answer = ""
+            response = {}
+            for event in iterate_async(stream_user_input(db=db, user="", query=prompt, chat_session_id=chat_session_id)):
+                if event["event"] == "token":
+                    answer += event["data"]
+                    placeholder.markdown(answer, unsafe_allow_html=True)
+                elif event["event"] == "done":
+                    response = event["data"]
+            output = format_response(response)
+            placeholder.markdown(output, unsafe_allow_html=True)
         new_message = ChatMessageModel(content=output, chat_session_id=chat_session_id, message_by="llm", message_time=datetime.now())
         st.session_state.messages.append(new_message)
-    
+finally:
+    run_async(db.close())
@@ -0,0 +1,94 @@
+import numpy as np
+
+from nepal_constitution_ai.retriever.ann_index import IVFIndex
+
+
+def make_embeddings(n_rows=2000, dimension=32, n_clusters=40, seed=0):
+    """Row-normalized vectors around random cluster centers, like chunk embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dimension))
+    embeddings = centers[rng.integers(n_clusters, size=n_rows)] + rng.normal(scale=0.3, size=(n_rows, dimension))
+    embeddings = embeddings.astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def exact_top_k(embeddings, query, k):
+    scores = embeddings @ (query / np.linalg.norm(query))
+    return set(np.argsort(-scores)[:k].tolist())
+
+
+def recall_at_k(ivf, embeddings, queries, k, n_probe):
+    recalls = []
+    for query in queries:
+        found = {row for row, _ in ivf.search(embeddings, query, k, n_probe=n_probe)}
+        recalls.append(len(found & exact_top_k(embeddings, query, k)) / k)
+    return float(np.mean(recalls))
+
+
+def test_recall_against_exact_search():
+    embeddings = make_embeddings()
+    rng = np.random.default_rng(1)
+    queries = embeddings[rng.choice(len(embeddings), 50, replace=False)] + rng.normal(scale=0.05, size=(50, 32))
+
+    ivf = IVFIndex.build(embeddings, n_lists=40, n_probe=8)
+
+    assert recall_at_k(ivf, embeddings, queries, k=10, n_probe=8) >= 0.9
+    # Scanning every list is an exact search
+    assert recall_at_k(ivf, embeddings, queries, k=10, n_probe=ivf.n_lists) == 1.0
+
+
+def test_search_scores_are_sorted_cosine_similarities():
+    embeddings = make_embeddings(n_rows=500)
+    ivf = IVFIndex.build(embeddings, n_lists=10, n_probe=10)
+
+    results = ivf.search(embeddings, embeddings[7] * 3, k=5)
+
+    assert results[0][0] == 7
+    assert np.isclose(results[0][1], 1.0, atol=1e-5)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_search_restricted_to_allowed_rows():
+    embeddings = make_embeddings(n_rows=500)
+    ivf = IVFIndex.build(embeddings, n_lists=10, n_probe=10)
+    allowed_rows = np.arange(0, 500, 2)
+
+    results = ivf.search(embeddings, embeddings[7], k=5, allowed_rows=allowed_rows)
+
+    assert results and all(row % 2 == 0 for row, _ in results)
+
+
+def test_save_load_round_trip(tmp_path):
+    embeddings = make_embeddings(n_rows=500)
+    ivf = IVFIndex.build(embeddings, n_lists=10, n_probe=3)
+    ivf.save(str(tmp_path))
+
+    loaded = IVFIndex.load(str(tmp_path), n_probe=3)
+
+    np.testing.assert_array_equal(loaded.centroids, ivf.centroids)
+    np.testing.assert_array_equal(loaded.list_offsets, ivf.list_offsets)
+    np.testing.assert_array_equal(loaded.list_rows, ivf.list_rows)
+    query = embeddings[42]
+    assert loaded.search(embeddings, query, k=10) == ivf.search(embeddings, query, k=10)
+
+
+def test_load_without_saved_index(tmp_path):
+    assert IVFIndex.load(str(tmp_path)) is None
+
+
+def test_empty_matrix():
+    embeddings = np.empty((0, 32), dtype=np.float32)
+
+    ivf = IVFIndex.build(embeddings)
+
+    assert ivf.n_lists == 0
+    assert ivf.search(embeddings, np.ones(32), k=5) == []
+
+
+def test_more_lists_than_rows():
+    embeddings = make_embeddings(n_rows=5)
+
+    ivf = IVFIndex.build(embeddings, n_lists=50)
+
+    assert ivf.n_lists == 5
+    assert sorted(ivf.list_rows.tolist()) == list(range(5))
@@ -0,0 +1,200 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.scrape.download_pdfs import DownloadState, create_session, download_file
+
+CONTENT = bytes(range(256)) * 40
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class FileServer(ThreadingHTTPServer):
+    """
+    Serves one file at /law.pdf with the ETag, Last-Modified and Range / If-Range
+    handling of a static file server, and records the headers of each request.
+    """
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.content = CONTENT
+        self.etag = '"v1"'
+        self.last_modified = LAST_MODIFIED
+        self.truncate = False # Close the connection halfway through the body
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/law.pdf"
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send_file_headers(self, status, length):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if self.server.etag:
+            self.send_header("ETag", self.server.etag)
+        if self.server.last_modified:
+            self.send_header("Last-Modified", self.server.last_modified)
+
+    def do_HEAD(self):
+        self.server.requests.append(("HEAD", dict(self.headers)))
+        self.send_file_headers(200, len(self.server.content))
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append(("GET", dict(self.headers)))
+        content = self.server.content
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and if_range in (None, self.server.etag, self.server.last_modified):
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_file_headers(206, len(content) - start)
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+            body = content[start:]
+        else:
+            self.send_file_headers(200, len(content))
+            body = content
+        self.end_headers()
+
+        if self.server.truncate:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_requests(server):
+    return [headers for method, headers in server.requests if method == "GET"]
+
+
+def test_download_replaces_part_with_complete_file(server, tmp_path):
+    state = DownloadState()
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+    assert not (tmp_path / "law.pdf.part").exists()
+    assert state.get("law.pdf.part") is None
+    assert state.get("law.pdf")["etag"] == '"v1"'
+    assert state.get("law.pdf")["size"] == len(CONTENT)
+
+
+def test_resume_with_range_and_etag(server, tmp_path):
+    (tmp_path / "law.pdf.part").write_bytes(CONTENT[:1000])
+    state = DownloadState()
+    state.set("law.pdf.part", server.url, '"v1"', None, LAST_MODIFIED)
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    request = get_requests(server)[-1]
+    assert request["Range"] == "bytes=1000-"
+    assert request["If-Range"] == '"v1"'
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+
+
+def test_resume_with_last_modified_without_etag(server, tmp_path):
+    server.etag = None
+    (tmp_path / "law.pdf.part").write_bytes(CONTENT[:1000])
+    state = DownloadState()
+    state.set("law.pdf.part", server.url, None, None, LAST_MODIFIED)
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    assert get_requests(server)[-1]["If-Range"] == LAST_MODIFIED
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+
+
+def test_part_without_validator_restarts_from_zero(server, tmp_path):
+    (tmp_path / "law.pdf.part").write_bytes(b"x" * 1000)
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), DownloadState())
+
+    assert "Range" not in get_requests(server)[-1]
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+
+
+def test_changed_file_is_downloaded_again_instead_of_resumed(server, tmp_path):
+    (tmp_path / "law.pdf.part").write_bytes(b"x" * 1000)
+    state = DownloadState()
+    state.set("law.pdf.part", server.url, '"v0"', None)
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    # The If-Range ETag does not match, so the server sends the whole file
+    assert get_requests(server)[-1]["If-Range"] == '"v0"'
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+
+
+def test_416_discards_part_and_downloads_again(server, tmp_path):
+    (tmp_path / "law.pdf.part").write_bytes(CONTENT + b"extra")
+    state = DownloadState()
+    state.set("law.pdf.part", server.url, '"v1"', None)
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    requests = get_requests(server)
+    assert requests[0]["Range"] == f"bytes={len(CONTENT) + 5}-"
+    assert "Range" not in requests[1]
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+    assert not (tmp_path / "law.pdf.part").exists()
+
+
+def test_incomplete_download_keeps_part(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_CHUNK_SIZE", 1024)
+    server.truncate = True
+    state = DownloadState()
+
+    assert not download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    assert not (tmp_path / "law.pdf").exists()
+    assert 0 < os.path.getsize(tmp_path / "law.pdf.part") < len(CONTENT)
+    assert state.get("law.pdf.part")["etag"] == '"v1"'
+
+    # The next run resumes the part
+    server.truncate = False
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+    assert "Range" in get_requests(server)[-1]
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+
+
+def test_same_etag_skips_download(server, tmp_path):
+    (tmp_path / "law.pdf").write_bytes(CONTENT)
+    state = DownloadState()
+    state.set("law.pdf", server.url, '"v1"', len(CONTENT))
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    assert get_requests(server) == []
+
+
+def test_different_etag_downloads_again(server, tmp_path):
+    (tmp_path / "law.pdf").write_bytes(b"old" * (len(CONTENT) // 3))
+    state = DownloadState()
+    state.set("law.pdf", server.url, '"v0"', len(CONTENT) // 3 * 3)
+
+    assert download_file(server.url, str(tmp_path), "law.pdf", create_session(1), state)
+
+    assert len(get_requests(server)) == 1
+    assert (tmp_path / "law.pdf").read_bytes() == CONTENT
+    assert state.get("law.pdf")["etag"] == '"v1"'
@@ -0,0 +1,141 @@
+import os
+
+import pytest
+import requests
+
+from nepal_constitution_ai.config.config import settings
+from nepal_constitution_ai.scrape import scrape
+from nepal_constitution_ai.scrape.scrape import BASE_URL, START_URL, scrape_documents, scrape_with_http
+from nepal_constitution_ai.scrape.utils import clean_filename
+from nepal_constitution_ai.utils.catalog import DocumentCatalog
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "scrape")
+
+# Fixture served for each (url, page), "{language}" is replaced by the session language.
+# The other pages are not found.
+PAGES = {
+    (START_URL, None): "start_page.html",
+    (f"{BASE_URL}/category/1001/", 1): "volume_{language}.html",
+    (f"{BASE_URL}/category/2163/", 1): "category_{language}_page1.html",
+    (f"{BASE_URL}/category/2163/", 2): "category_{language}_page2.html",
+    (f"{BASE_URL}/category/2163/", 3): "error_404.html", # Error page served with a 200 status
+}
+
+
+def make_response(url, status_code, text=""):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.encoding = "utf-8"
+    response._content = text.encode("utf-8")
+    return response
+
+
+class FakeSession:
+    """
+    Stands in for the requests session of a language, serving the fixture pages.
+    The language is taken from the language cookie or from the submitted language form.
+    """
+    def __init__(self, pages=PAGES):
+        self.pages = pages
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.language = None
+        self.posts = []
+
+    def get(self, url, params=None, timeout=None):
+        language = self.cookies.get(settings.SCRAPE_LANGUAGE_COOKIE) or self.language or "en"
+        fixture = self.pages.get((url, (params or {}).get("page")))
+        if fixture is None:
+            return make_response(url, 404)
+        with open(os.path.join(FIXTURES_PATH, fixture.format(language=language)), encoding="utf-8") as f:
+            return make_response(url, 200, f.read())
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.posts.append((url, data))
+        self.language = data["language"]
+        return make_response(url, 200)
+
+
+@pytest.fixture(autouse=True)
+def scrape_settings(monkeypatch):
+    monkeypatch.setattr(settings, "SCRAPE_REQUESTS_PER_SECOND", 0)
+    monkeypatch.setattr(settings, "SCRAPE_LANGUAGE_COOKIE", "")
+
+
+def test_scrape_with_http_builds_catalog():
+    sessions = []
+    def session_factory():
+        sessions.append(FakeSession())
+        return sessions[-1]
+
+    catalog = DocumentCatalog(scrape_with_http(session_factory))
+
+    # The language form is submitted with its CSRF token
+    assert [session.posts for session in sessions] == [
+        [(f"{BASE_URL}/language/switch/", {"csrfmiddlewaretoken": "token123", "next": "/pages/list-volume-act/", "language": language})]
+        for language in ["ne", "en"]
+    ]
+
+    assert len(catalog) == 4
+    assert list(catalog.data["act_in_volume"]) == ["Volume 1", "Volume 2"]
+    assert catalog.data["act_in_volume"]["Volume 2"] == {"Volume 2": []}
+    assert [entry["eng_title"] for entry in catalog.get_by_category("Volume 1")] == [
+        "The National Civil Code, 2017", "The National Penal Code, 2017",
+    ]
+    # Both pages of the category are read, without the row that has no PDF
+    assert [entry["eng_title"] for entry in catalog.get_by_category("recent_acts")] == [
+        "The National Civil Code, 2017", "The Right to Information Act, 2007", "The Consumer Protection Act, 2018",
+    ]
+    for category in ["constitution", "act_not_in_volume", "rules_and_regulations", "others"]:
+        assert catalog.data[category] == []
+
+    entry = catalog.get_by_title("सूचनाको हक सम्बन्धी ऐन, २०६४")
+    assert entry == {
+        "nep_title": "सूचनाको हक सम्बन्धी ऐन, २०६४",
+        "eng_title": "The Right to Information Act, 2007",
+        "nep_pdf_link": f"{BASE_URL}/content/13313/suchana-ko-hak-2064.pdf",
+        "eng_pdf_link": f"{BASE_URL}/content/13313/right-to-information-act-2007.pdf",
+        "filename": clean_filename("सूचनाको हक सम्बन्धी ऐन, २०६४"),
+    }
+
+    # A document listed in a volume and in a category is kept under both
+    civil_code = clean_filename("मुलुकी देवानी संहिता, २०७४")
+    assert catalog.category(civil_code) == "Volume 1"
+    assert catalog.category_paths(civil_code) == [("act_in_volume", "Volume 1", "Volume 1"), ("recent_acts",)]
+    assert catalog.get(civil_code)["nep_pdf_link"] == f"{BASE_URL}/content/13311/muluki-dewani-samhita-2074.pdf"
+
+
+def test_scrape_with_http_language_cookie(monkeypatch):
+    monkeypatch.setattr(settings, "SCRAPE_LANGUAGE_COOKIE", "lang")
+    sessions = []
+    def session_factory():
+        sessions.append(FakeSession())
+        return sessions[-1]
+
+    catalog = DocumentCatalog(scrape_with_http(session_factory))
+
+    assert [session.posts for session in sessions] == [[], []]
+    assert [session.cookies.get("lang") for session in sessions] == ["ne", "en"]
+    assert catalog.get_by_title("The National Penal Code, 2017")["nep_title"] == "मुलुकी अपराध संहिता, २०७४"
+
+
+def test_network_error_falls_back_to_selenium(monkeypatch):
+    def failing_session_factory(*args):
+        raise requests.ConnectionError("Connection refused")
+    monkeypatch.setattr(settings, "SCRAPE_MODE", "http")
+    monkeypatch.setattr(scrape, "create_http_session", failing_session_factory)
+    monkeypatch.setattr(scrape, "scrape_with_selenium", lambda: {"others": []})
+
+    assert scrape_documents() == {"others": []}
+
+
+def test_parse_error_is_raised_without_fallback(monkeypatch):
+    # The start page without its volume table, as after a change of the website layout
+    pages = {(START_URL, None): "volume_{language}.html"}
+    monkeypatch.setattr(settings, "SCRAPE_MODE", "http")
+    monkeypatch.setattr(settings, "SCRAPE_LANGUAGE_COOKIE", "lang")
+    monkeypatch.setattr(scrape, "create_http_session", lambda *args: FakeSession(pages))
+    monkeypatch.setattr(scrape, "scrape_with_selenium", lambda: pytest.fail("Selenium fallback on a parse error"))
+
+    with pytest.raises(RuntimeError, match="No volumes found"):
+        scrape_documents()